@@ -1,13 +1,19 @@
-from flask import Flask, g
+from flask import Flask, g, jsonify
 from flask_cors import CORS
 
-from lib.db import Db
+from lib.db import Db, InvalidLearner
+from lib.cache import ResponseCache
+from lib.sampler import GroupSampler
+from lib.jobs import JobRunner
+from lib.profiling import Profiler
 
 import routes.words
 import routes.groups
 import routes.study_sessions
 import routes.dashboard
 import routes.study_activities
+import routes.internal
+import routes.jobs
 
 def get_allowed_origins(app):
     try:
@@ -33,13 +39,60 @@ def create_app(test_config=None):
     
     if test_config is None:
         app.config.from_mapping(
-            DATABASE='words.db'
+            DATABASE='words.db',
+            DB_POOL_SIZE=8,
+            DB_POOL_TIMEOUT=30.0,
+            SHARD_DIR=None,
+            SHARD_POOL_SIZE=2,
+            MAX_OPEN_SHARDS=64,
+            RESPONSE_CACHE_SIZE=512,
+            RESPONSE_CACHE_TTL=60,
+            SAMPLER_TTL=300,
+            RESET_BATCH_SIZE=200,
+            EXPORT_DIR='exports',
+            ASGI_READ_THREADS=None,
+            ASGI_WRITE_LANES=1,
+            PROFILING=False,
+            PROFILE_SLOW_MS=200,
+            PROFILE_LOG='slow_requests.log'
         )
     else:
         app.config.update(test_config)
     
     # Initialize database first since we need it for CORS configuration
-    app.db = Db(database=app.config['DATABASE'])
+    app.db = Db(
+        database=app.config['DATABASE'],
+        pool_size=app.config.get('DB_POOL_SIZE', 8),
+        pool_timeout=app.config.get('DB_POOL_TIMEOUT', 30.0),
+        shard_dir=app.config.get('SHARD_DIR'),
+        shard_pool_size=app.config.get('SHARD_POOL_SIZE', 2),
+        max_open_shards=app.config.get('MAX_OPEN_SHARDS', 64)
+    )
+    
+    # Response cache for read-mostly endpoints, write routes bump table versions
+    app.cache = ResponseCache(
+        max_entries=app.config.get('RESPONSE_CACHE_SIZE', 512),
+        ttl=app.config.get('RESPONSE_CACHE_TTL', 60)
+    )
+    
+    # Per group cumulative error weights for /groups/<id>/sample
+    app.sampler = GroupSampler(ttl=app.config.get('SAMPLER_TTL', 300))
+    
+    # Background jobs (history resets), polled through /api/jobs/<id>
+    app.jobs = JobRunner()
+    
+    # Optional request profiling: SQL and serialization time per request,
+    # Server-Timing headers, a slow request log and /internal/profile
+    app.profiler = None
+    if app.config.get('PROFILING'):
+        app.profiler = Profiler(
+            app,
+            slow_ms=app.config.get('PROFILE_SLOW_MS', 200),
+            log_path=app.config.get('PROFILE_LOG', 'slow_requests.log'),
+            log_max_bytes=app.config.get('PROFILE_LOG_MAX_BYTES', 1048576),
+            log_backups=app.config.get('PROFILE_LOG_BACKUPS', 3),
+            window=app.config.get('PROFILE_WINDOW', 1000)
+        )
     
     # Get allowed origins from study_activities table
     allowed_origins = get_allowed_origins(app)
@@ -53,11 +106,20 @@ def create_app(test_config=None):
         r"/*": {
             "origins": allowed_origins,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Learner-Id"]
         }
     })
 
-    # Close database connection
+    # With SHARD_DIR set, reject malformed learner ids before any route
+    # opens a connection
+    @app.before_request
+    def check_learner():
+        try:
+            app.db.learner()
+        except InvalidLearner as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Return the request's database connection to the pool
     @app.teardown_appcontext
     def close_db(exception):
         app.db.close()
@@ -68,6 +130,8 @@ def create_app(test_config=None):
     routes.study_sessions.load(app)
     routes.dashboard.load(app)
     routes.study_activities.load(app)
+    routes.internal.load(app)
+    routes.jobs.load(app)
     
     return app
 
@@ -0,0 +1,14 @@
+# Async deployment mode, the same routes behind an ASGI server:
+#   uvicorn asgi:app --host 0.0.0.0 --port 5000
+# Reads run on a pool of reader threads, writes on single writer threads,
+# see lib/asgi.py. `python app.py` still starts the threaded WSGI server.
+from app import app as flask_app
+from lib.asgi import WsgiToAsgi
+
+app = WsgiToAsgi(
+    flask_app,
+    read_threads=flask_app.config.get('ASGI_READ_THREADS') or flask_app.config.get('DB_POOL_SIZE', 8),
+    write_lanes=flask_app.config.get('ASGI_WRITE_LANES', 1)
+)
+# Shards are created and migrated on the learner's writer lane
+flask_app.db.write_dispatcher = app.run_on_writer
@@ -0,0 +1,195 @@
+"""Throughput of the threaded WSGI server against the ASGI deployment.
+
+Starts the portal twice on a synthetic database (see load_test.py for the
+data options), each time in its own process:
+  wsgi - werkzeug's threaded server, what `python app.py` (app.run) uses
+  asgi - uvicorn serving asgi.py: reader thread pool plus a single writer
+and drives it with --clients concurrent keep-alive connections for
+--duration seconds per level. Every client cycles through the routes of
+lib/query_plans.route_requests() (about one request in five is a write),
+exports excluded. Prints requests per second and latency percentiles.
+
+  python benchmarks/bench_asgi.py --clients 50 200 1000
+
+Needs uvicorn for the asgi server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, percentile, remove_database
+
+from lib.query_plans import route_requests
+from load_test import prepare_database
+
+def serve(server, database, port, threads):
+    from app import create_app
+    app = create_app({
+        'DATABASE': database,
+        'DB_POOL_SIZE': threads,
+        'RESPONSE_CACHE_SIZE': 0,
+    })
+    if server == 'wsgi':
+        import logging
+        from werkzeug.serving import make_server
+        # The access log would cost the WSGI server more than the requests
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        from lib.asgi import WsgiToAsgi
+        uvicorn.run(WsgiToAsgi(app, read_threads=threads), host='127.0.0.1', port=port,
+                    log_level='warning', backlog=4096)
+
+def start_server(server, database, port, threads):
+    process = subprocess.Popen([
+        sys.executable, os.path.abspath(__file__), '--serve', server,
+        '--database', database, '--port', str(port), '--threads', str(threads)
+    ], cwd=BACKEND_DIR)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(request_once(port, 'GET', '/groups', None))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{server} server did not start on port {port}')
+
+async def read_response(reader):
+    # Status code of one HTTP/1.1 response, the body is read and dropped
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('connection', '').lower() == 'close'
+
+def encode_request(method, url, body):
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = f'{method} {url} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(payload)}\r\n'
+    if body is not None:
+        head += 'Content-Type: application/json\r\n'
+    return (head + '\r\n').encode() + payload
+
+async def request_once(port, method, url, body):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(encode_request(method, url, body))
+    await writer.drain()
+    status, _ = await read_response(reader)
+    writer.close()
+    return status
+
+async def client(port, requests, offset, stop_at, results):
+    connection = None
+    i = offset
+    while time.monotonic() < stop_at:
+        method, url, body = requests[i % len(requests)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection('127.0.0.1', port)
+            reader, writer = connection
+            writer.write(encode_request(method, url, body))
+            await writer.drain()
+            status, close = await read_response(reader)
+            if close:
+                writer.close()
+                connection = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            results['errors'] += 1
+            connection = None
+            continue
+        results['latencies'].append((time.perf_counter() - started) * 1000)
+        if status >= 500:
+            results['errors'] += 1
+    if connection is not None:
+        connection[1].close()
+
+async def run_level(port, requests, clients, duration):
+    results = {'latencies': [], 'errors': 0}
+    stop_at = time.monotonic() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        client(port, requests, offset, stop_at, results) for offset in range(clients)
+    ])
+    elapsed = time.perf_counter() - started
+    latencies = results['latencies']
+    return {
+        'requests': len(latencies),
+        'errors': results['errors'],
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='copy this database instead of generating one')
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--reviews', type=int, default=10, help='average review items per session')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--clients', type=int, nargs='+', default=[50, 200, 1000])
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+    parser.add_argument('--threads', type=int, default=8, help='database pool size and ASGI reader threads')
+    parser.add_argument('--servers', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--serve', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.database, args.port, args.threads)
+        return 0
+
+    path = prepare_database(args)
+    try:
+        connection = sqlite3.connect(path)
+        requests = [request for request in route_requests(connection) if '/export' not in request[1]]
+        connection.close()
+
+        results = {}
+        for server in args.servers:
+            process = start_server(server, path, args.port, args.threads)
+            try:
+                for clients in args.clients:
+                    row = asyncio.run(run_level(args.port, requests, clients, args.duration))
+                    results[(server, clients)] = row
+                    print(f"{server:<5} {clients:>5} clients {row['throughput_rps']:>9.1f} req/s  "
+                          f"p50={row['p50_ms']:.1f}ms p95={row['p95_ms']:.1f}ms p99={row['p99_ms']:.1f}ms "
+                          f"errors={row['errors']}", flush=True)
+            finally:
+                process.terminate()
+                process.wait()
+    finally:
+        remove_database(path)
+
+    if len(args.servers) == 2:
+        print()
+        for clients in args.clients:
+            wsgi = results[('wsgi', clients)]['throughput_rps']
+            asgi = results[('asgi', clients)]['throughput_rps']
+            print(f"{clients:>5} clients: asgi/wsgi throughput {asgi / wsgi if wsgi else 0:.2f}x")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Latency of GET /groups/<id>/study_sessions as the number of sessions grows.
+
+Groups are added one batch at a time, each with --sessions sessions and a few
+review items per session. After every batch the first and the newest group are
+queried. The benchmark fails if the p50 latency of the default listing grows by
+more than --tolerance times between the smallest and the largest database.
+"""
+import argparse
+import random
+import sys
+
+from common import create_database, percentile, remove_database, time_requests
+
+from app import create_app
+
+def seed_groups(connection, first_group, count, sessions_per_group, reviews_per_session, word_ids):
+    cursor = connection.cursor()
+    for group_id in range(first_group, first_group + count):
+        cursor.execute('INSERT INTO groups (id, name) VALUES (?, ?)', (group_id, f'Group {group_id}'))
+        cursor.executemany('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)',
+                           [(word_id, group_id) for word_id in word_ids[:50]])
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM study_sessions')
+        first_session = cursor.fetchone()[0] + 1
+        cursor.executemany('''
+            INSERT INTO study_sessions (id, group_id, study_activity_id, created_at)
+            VALUES (?, ?, 1, datetime('2024-01-01', '+' || ? || ' minutes'))
+        ''', [(first_session + i, group_id, i * 45) for i in range(sessions_per_group)])
+        cursor.executemany('''
+            INSERT INTO word_review_items (word_id, study_session_id, correct, created_at)
+            VALUES (?, ?, ?, datetime('2024-01-01', '+' || ? || ' minutes'))
+        ''', [
+            (random.choice(word_ids), first_session + i, random.random() < 0.7, i * 45 + r)
+            for i in range(sessions_per_group)
+            # Every fifth session has no activity and uses the +30 minutes fallback
+            if i % 5
+            for r in range(reviews_per_session)
+        ])
+    connection.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=10000, help='sessions per group')
+    parser.add_argument('--reviews', type=int, default=3, help='review items per session')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1, 4, 16], help='total groups at each step')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--tolerance', type=float, default=2.0)
+    args = parser.parse_args()
+
+    random.seed(42)
+    path = create_database()
+    try:
+        app = create_app({'DATABASE': path})
+        with app.db.pool.connection() as connection:
+            connection.execute("INSERT INTO study_activities (id, name, url) VALUES (1, 'Bench', 'http://localhost')")
+            connection.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)',
+                                   [(f'k{i}', f'r{i}', f'e{i}', '[]') for i in range(500)])
+            connection.commit()
+            word_ids = [row[0] for row in connection.execute('SELECT id FROM words')]
+
+        client = app.test_client()
+        groups = 0
+        results = []
+        for step in args.steps:
+            with app.db.pool.connection() as connection:
+                seed_groups(connection, groups + 1, step - groups, args.sessions, args.reviews, word_ids)
+                connection.execute('ANALYZE')
+                connection.commit()
+            groups = step
+            total_sessions = groups * args.sessions
+
+            row = {'groups': groups, 'sessions': total_sessions}
+            for label, url in (
+                ('first', '/groups/1/study_sessions'),
+                ('newest', f'/groups/{groups}/study_sessions'),
+                ('deep_page', f'/groups/{groups}/study_sessions?page={args.sessions // 20}'),
+                ('by_review_count', f'/groups/{groups}/study_sessions?sort_by=reviewItemsCount'),
+            ):
+                samples = time_requests(client, url, args.repeat)
+                row[label] = percentile(samples, 0.5)
+            results.append(row)
+            print(f"{groups:>4} groups {total_sessions:>8} sessions  "
+                  f"p50 first={row['first']:.2f}ms newest={row['newest']:.2f}ms "
+                  f"deep_page={row['deep_page']:.2f}ms by_review_count={row['by_review_count']:.2f}ms")
+
+        baseline = min(r['first'] for r in results)
+        worst = max(max(r['first'], r['newest']) for r in results)
+        ratio = worst / baseline if baseline else 0
+        print(f'\nDefault listing p50 grew {ratio:.2f}x (tolerance {args.tolerance}x)')
+        if ratio > args.tolerance:
+            print('FAIL: latency is not flat as sessions grow')
+            return 1
+        print('OK')
+        return 0
+    finally:
+        remove_database(path)
+
+if __name__ == '__main__':
+    sys.exit(main())
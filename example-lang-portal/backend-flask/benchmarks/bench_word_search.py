@@ -0,0 +1,98 @@
+"""Latency of GET /words/search against a LIKE '%term%' scan as words grow.
+
+Words with generated romaji and english are added up to each --sizes step.
+At every step the same queries are timed through the search route (FTS5 with
+BM25 ranking) and as a plain LIKE query over kanji, romaji and english. The
+benchmark fails if the search route is slower than LIKE at the largest size.
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import create_database, percentile, remove_database, time_requests
+
+from app import create_app
+
+SYLLABLES = ['ka', 'ki', 'ku', 'ke', 'ko', 'sa', 'shi', 'su', 'se', 'so', 'ta', 'chi', 'tsu',
+             'te', 'to', 'na', 'ni', 'nu', 'ne', 'no', 'ha', 'hi', 'fu', 'he', 'ho', 'ma', 'mi',
+             'mu', 'me', 'mo', 'ya', 'yu', 'yo', 'ra', 'ri', 'ru', 're', 'ro', 'wa', 'n']
+ENGLISH = ['to', 'eat', 'drink', 'pay', 'walk', 'run', 'read', 'write', 'big', 'small', 'red',
+           'blue', 'house', 'school', 'teacher', 'river', 'mountain', 'morning', 'night', 'book',
+           'quiet', 'fast', 'slow', 'train', 'station', 'friend', 'water', 'fire', 'tree', 'sky']
+
+# Common prefix, selective word, two terms, kanji prefix
+QUERIES = ['ka', 'mountain', 'to pay', '語12']
+
+def seed_words(connection, first, count):
+    rows = []
+    for i in range(first, first + count):
+        romaji = ''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4)))
+        english = ' '.join(random.sample(ENGLISH, random.randint(1, 3)))
+        rows.append((f'語{i}', romaji, english, '[]'))
+    connection.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)', rows)
+    connection.commit()
+
+def time_like(connection, term, repeat):
+    # What a ranked search without the index would run: every row is matched
+    # and the shortest matches (the closest to the term) come first
+    pattern = f'%{term}%'
+    sql = '''
+        SELECT id, kanji, romaji, english FROM words
+        WHERE kanji LIKE ? OR romaji LIKE ? OR english LIKE ?
+        ORDER BY length(romaji), id
+        LIMIT 51
+    '''
+    connection.execute(sql, (pattern, pattern, pattern)).fetchall()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(sql, (pattern, pattern, pattern)).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='total words at each step')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(42)
+    path = create_database()
+    try:
+        app = create_app({'DATABASE': path})
+        client = app.test_client()
+        words = 0
+        results = []
+        for size in args.sizes:
+            with app.db.pool.connection() as connection:
+                seed_words(connection, words, size - words)
+            words = size
+
+            fts = []
+            like = []
+            print(f'{words:>8} words')
+            with app.db.pool.connection() as connection:
+                for term in QUERIES:
+                    term_fts = time_requests(client, f'/words/search?q={term}', args.repeat)
+                    term_like = time_like(connection, term.split()[-1], args.repeat)
+                    print(f"  {term!r:<12} p50 search={percentile(term_fts, 0.5):.2f}ms "
+                          f"like={percentile(term_like, 0.5):.2f}ms")
+                    fts.extend(term_fts)
+                    like.extend(term_like)
+            row = {'words': words, 'fts': percentile(fts, 0.5), 'like': percentile(like, 0.5)}
+            results.append(row)
+            print(f"  overall      p50 search={row['fts']:.2f}ms like={row['like']:.2f}ms "
+                  f"({row['like'] / row['fts']:.1f}x)")
+
+        largest = results[-1]
+        if largest['fts'] > largest['like']:
+            print('\nFAIL: the search route is slower than a LIKE scan')
+            return 1
+        print('\nOK')
+        return 0
+    finally:
+        remove_database(path)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import time
+
+# Benchmarks run from anywhere, but lib.db loads sql/ relative to the backend
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
+
+from flask import Flask
+
+from lib.db import Db
+from migrate import run_migrations
+
+def create_database(path=None):
+    # Empty database with the full schema (setup tables plus migrations)
+    if path is None:
+        handle, path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+        os.remove(path)
+    database = Db(database=path)
+    with Flask(__name__).app_context():
+        database.setup_tables(database.cursor())
+        database.close()
+    database.pool.close_all()
+    run_migrations(path)
+    return path
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def time_requests(client, url, repeat):
+    # Latencies of `repeat` GET requests in milliseconds, after one warm-up request
+    client.get(url)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {url} returned {response.status_code}: {response.get_data(as_text=True)}')
+    return samples
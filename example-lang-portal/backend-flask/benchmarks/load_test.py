@@ -0,0 +1,207 @@
+"""Load test of every portal route against a synthetic database.
+
+Each route from lib/query_plans.route_requests() is hit --requests times by
+--workers concurrent threads, through the Flask test client or, with --server,
+over HTTP against a local threaded WSGI server. Throughput and latency
+percentiles per route are compared with a JSON baseline: the run fails when a
+route's p95 grows, or its throughput drops, by more than --threshold times.
+Without a baseline (or with --update-baseline) the results become the baseline.
+
+The database is generated with lib/synthetic.py (--words, --groups, ...) or
+copied from --database, write routes never touch the original.
+"""
+import argparse
+import http.client
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import BACKEND_DIR, create_database, percentile, remove_database
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from lib.query_plans import route_requests
+from lib.synthetic import generate
+
+# Test client and HTTP numbers are not comparable, each has its own baseline
+DEFAULT_BASELINES = {
+    'client': os.path.join(BACKEND_DIR, 'benchmarks', 'load_baseline.json'),
+    'server': os.path.join(BACKEND_DIR, 'benchmarks', 'load_baseline_server.json'),
+}
+
+def prepare_database(args):
+    path = create_database()
+    if args.database:
+        remove_database(path)
+        source = sqlite3.connect(args.database)
+        target = sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+        return path
+    connection = sqlite3.connect(path)
+    generate(connection, words=args.words, groups=args.groups, sessions=args.sessions,
+             reviews=args.reviews, seed=args.seed, out=lambda line: None)
+    connection.close()
+    return path
+
+class TestClientTransport:
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, url, body):
+        # One test client per worker thread
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(url, method=method, json=body)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+class ServerTransport:
+    def __init__(self, app):
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.local = threading.local()
+
+    def request(self, method, url, body):
+        # Keep-alive connection per worker thread
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            connection.request(method, url, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            self.local.connection = None
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            connection.close()
+            self.local.connection = None
+        return response.status
+
+    def close(self):
+        self.server.shutdown()
+
+def run_route(transport, method, url, body, requests, workers):
+    def one(_):
+        started = time.perf_counter()
+        status = transport.request(method, url, body)
+        return (time.perf_counter() - started) * 1000, status
+
+    # Warm-up outside of the measurement
+    transport.request(method, url, body)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    errors = sum(1 for _, status in results if status >= 500)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+    }
+
+def compare(baseline, results, threshold, noise_ms):
+    regressions = []
+    for route, current in results.items():
+        previous = baseline.get(route)
+        if previous is None:
+            continue
+        # Tiny latencies jitter by more than the threshold, ignore changes below noise_ms
+        if current['p95_ms'] > previous['p95_ms'] * threshold and current['p95_ms'] - previous['p95_ms'] > noise_ms:
+            regressions.append(f"{route}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['throughput_rps'] * threshold < previous['throughput_rps'] and current['p95_ms'] - previous['p95_ms'] > noise_ms:
+            regressions.append(f"{route}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='copy this database instead of generating one')
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=5000)
+    parser.add_argument('--reviews', type=int, default=10, help='average review items per session')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--server', action='store_true', help='go through a local WSGI server instead of the test client')
+    parser.add_argument('--baseline', help='defaults to benchmarks/load_baseline[_server].json')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--threshold', type=float, default=1.5)
+    parser.add_argument('--noise-ms', type=float, default=1.0)
+    args = parser.parse_args()
+    args.baseline = args.baseline or DEFAULT_BASELINES['server' if args.server else 'client']
+
+    path = prepare_database(args)
+    try:
+        # No response cache, every request should reach the database
+        app = create_app({
+            'DATABASE': path,
+            'DB_POOL_SIZE': args.workers,
+            'RESPONSE_CACHE_SIZE': 0,
+        })
+        with app.app_context():
+            requests = route_requests(app.db.get())
+
+        transport = ServerTransport(app) if args.server else TestClientTransport(app)
+        results = {}
+        try:
+            for method, url, body in requests:
+                route = f'{method} {url}'
+                results[route] = run_route(transport, method, url, body, args.requests, args.workers)
+                row = results[route]
+                print(f"{route:<60} {row['throughput_rps']:>8.1f} req/s  p50={row['p50_ms']:.2f}ms "
+                      f"p95={row['p95_ms']:.2f}ms p99={row['p99_ms']:.2f}ms errors={row['errors']}")
+        finally:
+            transport.close()
+            app.db.pool.close_all()
+    finally:
+        remove_database(path)
+
+    failed = [route for route, row in results.items() if row['errors']]
+    if failed:
+        print('\nFAIL: server errors on ' + ', '.join(failed))
+        return 1
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.baseline}')
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(baseline, results, args.threshold, args.noise_ms)
+    if regressions:
+        print(f'\nFAIL: {len(regressions)} regression(s) beyond {args.threshold}x:')
+        for line in regressions:
+            print('  ' + line)
+        return 1
+    print(f'\nOK: no route regressed beyond {args.threshold}x of {args.baseline}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import json
+import re
+
+# Moves old word_review_items into monthly cold tables, see
+# sql/migrations/0009_review_archive.sql. Each month is moved in its own
+# transaction: the rows are copied into word_review_items_YYYY_MM, their per
+# session counts are added to archived_session_reviews and they are deleted
+# from the hot table with the aggregate delete triggers switched off, so
+# word_reviews and the dashboard numbers do not change.
+
+MONTH = re.compile(r'^\d{4}_\d{2}$')
+REVIEW_COLUMNS = 'id, word_id, study_session_id, correct, created_at'
+
+def archive_table(month):
+  # Table names are built from strftime output, refuse anything else
+  if not MONTH.match(month):
+    raise ValueError(f'Invalid archive month: {month}')
+  return f'word_review_items_{month}'
+
+def rebuild_history_view(connection):
+  tables = [row[0] for row in connection.execute(
+    'SELECT table_name FROM review_archive_months ORDER BY month'
+  )]
+  selects = [f'SELECT {REVIEW_COLUMNS} FROM word_review_items']
+  selects.extend(f'SELECT {REVIEW_COLUMNS} FROM {table}' for table in tables)
+  connection.execute('DROP VIEW IF EXISTS word_review_items_history')
+  connection.execute('CREATE VIEW word_review_items_history AS\n' + '\nUNION ALL\n'.join(selects))
+
+def pending_months(connection, cutoff):
+  return [row[0] for row in connection.execute('''
+    SELECT DISTINCT strftime('%Y_%m', created_at) as month
+    FROM word_review_items
+    WHERE created_at < ?
+    ORDER BY month
+  ''', (cutoff,))]
+
+def archive_month(connection, month, cutoff):
+  table = archive_table(month)
+  where = "created_at < :cutoff AND strftime('%Y_%m', created_at) = :month"
+  params = {'cutoff': cutoff, 'month': month}
+
+  connection.execute('BEGIN IMMEDIATE')
+  try:
+    connection.execute(f'''
+      CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        word_id INTEGER NOT NULL,
+        study_session_id INTEGER NOT NULL,
+        correct BOOLEAN NOT NULL,
+        created_at DATETIME
+      )
+    ''')
+    connection.execute(f'''
+      CREATE INDEX IF NOT EXISTS idx_{table}_session
+        ON {table} (study_session_id, correct, created_at, word_id)
+    ''')
+
+    moved = connection.execute(f'''
+      INSERT INTO {table} ({REVIEW_COLUMNS})
+      SELECT {REVIEW_COLUMNS} FROM word_review_items WHERE {where}
+    ''', params).rowcount
+
+    connection.execute(f'''
+      INSERT INTO archived_session_reviews (study_session_id, review_items_count, correct_count, last_activity_at)
+      SELECT study_session_id, COUNT(*), SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END), MAX(created_at)
+      FROM word_review_items
+      WHERE {where}
+      GROUP BY study_session_id
+      ON CONFLICT(study_session_id) DO UPDATE SET
+        review_items_count = review_items_count + excluded.review_items_count,
+        correct_count = correct_count + excluded.correct_count,
+        last_activity_at = MAX(COALESCE(last_activity_at, excluded.last_activity_at), excluded.last_activity_at)
+    ''', params)
+
+    connection.execute('UPDATE review_archive_control SET archiving = 1 WHERE id = 1')
+    connection.execute(f'DELETE FROM word_review_items WHERE {where}', params)
+    connection.execute('UPDATE review_archive_control SET archiving = 0 WHERE id = 1')
+
+    new_table = connection.execute(
+      'SELECT 1 FROM review_archive_months WHERE month = ?', (month,)
+    ).fetchone() is None
+    connection.execute('''
+      INSERT INTO review_archive_months (month, table_name, reviews)
+      VALUES (?, ?, ?)
+      ON CONFLICT(month) DO UPDATE SET
+        reviews = reviews + excluded.reviews,
+        archived_at = CURRENT_TIMESTAMP
+    ''', (month, table, moved))
+    if new_table:
+      rebuild_history_view(connection)
+
+    connection.execute('COMMIT')
+  except Exception:
+    connection.execute('ROLLBACK')
+    raise
+  return moved
+
+def archive(connection, horizon_days=180, out=print):
+  # Returns the number of reviews moved to cold storage
+  cutoff = connection.execute(
+    "SELECT datetime('now', ?)", (f'-{int(horizon_days)} days',)
+  ).fetchone()[0]
+  total = 0
+  for month in pending_months(connection, cutoff):
+    moved = archive_month(connection, month, cutoff)
+    out(f'{archive_table(month)}: {moved} review(s)')
+    total += moved
+  return total
+
+def drop_empty_archive(cursor):
+  # Drops the archive tables the study history reset emptied. Archived
+  # reviews of sessions that were started while the reset ran stay.
+  months = cursor.execute('SELECT month, table_name FROM review_archive_months').fetchall()
+  dropped = False
+  for month, table in months:
+    if cursor.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone() is None:
+      cursor.execute(f'DROP TABLE IF EXISTS {table}')
+      cursor.execute('DELETE FROM review_archive_months WHERE month = ?', (month,))
+      dropped = True
+  if dropped:
+    rebuild_history_view(cursor)
+
+def restore_reviews(cursor, where, params=()):
+  # Moves the archived reviews matching `where` back into the hot table,
+  # inside the caller's transaction. The insert triggers skip them while
+  # archiving = 1, they are still counted in every aggregate, so deleting
+  # them afterwards undoes them like any other review.
+  tables = [row[0] for row in cursor.execute('SELECT table_name FROM review_archive_months').fetchall()]
+  if not tables:
+    return 0
+  restored = 0
+  cursor.execute('UPDATE review_archive_control SET archiving = 1 WHERE id = 1')
+  for table in tables:
+    cursor.execute(f'''
+      INSERT INTO word_review_items ({REVIEW_COLUMNS})
+      SELECT {REVIEW_COLUMNS} FROM {table} WHERE {where}
+    ''', params)
+    moved = cursor.rowcount
+    if moved:
+      cursor.execute(f'DELETE FROM {table} WHERE {where}', params)
+      cursor.execute('UPDATE review_archive_months SET reviews = reviews - ? WHERE table_name = ?', (moved, table))
+      restored += moved
+  cursor.execute('UPDATE review_archive_control SET archiving = 0 WHERE id = 1')
+  cursor.execute(f'DELETE FROM archived_session_reviews WHERE {where}', params)
+  return restored
+
+def restore_sessions(cursor, session_ids):
+  # The archived reviews of the given sessions, see restore_reviews
+  return restore_reviews(
+    cursor, 'study_session_id IN (SELECT value FROM json_each(?))', (json.dumps(list(session_ids)),)
+  )
+
+def restore_orphans(cursor):
+  # The archived reviews of sessions that no longer exist, see restore_reviews
+  return restore_reviews(cursor, 'study_session_id NOT IN (SELECT id FROM study_sessions)')
@@ -0,0 +1,204 @@
+import asyncio
+import io
+import sys
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Serves the Flask portal (or any WSGI app) to an ASGI server such as
+# uvicorn. The event loop holds every client connection, so a thousand idle
+# or slow clients cost no threads. Each request runs the unchanged Flask app
+# on a thread:
+#   - GET, HEAD and OPTIONS on a pool of `read_threads` reader threads, sized
+#     like the connection pool so readers never wait for a connection
+#   - everything else on a writer lane, a single thread, so writes reach
+#     sqlite one at a time instead of piling up on its write lock. With
+#     learner shards (X-Learner-Id, see lib/db.py) learners are spread over
+#     `write_lanes` lanes, each learner always uses the same lane.
+# A read that cannot avoid a write (lib/db.py creating or migrating a shard)
+# hands it to the learner's lane with run_on_writer.
+# Response bodies go back through a small bounded queue, a streamed export
+# is produced no faster than the client reads it.
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LEARNER_HEADER = b'x-learner-id'
+
+_DONE = object()
+
+class WsgiToAsgi:
+  def __init__(self, wsgi_app, read_threads=8, write_lanes=1, queue_chunks=16):
+    self.wsgi_app = wsgi_app
+    self.readers = ThreadPoolExecutor(max_workers=read_threads, thread_name_prefix='reader')
+    # Which lane the current thread is, set when a writer thread starts
+    self._local = threading.local()
+    self.writers = [
+      ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'writer-{lane}',
+                         initializer=self._enter_lane, initargs=(lane,))
+      for lane in range(write_lanes)
+    ]
+    self.queue_chunks = queue_chunks
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      await self.lifespan(receive, send)
+      return
+    if scope['type'] != 'http':
+      raise ValueError(f'Unsupported ASGI scope type {scope["type"]}')
+
+    body = await self.read_body(receive)
+    environ = self.environ(scope, body)
+    executor = self.readers if scope['method'] in READ_METHODS else self.writer(scope)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(self.queue_chunks)
+    state = {'disconnected': False}
+    worker = loop.run_in_executor(executor, self.run, environ, queue, loop, state)
+    try:
+      while True:
+        item = await queue.get()
+        if item is _DONE:
+          break
+        if state['disconnected']:
+          # Keep draining so the worker is never stuck on a full queue
+          continue
+        try:
+          if isinstance(item, tuple):
+            _, status, headers = item
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+          else:
+            await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+        except Exception:
+          state['disconnected'] = True
+    finally:
+      await worker
+    if not state['disconnected']:
+      await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+  def _enter_lane(self, lane):
+    self._local.lane = lane
+
+  def lane(self, learner):
+    return zlib.crc32(learner) % len(self.writers)
+
+  def writer(self, scope):
+    learner = b''
+    for name, value in scope['headers']:
+      if name == LEARNER_HEADER:
+        learner = value
+        break
+    return self.writers[self.lane(learner)]
+
+  def run_on_writer(self, learner, fn):
+    # Runs fn on the lane of `learner` (a str, None for requests without the
+    # header) and returns its result. Called from the lane itself, fn runs
+    # right away instead of waiting for the request that called it.
+    lane = self.lane((learner or '').encode('latin-1'))
+    if getattr(self._local, 'lane', None) == lane:
+      return fn()
+    return self.writers[lane].submit(fn).result()
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        self.readers.shutdown(wait=True)
+        for writer in self.writers:
+          writer.shutdown(wait=True)
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  async def read_body(self, receive):
+    chunks = []
+    while True:
+      message = await receive()
+      if message['type'] == 'http.disconnect':
+        break
+      chunks.append(message.get('body', b''))
+      if not message.get('more_body'):
+        break
+    return b''.join(chunks)
+
+  def environ(self, scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+      'REQUEST_METHOD': scope['method'],
+      'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+      'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+      'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+      'SERVER_NAME': server[0],
+      'SERVER_PORT': str(server[1]),
+      'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+      'REMOTE_ADDR': client[0],
+      'REMOTE_PORT': str(client[1]),
+      'CONTENT_LENGTH': str(len(body)),
+      'wsgi.version': (1, 0),
+      'wsgi.url_scheme': scope.get('scheme', 'http'),
+      'wsgi.input': io.BytesIO(body),
+      'wsgi.errors': sys.stderr,
+      'wsgi.multithread': True,
+      'wsgi.multiprocess': False,
+      'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+      name = name.decode('latin-1').upper().replace('-', '_')
+      value = value.decode('latin-1')
+      if name == 'CONTENT_TYPE':
+        environ['CONTENT_TYPE'] = value
+        continue
+      if name == 'CONTENT_LENGTH':
+        continue
+      key = 'HTTP_' + name
+      environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+  def run(self, environ, queue, loop, state):
+    # Runs on a reader or writer thread. Blocks while the queue is full.
+    def put(item):
+      asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+    response = {'sent': False}
+
+    def send_start():
+      if not response['sent']:
+        response['sent'] = True
+        put(('start', response['status'], response['headers']))
+
+    def write(data):
+      send_start()
+      if data:
+        put(bytes(data))
+
+    def start_response(status, headers, exc_info=None):
+      if exc_info is not None and response['sent']:
+        raise exc_info[1].with_traceback(exc_info[2])
+      response['status'] = int(status.split(' ', 1)[0])
+      response['headers'] = [
+        (name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers
+      ]
+      return write
+
+    iterable = None
+    try:
+      iterable = self.wsgi_app(environ, start_response)
+      for chunk in iterable:
+        if state['disconnected']:
+          break
+        write(chunk)
+      send_start()
+    except Exception:
+      if response['sent']:
+        raise
+      response['status'] = 500
+      response['headers'] = [(b'content-type', b'text/plain; charset=utf-8')]
+      write(b'Internal Server Error')
+    finally:
+      try:
+        # Ends the request context (stream_with_context included), which
+        # returns the pooled database connection
+        if iterable is not None and hasattr(iterable, 'close'):
+          iterable.close()
+      finally:
+        put(_DONE)
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+class CacheEntry:
+  def __init__(self, versions, body, mimetype, etag):
+    self.versions = versions
+    self.body = body
+    self.mimetype = mimetype
+    self.etag = etag
+    self.created_at = time.monotonic()
+
+class ResponseCache:
+  # Caches the serialized body of read-mostly GET endpoints. Every cached
+  # view declares the tables it reads, write routes call bump() for the
+  # tables they change, which invalidates all entries built on older data.
+  # Entries also expire after `ttl` seconds so writes made outside of this
+  # process (invoke tasks, other workers) show up eventually.
+  def __init__(self, max_entries=512, ttl=60):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self._versions = {}
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+  def bump(self, *tables):
+    with self._lock:
+      for table in tables:
+        self._versions[table] = self._versions.get(table, 0) + 1
+
+  def versions(self, tables):
+    with self._lock:
+      return tuple(self._versions.get(table, 0) for table in tables)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def stats(self):
+    with self._lock:
+      stats = dict(self._stats)
+      stats['entries'] = len(self._entries)
+      stats['table_versions'] = dict(self._versions)
+    stats['max_entries'] = self.max_entries
+    stats['ttl'] = self.ttl
+    return stats
+
+  def _lookup(self, key, versions):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      if entry.versions != versions or time.monotonic() - entry.created_at > self.ttl:
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return entry
+
+  def _store(self, key, entry):
+    with self._lock:
+      self._entries[key] = entry
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def _count(self, name):
+    with self._lock:
+      self._stats[name] += 1
+
+  def cached(self, *tables):
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        key = (
+          request.endpoint,
+          tuple(sorted(kwargs.items())),
+          tuple(sorted(request.args.items(multi=True)))
+        )
+        # Read the versions before the view runs, a concurrent write then
+        # makes the stored entry stale instead of hiding the write
+        versions = self.versions(tables)
+
+        entry = self._lookup(key, versions)
+        if entry is not None:
+          # Conditional hit: no database access and no serialization at all
+          if request.if_none_match.contains(entry.etag):
+            self._count('not_modified')
+            response = Response(status=304)
+            response.set_etag(entry.etag)
+            return response
+          self._count('hits')
+          response = Response(entry.body, mimetype=entry.mimetype)
+          response.set_etag(entry.etag)
+          return response
+
+        self._count('misses')
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+          return response
+
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()
+        self._store(key, CacheEntry(versions, body, response.mimetype, etag))
+        response.set_etag(etag)
+        return response.make_conditional(request)
+      return wrapper
+    return decorator
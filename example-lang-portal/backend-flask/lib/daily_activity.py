@@ -0,0 +1,42 @@
+# Rebuild of the trigger maintained daily_activity rollup (see
+# sql/migrations/0008_daily_activity.sql) from the raw history, for databases
+# that were written to without the triggers or drifted.
+
+EXPECTED_SQL = '''
+  SELECT date, group_id, SUM(sessions), SUM(reviews), SUM(correct)
+  FROM (
+    SELECT date(created_at) as date, group_id, COUNT(*) as sessions, 0 as reviews, 0 as correct
+    FROM study_sessions
+    GROUP BY date(created_at), group_id
+    UNION ALL
+    SELECT date(wri.created_at), ss.group_id, 0, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+    FROM word_review_items_history wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    GROUP BY date(wri.created_at), ss.group_id
+  )
+  GROUP BY date, group_id
+'''
+
+def rows_by_key(cursor, sql):
+  cursor.execute(sql)
+  return {(row[0], row[1]): tuple(row[2:]) for row in cursor.fetchall()}
+
+def check(connection):
+  # Returns a list of human readable drift descriptions, empty when consistent
+  cursor = connection.cursor()
+  actual = rows_by_key(cursor, 'SELECT date, group_id, sessions, reviews, correct FROM daily_activity')
+  expected = rows_by_key(cursor, EXPECTED_SQL)
+  drift = []
+  for key in sorted(set(actual) | set(expected)):
+    if actual.get(key) != expected.get(key):
+      drift.append(f'daily_activity[{key[0]}, group {key[1]}]: stored {actual.get(key)}, expected {expected.get(key)}')
+  return drift
+
+def backfill(connection):
+  # Rewrites the whole table in one transaction, returns the number of rows
+  cursor = connection.cursor()
+  cursor.execute('DELETE FROM daily_activity')
+  cursor.execute(f'INSERT INTO daily_activity (date, group_id, sessions, reviews, correct) {EXPECTED_SQL}')
+  count = cursor.rowcount
+  connection.commit()
+  return count
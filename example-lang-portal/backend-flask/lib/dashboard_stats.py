@@ -0,0 +1,91 @@
+# Consistency check for the trigger maintained dashboard tables (see
+# sql/migrations/0005_dashboard_stats.sql and 0013). Everything is
+# recomputed from the raw history (archived reviews included) and compared
+# with what the triggers produced.
+
+SUMMARY_COLUMNS = (
+  'total_vocabulary',
+  'total_words_studied',
+  'mastered_words',
+  'total_reviews',
+  'correct_reviews',
+  'total_sessions',
+)
+
+def expected_summary(cursor):
+  cursor.execute('''
+    SELECT
+      (SELECT COUNT(*) FROM words) as total_vocabulary,
+      COUNT(*) as total_words_studied,
+      COALESCE(SUM(attempts >= 5 AND correct * 5 >= attempts * 4), 0) as mastered_words,
+      COALESCE(SUM(attempts), 0) as total_reviews,
+      COALESCE(SUM(correct), 0) as correct_reviews,
+      (SELECT COUNT(*) FROM study_sessions) as total_sessions
+    FROM (
+      SELECT
+        wri.word_id,
+        COUNT(*) as attempts,
+        SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END) as correct
+      FROM word_review_items_history wri
+      JOIN study_sessions ss ON wri.study_session_id = ss.id
+      GROUP BY wri.word_id
+    )
+  ''')
+  return dict(cursor.fetchone())
+
+def actual_summary(cursor):
+  cursor.execute(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM dashboard_stats WHERE id = 1")
+  row = cursor.fetchone()
+  return dict(row) if row else {column: None for column in SUMMARY_COLUMNS}
+
+# (name, query for the maintained rows, query recomputing them from scratch)
+DETAIL_TABLES = (
+  (
+    'dashboard_word_stats',
+    'SELECT word_id, attempts, correct FROM dashboard_word_stats',
+    '''
+      SELECT wri.word_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+      FROM word_review_items_history wri
+      JOIN study_sessions ss ON wri.study_session_id = ss.id
+      GROUP BY wri.word_id
+    ''',
+  ),
+)
+
+def rows_by_key(cursor, sql):
+  cursor.execute(sql)
+  return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+def check(connection):
+  # Returns a list of human readable drift descriptions, empty when consistent
+  cursor = connection.cursor()
+  drift = []
+
+  expected = expected_summary(cursor)
+  actual = actual_summary(cursor)
+  for column in SUMMARY_COLUMNS:
+    if expected[column] != actual[column]:
+      drift.append(f'dashboard_stats.{column}: stored {actual[column]}, expected {expected[column]}')
+
+  for table, actual_sql, expected_sql in DETAIL_TABLES:
+    actual_rows = rows_by_key(cursor, actual_sql)
+    expected_rows = rows_by_key(cursor, expected_sql)
+    for key in sorted(set(actual_rows) | set(expected_rows), key=str):
+      if actual_rows.get(key) != expected_rows.get(key):
+        drift.append(f'{table}[{key}]: stored {actual_rows.get(key)}, expected {expected_rows.get(key)}')
+
+  return drift
+
+def repair(connection):
+  # Rewrites every maintained table from the recomputed values in one transaction
+  cursor = connection.cursor()
+  for table, actual_sql, expected_sql in DETAIL_TABLES:
+    columns = actual_sql.split('SELECT ', 1)[1].split(' FROM', 1)[0]
+    cursor.execute(f'DELETE FROM {table}')
+    cursor.execute(f'INSERT INTO {table} ({columns}) {expected_sql}')
+
+  expected = expected_summary(cursor)
+  cursor.execute('INSERT OR IGNORE INTO dashboard_stats (id) VALUES (1)')
+  assignments = ', '.join(f'{column} = :{column}' for column in SUMMARY_COLUMNS)
+  cursor.execute(f'UPDATE dashboard_stats SET {assignments} WHERE id = 1', expected)
+  connection.commit()
@@ -1,30 +1,404 @@
 import sqlite3
 import json
-from flask import g
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote
+from flask import g, has_request_context, request
+
+# Pragmas applied once to every new pooled connection. journal_mode=WAL is
+# persisted in the database file, the others are per connection.
+DEFAULT_PRAGMAS = (
+  ('journal_mode', 'WAL'),
+  ('synchronous', 'NORMAL'),
+  ('cache_size', -16000),      # negative means KiB, so ~16MB of page cache
+  ('mmap_size', 268435456),    # 256MB memory-mapped I/O
+  ('temp_store', 'MEMORY'),
+)
+
+# Requests carrying this header are routed to the learner's shard
+LEARNER_HEADER = 'X-Learner-Id'
+LEARNER_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Requests with these methods never create a learner's shard
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Stands in for the shard of a learner who has not written anything yet
+EMPTY_SHARD = 'empty.db'
+
+# Created on every shard connection. Persistent views and triggers in a shard
+# cannot read the attached catalog, TEMP views can: the vocabulary size comes
+# from the catalog's dashboard counters. The due queue is a table of the
+# shard, see Db.sync_group.
+SHARD_TEMP_VIEWS = '''
+  CREATE TEMP VIEW IF NOT EXISTS dashboard_stats AS
+  SELECT
+    s.id,
+    COALESCE((SELECT total_vocabulary FROM catalog.dashboard_stats WHERE id = 1), 0) as total_vocabulary,
+    s.total_words_studied,
+    s.mastered_words,
+    s.total_reviews,
+    s.correct_reviews,
+    s.total_sessions
+  FROM main.dashboard_stats s;
+'''
+
+class PoolTimeout(Exception):
+  pass
+
+class InvalidLearner(Exception):
+  pass
+
+class ConnectionPool:
+  def __init__(self, database, max_size=8, timeout=30.0, pragmas=DEFAULT_PRAGMAS, setup=None):
+    self.database = database
+    self.max_size = max_size
+    self.timeout = timeout
+    self.pragmas = pragmas
+    # Optional callable run once on every new connection after the pragmas
+    self.setup = setup
+    self._idle = []
+    self._size = 0
+    self._cond = threading.Condition()
+    # Remembers the last connection each thread used so it gets it back
+    self._local = threading.local()
+    self._stats = {
+      'hits': 0,
+      'thread_hits': 0,
+      'misses': 0,
+      'waits': 0,
+      'timeouts': 0,
+      'wait_time': 0.0,
+    }
+
+  def _connect(self):
+    # Connections are handed between threads, the pool makes sure only one
+    # thread uses a connection at a time
+    connection = sqlite3.connect(self.database, check_same_thread=False)
+    connection.row_factory = sqlite3.Row  # Return rows as dictionaries
+    for name, value in self.pragmas:
+      connection.execute(f'PRAGMA {name} = {value}')
+    if self.setup is not None:
+      self.setup(connection)
+    return connection
+
+  def _take_idle(self):
+    preferred = getattr(self._local, 'connection', None)
+    if preferred is not None and preferred in self._idle:
+      self._idle.remove(preferred)
+      self._stats['thread_hits'] += 1
+      return preferred
+    if self._idle:
+      return self._idle.pop()
+    return None
+
+  def acquire(self):
+    connection = None
+    waited_since = None
+    with self._cond:
+      while True:
+        connection = self._take_idle()
+        if connection is not None:
+          self._stats['hits'] += 1
+          break
+        if self._size < self.max_size:
+          # Reserve a slot, the connection is opened outside the lock
+          self._size += 1
+          self._stats['misses'] += 1
+          break
+        if waited_since is None:
+          waited_since = time.monotonic()
+          self._stats['waits'] += 1
+        remaining = self.timeout - (time.monotonic() - waited_since)
+        if remaining <= 0:
+          self._stats['timeouts'] += 1
+          self._stats['wait_time'] += time.monotonic() - waited_since
+          raise PoolTimeout(f'No database connection available after {self.timeout}s')
+        self._cond.wait(remaining)
+      if waited_since is not None:
+        self._stats['wait_time'] += time.monotonic() - waited_since
+
+    if connection is None:
+      try:
+        connection = self._connect()
+      except Exception:
+        with self._cond:
+          self._size -= 1
+          self._cond.notify()
+        raise
+
+    self._local.connection = connection
+    return connection
+
+  def release(self, connection):
+    try:
+      # Never hand out a connection with a half finished transaction
+      if connection.in_transaction:
+        connection.rollback()
+    except sqlite3.Error:
+      self._discard(connection)
+      return
+    with self._cond:
+      self._idle.append(connection)
+      self._cond.notify()
+
+  def _discard(self, connection):
+    try:
+      connection.close()
+    except sqlite3.Error:
+      pass
+    with self._cond:
+      self._size -= 1
+      self._cond.notify()
+
+  @contextmanager
+  def connection(self):
+    # For code running outside of a flask request (tasks, scripts)
+    connection = self.acquire()
+    try:
+      yield connection
+    finally:
+      self.release(connection)
+
+  def close_all(self):
+    with self._cond:
+      idle, self._idle = self._idle, []
+      self._size -= len(idle)
+    for connection in idle:
+      connection.close()
+
+  def stats(self):
+    with self._cond:
+      stats = dict(self._stats)
+      stats['size'] = self._size
+      stats['idle'] = len(self._idle)
+      stats['in_use'] = self._size - len(self._idle)
+    stats['max_size'] = self.max_size
+    requests = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / requests if requests else 0
+    stats['wait_time_ms'] = round(stats.pop('wait_time') * 1000, 3)
+    stats['avg_wait_ms'] = round(stats['wait_time_ms'] / stats['waits'], 3) if stats['waits'] else 0
+    return stats
 
 class Db:
-  def __init__(self, database='words.db'):
+  # With shard_dir set, the progress tables of every learner live in their
+  # own file (shard_dir/learner_<id>.db, see sql/shard_migrations), so
+  # learners do not wait on each other's write lock. The main database keeps
+  # the vocabulary catalog and is attached read-only to every shard
+  # connection as `catalog`. Unqualified table names resolve to the shard
+  # first, so route SQL is the same in both modes. Requests without the
+  # learner header use the main database, that is how the catalog is edited.
+  # A learner's shard is created by their first write, reads before that
+  # see an empty shard.
+  def __init__(self, database='words.db', pool_size=8, pool_timeout=30.0,
+               shard_dir=None, shard_pool_size=2, max_open_shards=64):
     self.database = database
-    self.connection = None
+    self.pool = ConnectionPool(database, max_size=pool_size, timeout=pool_timeout)
+    self.pool_timeout = pool_timeout
+    self.shard_dir = shard_dir
+    self.shard_pool_size = shard_pool_size
+    self.max_open_shards = max_open_shards
+    # learner -> ConnectionPool, least recently used first
+    self._shards = OrderedDict()
+    self._shards_lock = threading.Lock()
+    # Held while a shard is created or migrated, picked by learner so that
+    # learners opening their shards at the same time do not wait on each other
+    self._open_locks = [threading.Lock() for _ in range(16)]
+    self._empty_shard = None
+    self._empty_shard_lock = threading.Lock()
+    # Optional callable wrapping every cursor handed out, see lib/profiling.py
+    self.cursor_wrapper = None
+    # Optional callable(learner, fn) running fn where the learner's writes
+    # run and returning its result, see lib/asgi.py. Creating or migrating a
+    # shard is a write, even when a read request needs the shard.
+    self.write_dispatcher = None
+
+  def learner(self):
+    # The learner the current request is routed to, None without sharding
+    # or without the header
+    if self.shard_dir is None or not has_request_context():
+      return None
+    learner = request.headers.get(LEARNER_HEADER)
+    if not learner:
+      return None
+    if not LEARNER_ID.match(learner):
+      raise InvalidLearner(f'{LEARNER_HEADER} must be 1 to 64 letters, digits, - or _')
+    return learner
+
+  def shard_path(self, learner):
+    return os.path.join(self.shard_dir, f'learner_{learner}.db')
+
+  def learners(self):
+    # Every learner with a shard file, in id order
+    if self.shard_dir is None or not os.path.isdir(self.shard_dir):
+      return []
+    learners = []
+    for filename in sorted(os.listdir(self.shard_dir)):
+      if filename.startswith('learner_') and filename.endswith('.db'):
+        learners.append(filename[len('learner_'):-len('.db')])
+    return learners
+
+  def _attach_catalog(self, connection):
+    catalog = 'file:' + quote(os.path.abspath(self.database)) + '?mode=ro'
+    connection.execute('ATTACH DATABASE ? AS catalog', (catalog,))
+    connection.executescript(SHARD_TEMP_VIEWS)
+
+  def _attach_catalog_read_only(self, connection):
+    self._attach_catalog(connection)
+    # The empty shard is shared by every learner without a shard of their own
+    connection.execute('PRAGMA query_only = ON')
+
+  def _dispatch_write(self, learner, fn):
+    if self.write_dispatcher is None:
+      return fn()
+    return self.write_dispatcher(learner, fn)
+
+  def _migrate_shard(self, path):
+    from migrate import run_shard_migrations
+    os.makedirs(self.shard_dir, exist_ok=True)
+    run_shard_migrations(path, out=lambda message: None)
+
+  def _cached_shard(self, learner):
+    with self._shards_lock:
+      pool = self._shards.get(learner)
+      if pool is not None:
+        self._shards.move_to_end(learner)
+      return pool
+
+  def _open_shard(self, learner):
+    # First use in this process: create the shard or apply its pending
+    # migrations, then open a small pool for it. The global lock only guards
+    # the dict of open pools, the file work happens under the learner's lock.
+    with self._open_locks[zlib.crc32(learner.encode('utf-8')) % len(self._open_locks)]:
+      pool = self._cached_shard(learner)
+      if pool is not None:
+        return pool
+      path = self.shard_path(learner)
+      self._migrate_shard(path)
+      pool = ConnectionPool(path, max_size=self.shard_pool_size, timeout=self.pool_timeout,
+                            setup=self._attach_catalog)
+      with self._shards_lock:
+        self._shards[learner] = pool
+        while len(self._shards) > self.max_open_shards:
+          # Connections still in use are closed when the evicted pool goes away
+          _, evicted = self._shards.popitem(last=False)
+          evicted.close_all()
+      return pool
+
+  def shard_pool(self, learner, create=True):
+    # The learner's pool. Without a shard file, create=False returns None
+    # instead of creating the shard.
+    pool = self._cached_shard(learner)
+    if pool is not None:
+      return pool
+    if not create and not os.path.exists(self.shard_path(learner)):
+      return None
+    return self._dispatch_write(learner, lambda: self._open_shard(learner))
+
+  def _open_empty_shard(self):
+    with self._empty_shard_lock:
+      if self._empty_shard is None:
+        path = os.path.join(self.shard_dir, EMPTY_SHARD)
+        self._migrate_shard(path)
+        # Sized like the main pool, every learner without a shard reads here
+        self._empty_shard = ConnectionPool(path, max_size=self.pool.max_size, timeout=self.pool_timeout,
+                                           setup=self._attach_catalog_read_only)
+      return self._empty_shard
+
+  def empty_shard_pool(self):
+    # A migrated shard without any progress whose connections cannot write
+    if self._empty_shard is not None:
+      return self._empty_shard
+    return self._dispatch_write(None, self._open_empty_shard)
+
+  def pool_for(self, learner, create=True):
+    if learner is None:
+      return self.pool
+    return self.shard_pool(learner, create=create) or self.empty_shard_pool()
+
+  def shard_connections(self):
+    # (learner, connection) for every shard in turn, for cross-shard reports
+    for learner in self.learners():
+      with self.shard_pool(learner, create=False).connection() as connection:
+        yield learner, connection
 
   def get(self):
+    # One pooled connection per request, returned to the pool on teardown
     if 'db' not in g:
-      g.db = sqlite3.connect(self.database)
-      g.db.row_factory = sqlite3.Row  # Return rows as dictionaries
+      pool = self.pool_for(self.learner(), create=request.method not in READ_METHODS)
+      g.db = pool.acquire()
+      g.db_pool = pool
     return g.db
 
+  def group_versions(self, group_id):
+    # (catalog version, version of the shard's copy) of the group's
+    # memberships. The copy is None if it was never made.
+    cursor = self.cursor()
+    cursor.execute('''
+      SELECT COALESCE((SELECT version FROM catalog.group_versions WHERE group_id = ?), 0),
+             (SELECT version FROM main.group_members_versions WHERE group_id = ?)
+    ''', (group_id, group_id))
+    return tuple(cursor.fetchone())
+
+  def group_synced(self, group_id):
+    # Whether group_due_queue holds every member of the group. Always true
+    # without a learner, the catalog's queue follows word_groups directly.
+    if self.learner() is None:
+      return True
+    catalog_version, copied_version = self.group_versions(group_id)
+    return catalog_version == copied_version
+
+  def sync_group(self, group_id):
+    # In a shard, copies the catalog's memberships of the group into
+    # group_members when the group's version moved since the last copy. The
+    # group_members triggers add and remove the group's due queue rows, so
+    # the cost follows the change, not the group. No-op without a learner.
+    # A write, called by the routes that write to the learner's shard.
+    if self.learner() is None:
+      return
+    version = self.group_versions(group_id)
+    if version[0] == version[1]:
+      return
+    # Through cursor() so the statements show up in request profiles
+    cursor = self.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+      cursor.execute('''
+        DELETE FROM main.group_members
+        WHERE group_id = ?
+          AND word_id NOT IN (SELECT word_id FROM catalog.word_groups WHERE group_id = ?)
+      ''', (group_id, group_id))
+      cursor.execute('''
+        INSERT OR IGNORE INTO main.group_members (group_id, word_id)
+        SELECT group_id, word_id FROM catalog.word_groups WHERE group_id = ?
+      ''', (group_id,))
+      cursor.execute('''
+        INSERT INTO main.group_members_versions (group_id, version) VALUES (?, ?)
+        ON CONFLICT(group_id) DO UPDATE SET version = excluded.version
+      ''', (group_id, version[0]))
+      self.commit()
+    except Exception:
+      self.get().rollback()
+      raise
+
   def commit(self):
     self.get().commit()
 
   def cursor(self):
     # Ensure the connection is valid before getting a cursor
     connection = self.get()
-    return connection.cursor()
+    cursor = connection.cursor()
+    if self.cursor_wrapper is not None:
+      return self.cursor_wrapper(cursor)
+    return cursor
 
   def close(self):
     db = g.pop('db', None)
+    pool = g.pop('db_pool', self.pool)
     if db is not None:
-      db.close()
+      pool.release(db)
 
   # Function to load SQL from a file
   def sql(self, filepath):
@@ -82,17 +456,25 @@ class Db:
       words = self.load_json(data_json_path)
 
       for word in words:
-        # Insert the word into the words table
+        # (kanji, romaji) identifies a word, a word listed twice is added once
         cursor.execute('''
-          INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)
-        ''', (word['kanji'], word['romaji'], word['english'], json.dumps(word['parts'])))
-        
-        # Get the last inserted word's ID
-        word_id = cursor.lastrowid
+          SELECT id FROM words WHERE kanji = ? AND romaji = ?
+        ''', (word['kanji'], word['romaji']))
+        row = cursor.fetchone()
+        if row:
+          word_id = row[0]
+        else:
+          # Insert the word into the words table
+          cursor.execute('''
+            INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)
+          ''', (word['kanji'], word['romaji'], word['english'], json.dumps(word['parts'])))
+
+          # Get the last inserted word's ID
+          word_id = cursor.lastrowid
 
         # Insert the word-group relationship into word_groups table
         cursor.execute('''
-          INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)
+          INSERT OR IGNORE INTO word_groups (word_id, group_id) VALUES (?, ?)
         ''', (word_id, core_verbs_group_id))
       self.get().commit()
 
@@ -0,0 +1,107 @@
+import gzip
+import json
+import os
+import tempfile
+
+# Group exports for offline clients. Rows are read from the cursor in small
+# batches and written out one line at a time, `parts` is copied as the JSON
+# text stored in the database instead of being decoded and encoded again, so
+# memory use does not depend on the size of the group.
+#
+# NDJSON layout: the first line describes the group, every following line is
+# one word.
+#   {"group_id": 1, "group_name": "Core Verbs", "version": 3}
+#   {"id": 7, "kanji": "...", "romaji": "...", "english": "...", "parts": [...]}
+
+FETCH_SIZE = 500
+
+def group_header(cursor, group_id):
+  # None when the group does not exist
+  cursor.execute('''
+    SELECT g.id, g.name, COALESCE(v.version, 0) as version
+    FROM groups g
+    LEFT JOIN group_versions v ON v.group_id = g.id
+    WHERE g.id = ?
+  ''', (group_id,))
+  row = cursor.fetchone()
+  if row is None:
+    return None
+  return {"group_id": row["id"], "group_name": row["name"], "version": row["version"]}
+
+def word_lines(cursor, group_id):
+  # One JSON object per word, without a trailing newline
+  cursor.execute('''
+    SELECT w.id, w.kanji, w.romaji, w.english, w.parts
+    FROM word_groups wg
+    JOIN words w ON w.id = wg.word_id
+    WHERE wg.group_id = ?
+    ORDER BY wg.word_id
+  ''', (group_id,))
+  while True:
+    rows = cursor.fetchmany(FETCH_SIZE)
+    if not rows:
+      return
+    for row in rows:
+      fields = json.dumps({
+        "id": row["id"],
+        "kanji": row["kanji"],
+        "romaji": row["romaji"],
+        "english": row["english"]
+      }, ensure_ascii=False)
+      yield fields[:-1] + ', "parts": ' + (row["parts"] or '[]') + '}'
+
+def ndjson_lines(cursor, header):
+  yield json.dumps(header, ensure_ascii=False) + '\n'
+  for line in word_lines(cursor, header["group_id"]):
+    yield line + '\n'
+
+def json_array_chunks(cursor, header):
+  # The document of /groups/<id>/words/raw (plus the version), piece by piece
+  yield json.dumps(header, ensure_ascii=False)[:-1] + ', "words": ['
+  first = True
+  for line in word_lines(cursor, header["group_id"]):
+    yield line if first else ',' + line
+    first = False
+  yield ']}'
+
+def export_path(export_dir, group_id, version):
+  return os.path.join(export_dir, f'group_{group_id}_v{version}.ndjson.gz')
+
+def write_group_export(connection, group_id, export_dir):
+  # Writes the gzipped NDJSON export of the group's current version unless it
+  # already exists and removes older versions. Returns (path, header), or
+  # (None, None) when the group does not exist.
+  os.makedirs(export_dir, exist_ok=True)
+  cursor = connection.cursor()
+  # One read transaction, the version and the rows come from the same snapshot
+  in_transaction = connection.in_transaction
+  if not in_transaction:
+    connection.execute('BEGIN')
+  try:
+    header = group_header(cursor, group_id)
+    if header is None:
+      return None, None
+    path = export_path(export_dir, group_id, header["version"])
+    if not os.path.exists(path):
+      # Written under a temporary name, a reader never sees half a file
+      handle, partial = tempfile.mkstemp(dir=export_dir, prefix=f'.group_{group_id}_', suffix='.partial')
+      try:
+        with os.fdopen(handle, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as out:
+          for line in ndjson_lines(cursor, header):
+            out.write(line.encode('utf-8'))
+        os.replace(partial, path)
+      except BaseException:
+        os.remove(partial)
+        raise
+  finally:
+    if not in_transaction:
+      connection.rollback()
+
+  prefix = f'group_{group_id}_v'
+  for filename in os.listdir(export_dir):
+    if filename.startswith(prefix) and filename != os.path.basename(path):
+      try:
+        os.remove(os.path.join(export_dir, filename))
+      except FileNotFoundError:
+        pass
+  return path, header
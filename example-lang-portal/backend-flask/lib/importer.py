@@ -0,0 +1,202 @@
+import csv
+import json
+import os
+import time
+
+# Streaming vocabulary importer used by `invoke import-words`. Input rows look
+# like the seed files: {"kanji", "romaji", "english", "parts", "groups"}, where
+# "parts" and "groups" are optional. Files are read incrementally and words are
+# deduplicated one chunk at a time against the unique (kanji, romaji) index, so
+# memory use depends on the chunk size, not on the size of the file or of the
+# words table.
+
+FORMATS = {
+  '.jsonl': 'jsonl',
+  '.ndjson': 'jsonl',
+  '.json': 'json',
+  '.csv': 'csv',
+}
+
+def detect_format(path):
+  extension = os.path.splitext(path)[1].lower()
+  if extension not in FORMATS:
+    raise ValueError(f"Can't tell the format of {path}, pass --format=jsonl|json|csv")
+  return FORMATS[extension]
+
+def read_json_lines(file):
+  for line in file:
+    line = line.strip()
+    if line:
+      yield json.loads(line)
+
+def read_json_array(file, chunk_size=65536):
+  # Incrementally decodes the objects of a top level JSON array
+  decoder = json.JSONDecoder()
+  buffer = ''
+  started = False
+  eof = False
+  while True:
+    position = 0
+    while True:
+      # Skip whitespace and separators between array items
+      while position < len(buffer) and buffer[position] in ' \t\r\n,':
+        position += 1
+      if not started and position < len(buffer):
+        if buffer[position] != '[':
+          raise ValueError('Expected a JSON array')
+        started = True
+        position += 1
+        continue
+      if position < len(buffer) and buffer[position] == ']':
+        return
+      try:
+        item, position = decoder.raw_decode(buffer, position)
+      except json.JSONDecodeError:
+        if eof:
+          raise
+        break
+      yield item
+    buffer = buffer[position:]
+    chunk = file.read(chunk_size)
+    if not chunk:
+      if eof or not buffer.strip():
+        return
+      eof = True
+    buffer += chunk
+
+def read_csv(file):
+  # "parts" holds a JSON list, "groups" a ;-separated list of group names
+  for row in csv.DictReader(file):
+    parts = (row.get('parts') or '').strip()
+    groups = (row.get('groups') or '').strip()
+    yield {
+      'kanji': row.get('kanji'),
+      'romaji': row.get('romaji'),
+      'english': row.get('english'),
+      'parts': json.loads(parts) if parts else [],
+      'groups': [name.strip() for name in groups.split(';') if name.strip()],
+    }
+
+READERS = {
+  'jsonl': read_json_lines,
+  'json': read_json_array,
+  'csv': read_csv,
+}
+
+def chunks(rows, size):
+  chunk = []
+  for row in rows:
+    chunk.append(row)
+    if len(chunk) >= size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+class WordImporter:
+  def __init__(self, connection, groups=(), chunk_size=1000, out=print, progress_every=10000):
+    self.connection = connection
+    self.default_groups = list(groups)
+    self.chunk_size = chunk_size
+    self.out = out
+    self.progress_every = progress_every
+    self.stats = {'rows': 0, 'inserted': 0, 'duplicates': 0, 'memberships': 0, 'skipped': 0}
+
+  def group_id(self, cursor, name):
+    if name not in self.group_ids:
+      cursor.execute('SELECT id FROM groups WHERE name = ?', (name,))
+      row = cursor.fetchone()
+      if row:
+        self.group_ids[name] = row[0]
+      else:
+        cursor.execute('INSERT INTO groups (name) VALUES (?)', (name,))
+        self.group_ids[name] = cursor.lastrowid
+    return self.group_ids[name]
+
+  def word_ids(self, cursor, keys):
+    # {(kanji, romaji): id} of the given keys that exist, one index seek per key
+    cursor.execute('''
+      SELECT w.kanji, w.romaji, w.id
+      FROM json_each(?) k
+      JOIN words w
+        ON w.kanji = json_extract(k.value, '$[0]')
+        AND w.romaji = json_extract(k.value, '$[1]')
+        AND w.duplicate_of IS NULL
+    ''', (json.dumps(sorted(keys)),))
+    return {(kanji, romaji): id for kanji, romaji, id in cursor.fetchall()}
+
+  def run(self, rows):
+    cursor = self.connection.cursor()
+    started = time.perf_counter()
+    self.group_ids = {}
+
+    # One write transaction for the whole import, so a failed import leaves
+    # nothing behind
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+      next_report = self.progress_every
+
+      for chunk in chunks(rows, self.chunk_size):
+        valid = []
+        for row in chunk:
+          self.stats['rows'] += 1
+          if not row.get('kanji') or not row.get('romaji') or not row.get('english'):
+            self.stats['skipped'] += 1
+            continue
+          valid.append(row)
+
+        # Words whose (kanji, romaji) already exists, in the database or
+        # earlier in the file, are not inserted again. Looking them up first
+        # instead of letting the insert conflict keeps AUTOINCREMENT from
+        # using up an id per duplicate.
+        keys = {(row['kanji'], row['romaji']) for row in valid}
+        word_ids = self.word_ids(cursor, keys)
+        new_words = {}
+        for row in valid:
+          key = (row['kanji'], row['romaji'])
+          if key in word_ids or key in new_words:
+            self.stats['duplicates'] += 1
+          else:
+            new_words[key] = (row['kanji'], row['romaji'], row['english'], json.dumps(row.get('parts') or []))
+        cursor.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)', list(new_words.values()))
+        self.stats['inserted'] += len(new_words)
+        word_ids.update(self.word_ids(cursor, new_words))
+
+        memberships = []
+        for row in valid:
+          word_id = word_ids[(row['kanji'], row['romaji'])]
+          for name in self.default_groups + list(row.get('groups') or []):
+            memberships.append((word_id, self.group_id(cursor, name)))
+
+        # The unique (group_id, word_id) index drops memberships that already exist,
+        # the word_groups triggers count the new ones in groups.words_count
+        cursor.executemany('INSERT OR IGNORE INTO word_groups (word_id, group_id) VALUES (?, ?)', memberships)
+        self.stats['memberships'] += cursor.rowcount if cursor.rowcount > 0 else 0
+
+        if self.stats['rows'] >= next_report:
+          self.report(started)
+          next_report += self.progress_every
+
+      self.connection.commit()
+    except Exception:
+      self.connection.rollback()
+      raise
+
+    self.report(started, done=True)
+    return self.stats
+
+  def report(self, started, done=False):
+    elapsed = time.perf_counter() - started
+    rate = self.stats['rows'] / elapsed if elapsed else 0
+    prefix = 'Imported' if done else 'Read'
+    self.out(
+      f"{prefix} {self.stats['rows']} rows in {elapsed:.1f}s ({rate:,.0f} rows/s): "
+      f"{self.stats['inserted']} new words, {self.stats['duplicates']} duplicates, "
+      f"{self.stats['memberships']} group memberships, {self.stats['skipped']} skipped"
+    )
+
+def import_file(connection, path, format=None, groups=(), chunk_size=1000, out=print):
+  format = format or detect_format(path)
+  with open(path, 'r', encoding='utf-8', newline='') as file:
+    rows = READERS[format](file)
+    return WordImporter(connection, groups=groups, chunk_size=chunk_size, out=out).run(rows)
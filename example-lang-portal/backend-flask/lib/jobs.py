@@ -0,0 +1,114 @@
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Background jobs run in daemon threads of the web process, their state is
+# kept in memory and reported by GET /api/jobs/<id>. Jobs do not survive a
+# restart, so a job must leave the database consistent after every
+# transaction it commits.
+
+def utc_now():
+  return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+class JobConflict(Exception):
+  def __init__(self, job):
+    owner = f' for learner {job.learner}' if job.learner is not None else ''
+    super().__init__(f'A {job.kind} job is already running{owner} (job {job.id})')
+    self.job = job
+
+class Job:
+  def __init__(self, id, kind, params, learner=None):
+    self.id = id
+    self.kind = kind
+    self.params = params
+    self.learner = learner
+    self.status = 'queued'
+    self.progress = {}
+    self.error = None
+    self.created_at = utc_now()
+    self.started_at = None
+    self.finished_at = None
+    self._lock = threading.Lock()
+
+  def update(self, **progress):
+    with self._lock:
+      self.progress.update(progress)
+
+  def to_dict(self):
+    with self._lock:
+      return {
+        'id': self.id,
+        'kind': self.kind,
+        'learner': self.learner,
+        'params': self.params,
+        'status': self.status,
+        'progress': dict(self.progress),
+        'error': self.error,
+        'created_at': self.created_at,
+        'started_at': self.started_at,
+        'finished_at': self.finished_at
+      }
+
+class JobRunner:
+  def __init__(self, max_jobs=100):
+    self.max_jobs = max_jobs
+    self._jobs = OrderedDict()
+    self._ids = itertools.count(1)
+    self._lock = threading.Lock()
+
+  def submit(self, kind, target, exclusive=False, learner=None, **params):
+    # target(job, **params) runs in its own thread and reports through
+    # job.update(). An exclusive job is refused while another one of the
+    # same kind is queued or running for the same learner (None without
+    # sharding), learners with their own shards do not wait for each other.
+    with self._lock:
+      if exclusive:
+        for other in self._jobs.values():
+          if other.kind == kind and other.learner == learner and other.status in ('queued', 'running'):
+            raise JobConflict(other)
+      job = Job(next(self._ids), kind, params, learner)
+      self._jobs[job.id] = job
+      # Forget the oldest finished jobs
+      for old_id in list(self._jobs):
+        if len(self._jobs) <= self.max_jobs:
+          break
+        if self._jobs[old_id].status in ('done', 'failed'):
+          del self._jobs[old_id]
+
+    thread = threading.Thread(target=self._run, args=(job, target, params), daemon=True)
+    thread.start()
+    return job
+
+  def _run(self, job, target, params):
+    with job._lock:
+      job.status = 'running'
+      job.started_at = utc_now()
+    started = time.monotonic()
+    try:
+      target(job, **params)
+    except Exception as e:
+      traceback.print_exc()
+      with job._lock:
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+      with job._lock:
+        job.status = 'done'
+    finally:
+      with job._lock:
+        job.finished_at = utc_now()
+        job.progress['elapsed_ms'] = round((time.monotonic() - started) * 1000, 3)
+
+  def get(self, id, learner=None):
+    # Jobs of other learners are not visible
+    with self._lock:
+      job = self._jobs.get(id)
+    return job if job is not None and job.learner == learner else None
+
+  def list(self, learner=None):
+    with self._lock:
+      jobs = [job for job in self._jobs.values() if job.learner == learner]
+    return [job.to_dict() for job in reversed(jobs)]
@@ -0,0 +1,230 @@
+import hashlib
+import importlib.util
+import os
+import re
+import sqlite3
+import sys
+import time
+
+# Versioned migrations. Every file in sql/migrations named NNNN_name.sql or
+# NNNN_name.py is applied once, in version order, and recorded with its
+# checksum in schema_migrations. Editing a migration that was already
+# applied is an error, add a new one instead.
+#
+# A .sql migration runs in a single transaction together with its
+# schema_migrations row, so it is either fully applied or not at all.
+#
+# A .py migration can define
+#   SCHEMA    - SQL run in one transaction first, like a .sql migration
+#   BACKFILLS - a list of ChunkedBackfill run after SCHEMA, one transaction
+#               per chunk, so the database stays usable while they run
+# The migration is only recorded as applied once every backfill finished.
+# An interrupted backfill resumes from its last committed chunk.
+
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+class MigrationError(Exception):
+  pass
+
+class Migration:
+  def __init__(self, path):
+    match = MIGRATION_FILE.match(os.path.basename(path))
+    self.path = path
+    self.version = match.group(1)
+    self.name = match.group(2)
+    self.kind = match.group(3)
+    with open(path, 'rb') as f:
+      self.checksum = hashlib.sha256(f.read()).hexdigest()
+
+  def __repr__(self):
+    return f'{self.version}_{self.name}.{self.kind}'
+
+  def load(self):
+    if self.kind == 'sql':
+      with open(self.path) as f:
+        return f.read(), []
+    spec = importlib.util.spec_from_file_location(f'migration_{self.version}', self.path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, 'SCHEMA', ''), list(getattr(module, 'BACKFILLS', []))
+
+def print_progress(name, done, total):
+  # Rewrites one line per backfill on a terminal, prints every chunk otherwise
+  percent = 100.0 * done / total if total else 100.0
+  line = f'  {name}: {done}/{total} ({percent:.1f}%)'
+  if sys.stdout.isatty():
+    end = '\n' if done >= total else ''
+    sys.stdout.write('\r' + line + end)
+    sys.stdout.flush()
+  else:
+    print(line)
+
+class ChunkedBackfill:
+  # Runs `sql` once per range of rowids of `table`, binding :start and :end
+  # (start exclusive, end inclusive), e.g.
+  #
+  #   INSERT INTO rollup (...) SELECT ... FROM source
+  #   WHERE source.id > :start AND source.id <= :end ...
+  #
+  # Only rows that exist when the backfill starts are covered, rows written
+  # later must be handled by triggers created in the migration's SCHEMA.
+  def __init__(self, name, table, sql, chunk_size=10000):
+    self.name = name
+    self.table = table
+    self.sql = sql
+    self.chunk_size = chunk_size
+
+  def run(self, connection, version, progress=print_progress):
+    row = connection.execute('''
+      SELECT first_id, position, last_id FROM schema_backfills WHERE version = ? AND name = ?
+    ''', (version, self.name)).fetchone()
+    if row is None:
+      # Fix the range on the first run, a resumed run keeps the original one
+      min_id, max_id = connection.execute(
+        f'SELECT MIN(rowid), MAX(rowid) FROM {self.table}'
+      ).fetchone()
+      first_id = position = (min_id or 1) - 1
+      last_id = max_id or 0
+      connection.execute('''
+        INSERT INTO schema_backfills (version, name, first_id, position, last_id)
+        VALUES (?, ?, ?, ?, ?)
+      ''', (version, self.name, first_id, position, last_id))
+    else:
+      first_id, position, last_id = row
+
+    total = last_id - first_id
+    progress(self.name, position - first_id, total)
+
+    while position < last_id:
+      end = min(position + self.chunk_size, last_id)
+      connection.execute('BEGIN')
+      try:
+        connection.execute(self.sql, {'start': position, 'end': end})
+        connection.execute('''
+          UPDATE schema_backfills SET position = ?, updated_at = CURRENT_TIMESTAMP
+          WHERE version = ? AND name = ?
+        ''', (end, version, self.name))
+        connection.execute('COMMIT')
+      except Exception:
+        connection.execute('ROLLBACK')
+        raise
+      position = end
+      progress(self.name, position - first_id, total)
+
+class MigrationRunner:
+  def __init__(self, connection, migrations_dir, out=print, progress=print_progress):
+    self.connection = connection
+    self.migrations_dir = migrations_dir
+    self.out = out
+    self.progress = progress
+    # Transactions are managed explicitly below
+    self.connection.isolation_level = None
+    self.connection.executescript('''
+      CREATE TABLE IF NOT EXISTS schema_migrations (
+        version TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        applied_at DATETIME  -- NULL while backfills are still running
+      );
+      CREATE TABLE IF NOT EXISTS schema_backfills (
+        version TEXT NOT NULL,
+        name TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,  -- Last rowid that was backfilled
+        last_id INTEGER NOT NULL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (version, name)
+      );
+    ''')
+
+  def migrations(self):
+    migrations = []
+    for filename in sorted(os.listdir(self.migrations_dir)):
+      if MIGRATION_FILE.match(filename):
+        migrations.append(Migration(os.path.join(self.migrations_dir, filename)))
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+      raise MigrationError(f'Duplicate migration versions: {", ".join(duplicates)}')
+    return migrations
+
+  def recorded(self):
+    rows = self.connection.execute('SELECT version, checksum, applied_at FROM schema_migrations').fetchall()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+  def status(self):
+    # (migration, 'applied' | 'pending' | 'backfilling' | 'changed') per file
+    recorded = self.recorded()
+    result = []
+    for migration in self.migrations():
+      if migration.version not in recorded:
+        state = 'pending'
+      elif recorded[migration.version][0] != migration.checksum:
+        state = 'changed'
+      elif recorded[migration.version][1] is None:
+        state = 'backfilling'
+      else:
+        state = 'applied'
+      result.append((migration, state))
+    return result
+
+  def run(self):
+    status = self.status()
+    changed = [str(migration) for migration, state in status if state == 'changed']
+    if changed:
+      raise MigrationError(
+        f'Applied migrations were modified: {", ".join(changed)}. Add a new migration instead.'
+      )
+
+    applied = 0
+    for migration, state in status:
+      if state == 'applied':
+        continue
+      started = time.monotonic()
+      self.out(f'Running migration: {migration}')
+      schema, backfills = migration.load()
+      if state == 'pending':
+        self._apply_schema(migration, schema, recorded_as_applied=not backfills)
+      for backfill in backfills:
+        self._run_backfill(migration, backfill)
+      if backfills:
+        self.connection.execute('''
+          UPDATE schema_migrations SET applied_at = CURRENT_TIMESTAMP WHERE version = ?
+        ''', (migration.version,))
+      self.out(f'  done in {time.monotonic() - started:.2f}s')
+      applied += 1
+
+    if applied:
+      self.out(f'Applied {applied} migration(s)')
+    else:
+      self.out('Database is up to date')
+    return applied
+
+  def _run_backfill(self, migration, backfill):
+    # Chunks committed before the failure stay, the next run resumes after them
+    try:
+      backfill.run(self.connection, migration.version, self.progress)
+    except Exception as e:
+      if self.connection.in_transaction:
+        self.connection.execute('ROLLBACK')
+      raise MigrationError(f'{migration} backfill {backfill.name} failed: {e}') from e
+
+  def _apply_schema(self, migration, schema, recorded_as_applied):
+    # The script and its schema_migrations row commit together
+    try:
+      self.connection.executescript('BEGIN;\n' + schema + '\n;')
+      self.connection.execute(f'''
+        INSERT INTO schema_migrations (version, name, checksum, applied_at)
+        VALUES (?, ?, ?, {'CURRENT_TIMESTAMP' if recorded_as_applied else 'NULL'})
+      ''', (migration.version, migration.name, migration.checksum))
+      self.connection.execute('COMMIT')
+    except Exception as e:
+      if self.connection.in_transaction:
+        self.connection.execute('ROLLBACK')
+      raise MigrationError(f'{migration} failed: {e}') from e
+
+def connect(database):
+  connection = sqlite3.connect(database, isolation_level=None)
+  connection.row_factory = sqlite3.Row
+  return connection
@@ -0,0 +1,30 @@
+import base64
+import json
+
+class InvalidCursor(ValueError):
+  pass
+
+# Opaque keyset cursors: the sort column, direction and the (sort value, id)
+# of the last row of the previous page, as url-safe base64 JSON
+def encode_cursor(sort_by, order, value, id):
+  payload = json.dumps([sort_by, order, value, id], separators=(',', ':'))
+  return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_by, order):
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    cursor_sort_by, cursor_order, value, id = json.loads(base64.urlsafe_b64decode(padded))
+  except (ValueError, TypeError):
+    raise InvalidCursor('Invalid cursor')
+  if cursor_sort_by != sort_by or cursor_order != order:
+    raise InvalidCursor('Cursor does not match sort_by and order')
+  return value, id
+
+# Seek past the previous page instead of skipping OFFSET rows. Ties on the
+# sort column are broken by id so the order is total.
+def keyset_condition(sort_expression, id_expression, order):
+  operator = '>' if order == 'asc' else '<'
+  return f'({sort_expression}, {id_expression}) {operator} (?, ?)'
+
+def include_total(args):
+  return args.get('include_total', 'true').lower() not in ('false', '0', 'no')
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# Request level profiling, installed by create_app() when PROFILING is on.
+# Cursors handed out by app.db are wrapped to time every statement (execute
+# plus fetches, sqlite evaluates lazily), jsonify is timed through the JSON
+# provider. Every response gets a Server-Timing header, slow requests go to a
+# rotating log and /internal/profile reports latency percentiles per route.
+
+def parameter_shape(parameters):
+  # Types of the bound parameters, never their values: "(int, str)"
+  if isinstance(parameters, dict):
+    return '{' + ', '.join(f'{name}: {type(value).__name__}' for name, value in parameters.items()) + '}'
+  return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+
+def percentile(samples, fraction):
+  if not samples:
+    return 0.0
+  index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+  return samples[index]
+
+class RequestProfile:
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.statements = []  # [sql, parameter shape, seconds]
+    self.serialize_time = 0.0
+
+  def record(self, sql, shape, elapsed):
+    self.statements.append([sql, shape, elapsed])
+
+  def add_fetch(self, elapsed):
+    # Rows are produced while fetching, that time belongs to the last statement
+    if self.statements:
+      self.statements[-1][2] += elapsed
+
+  @property
+  def sql_time(self):
+    return sum(statement[2] for statement in self.statements)
+
+  def slowest(self):
+    if not self.statements:
+      return None
+    sql, shape, elapsed = max(self.statements, key=lambda statement: statement[2])
+    return {'sql': ' '.join(sql.split()), 'parameters': shape, 'ms': round(elapsed * 1000, 3)}
+
+class ProfilingCursor:
+  def __init__(self, cursor, profile):
+    self._cursor = cursor
+    self._profile = profile
+
+  def execute(self, sql, parameters=()):
+    started = time.perf_counter()
+    try:
+      self._cursor.execute(sql, parameters)
+    finally:
+      self._profile.record(sql, parameter_shape(parameters), time.perf_counter() - started)
+    return self
+
+  def executemany(self, sql, seq_of_parameters):
+    seq_of_parameters = list(seq_of_parameters)
+    shape = f'{len(seq_of_parameters)} x ' + (parameter_shape(seq_of_parameters[0]) if seq_of_parameters else '()')
+    started = time.perf_counter()
+    try:
+      self._cursor.executemany(sql, seq_of_parameters)
+    finally:
+      self._profile.record(sql, shape, time.perf_counter() - started)
+    return self
+
+  def _timed_fetch(self, fetch, *args):
+    started = time.perf_counter()
+    try:
+      return fetch(*args)
+    finally:
+      self._profile.add_fetch(time.perf_counter() - started)
+
+  def fetchone(self):
+    return self._timed_fetch(self._cursor.fetchone)
+
+  def fetchmany(self, *args):
+    return self._timed_fetch(self._cursor.fetchmany, *args)
+
+  def fetchall(self):
+    return self._timed_fetch(self._cursor.fetchall)
+
+  def __iter__(self):
+    return iter(self.fetchall())
+
+  def __getattr__(self, name):
+    # lastrowid, rowcount, description, close, ...
+    return getattr(self._cursor, name)
+
+class ProfilingJSONProvider(DefaultJSONProvider):
+  # jsonify() goes through response(), its time is the serialization cost
+  def response(self, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+      return super().response(*args, **kwargs)
+    finally:
+      profile = g.get('profile') if has_request_context() else None
+      if profile is not None:
+        profile.serialize_time += time.perf_counter() - started
+
+class Profiler:
+  def __init__(self, app, slow_ms=200, log_path='slow_requests.log', log_max_bytes=1048576,
+               log_backups=3, window=1000):
+    self.slow_ms = slow_ms
+    self.window = window
+    self._routes = {}
+    self._lock = threading.Lock()
+
+    self.slow_log = logging.getLogger(f'profiling.slow_requests.{id(self)}')
+    self.slow_log.setLevel(logging.INFO)
+    self.slow_log.propagate = False
+    if log_path:
+      handler = RotatingFileHandler(log_path, maxBytes=log_max_bytes, backupCount=log_backups)
+      handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+      self.slow_log.addHandler(handler)
+
+    app.db.cursor_wrapper = self.wrap_cursor
+    app.json = ProfilingJSONProvider(app)
+    app.before_request(self.start)
+    app.after_request(self.finish)
+
+  def wrap_cursor(self, cursor):
+    profile = g.get('profile') if has_request_context() else None
+    if profile is None:
+      return cursor
+    return ProfilingCursor(cursor, profile)
+
+  def start(self):
+    g.profile = RequestProfile()
+
+  def finish(self, response):
+    profile = g.pop('profile', None)
+    if profile is None:
+      return response
+    total_ms = (time.perf_counter() - profile.started) * 1000
+    sql_ms = profile.sql_time * 1000
+    serialize_ms = profile.serialize_time * 1000
+    count = len(profile.statements)
+
+    response.headers.add('Server-Timing', f'db;dur={sql_ms:.3f};desc="{count} statements"')
+    response.headers.add('Server-Timing', f'serialize;dur={serialize_ms:.3f}')
+    response.headers.add('Server-Timing', f'total;dur={total_ms:.3f}')
+
+    route = f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+    slowest = profile.slowest()
+    with self._lock:
+      stats = self._routes.get(route)
+      if stats is None:
+        stats = self._routes[route] = {
+          'durations': deque(maxlen=self.window),
+          'requests': 0,
+          'statements': 0,
+          'sql_ms': 0.0,
+          'serialize_ms': 0.0,
+          'slowest_statement': None,
+        }
+      stats['durations'].append(total_ms)
+      stats['requests'] += 1
+      stats['statements'] += count
+      stats['sql_ms'] += sql_ms
+      stats['serialize_ms'] += serialize_ms
+      if slowest and (stats['slowest_statement'] is None or slowest['ms'] > stats['slowest_statement']['ms']):
+        stats['slowest_statement'] = slowest
+
+    if total_ms >= self.slow_ms:
+      self.slow_log.info(
+        '%s %s %d total=%.1fms sql=%.1fms statements=%d serialize=%.1fms slowest=%s',
+        request.method, request.full_path.rstrip('?'), response.status_code,
+        total_ms, sql_ms, count, serialize_ms, slowest
+      )
+    return response
+
+  def reset(self):
+    with self._lock:
+      self._routes.clear()
+
+  def stats(self):
+    with self._lock:
+      routes = {route: dict(stats, durations=sorted(stats['durations'])) for route, stats in self._routes.items()}
+
+    result = {}
+    for route, stats in routes.items():
+      durations = stats['durations']
+      requests = stats['requests']
+      result[route] = {
+        'requests': requests,
+        'p50_ms': round(percentile(durations, 0.50), 3),
+        'p95_ms': round(percentile(durations, 0.95), 3),
+        'p99_ms': round(percentile(durations, 0.99), 3),
+        'avg_statements': round(stats['statements'] / requests, 2),
+        'avg_sql_ms': round(stats['sql_ms'] / requests, 3),
+        'avg_serialize_ms': round(stats['serialize_ms'] / requests, 3),
+        'slowest_statement': stats['slowest_statement'],
+      }
+    return {'slow_ms': self.slow_ms, 'window': self.window, 'routes': result}
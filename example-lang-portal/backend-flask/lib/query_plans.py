@@ -0,0 +1,173 @@
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+
+# Small reference tables that are listed and counted in full, scanning them is fine
+SMALL_TABLES = {'study_activities', 'groups'}
+
+# Matches "SCAN words" or "SCAN w" but not "SCAN w USING INDEX ..."
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+SQL_KEYWORDS = {'on', 'where', 'join', 'left', 'inner', 'group', 'order', 'limit', 'set', 'using'}
+
+def route_requests(connection):
+  # One request per route in routes/*.py, using ids that exist in the database
+  def first_id(sql):
+    row = connection.execute(sql).fetchone()
+    return row[0] if row else 1
+
+  group_id = first_id('SELECT id FROM groups ORDER BY id LIMIT 1')
+  word_id = first_id('SELECT id FROM words ORDER BY id LIMIT 1')
+  activity_id = first_id('SELECT id FROM study_activities ORDER BY id LIMIT 1')
+  session_id = first_id('SELECT id FROM study_sessions ORDER BY id LIMIT 1')
+
+  requests = [
+    ('GET', '/words', None),
+    ('GET', '/words?cursor=&include_total=false', None),
+    ('GET', f'/words/{word_id}', None),
+    ('GET', '/words/search?q=to', None),
+    ('GET', f'/words/search?q=to&group_id={group_id}', None),
+    ('GET', '/groups', None),
+    ('GET', '/groups?sort_by=words_count', None),
+    ('GET', f'/groups/{group_id}', None),
+    ('GET', f'/groups/{group_id}/words', None),
+    ('GET', f'/groups/{group_id}/words?cursor=', None),
+    ('GET', f'/groups/{group_id}/words/raw', None),
+    ('GET', f'/groups/{group_id}/study_sessions', None),
+    ('GET', f'/groups/{group_id}/export', None),
+    ('GET', f'/groups/{group_id}/export?format=json', None),
+    ('GET', f'/groups/{group_id}/due', None),
+    ('GET', f'/groups/{group_id}/sample?n=10', None),
+    ('GET', f'/groups/{group_id}/sample?n=10&weight=uniform', None),
+    ('GET', '/api/study-sessions', None),
+    ('GET', f'/api/study-sessions/{session_id}', None),
+    ('GET', '/api/study-activities', None),
+    ('GET', f'/api/study-activities/{activity_id}', None),
+    ('GET', f'/api/study-activities/{activity_id}/sessions', None),
+    ('GET', f'/api/study-activities/{activity_id}/launch', None),
+    ('GET', '/dashboard/recent-session', None),
+    ('GET', '/dashboard/stats', None),
+    ('GET', '/dashboard/streak', None),
+    ('GET', f'/dashboard/streak?group_id={group_id}', None),
+    ('GET', '/dashboard/heatmap', None),
+    ('GET', f'/dashboard/trend?group_id={group_id}', None),
+    ('POST', '/study_sessions', {'group_id': group_id, 'study_activity_id': activity_id}),
+    ('POST', f'/study_sessions/{session_id}/review', {'word_id': word_id, 'correct': True}),
+    ('POST', f'/study_sessions/{session_id}/reviews', [{'word_id': word_id, 'correct': False}]),
+    # Removed and added back, so the group is unchanged afterwards
+    ('DELETE', f'/groups/{group_id}/words', {'word_ids': [word_id]}),
+    ('POST', f'/groups/{group_id}/words', {'word_ids': [word_id]}),
+    ('DELETE', f'/groups/{group_id}/words/{word_id}', None),
+    ('POST', f'/groups/{group_id}/words/{word_id}', None),
+  ]
+  for column in ('romaji', 'english'):
+    requests.append(('GET', f'/words?sort_by={column}', None))
+  return requests
+
+def table_aliases(sql):
+  aliases = {}
+  for table, alias in TABLE_ALIAS.findall(sql):
+    aliases[table] = table
+    if alias and alias.lower() not in SQL_KEYWORDS:
+      aliases[alias] = table
+  return aliases
+
+def full_scans(connection, sql, tables):
+  plan = connection.execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+  aliases = table_aliases(sql)
+  scans = []
+  for row in plan:
+    match = FULL_SCAN.match(row[3])
+    if not match:
+      continue
+    # CTEs and materialized subqueries show up by name, only real tables count
+    table = aliases.get(match.group(1), match.group(1))
+    if table in tables and table not in SMALL_TABLES:
+      scans.append(table)
+  return [row[3] for row in plan], scans
+
+def verify(database, learner=None, out=print):
+  # Work on a copy, the write routes are exercised too. With a learner every
+  # request carries X-Learner-Id and runs against that learner's shard (in a
+  # temporary SHARD_DIR), with the copy attached as the catalog.
+  handle, copy_path = tempfile.mkstemp(suffix='.db')
+  os.close(handle)
+  source = sqlite3.connect(database)
+  target = sqlite3.connect(copy_path)
+  source.backup(target)
+  source.close()
+  target.close()
+
+  from app import create_app
+  from lib.db import LEARNER_HEADER
+  shard_dir = tempfile.mkdtemp(prefix='shards') if learner else None
+  headers = {LEARNER_HEADER: learner} if learner else {}
+  app = create_app({'DATABASE': copy_path, 'DB_POOL_SIZE': 1, 'SHARD_DIR': shard_dir, 'SHARD_POOL_SIZE': 1})
+  client = app.test_client()
+
+  if learner:
+    # A new shard is empty, give the routes a session and a review to find
+    with app.test_request_context():
+      connection = app.db.get()
+      group_id = connection.execute('SELECT id FROM groups ORDER BY id LIMIT 1').fetchone()[0]
+      word_id = connection.execute(
+        'SELECT word_id FROM word_groups WHERE group_id = ? ORDER BY word_id LIMIT 1', (group_id,)
+      ).fetchone()[0]
+      activity_id = connection.execute('SELECT id FROM study_activities ORDER BY id LIMIT 1').fetchone()[0]
+    session = client.post('/study_sessions', json={'group_id': group_id, 'study_activity_id': activity_id},
+                          headers=headers).get_json()
+    client.post(f"/study_sessions/{session['session_id']}/review", json={'word_id': word_id, 'correct': True},
+                headers=headers)
+
+  with app.test_request_context(headers=headers):
+    connection = app.db.get()
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if learner:
+      tables |= {row[0] for row in connection.execute("SELECT name FROM catalog.sqlite_master WHERE type = 'table'")}
+    requests = route_requests(connection)
+
+  failures = []
+  try:
+    for method, url, body in requests:
+      if learner and method != 'GET' and url.startswith('/groups/'):
+        # Catalog edits with the learner header are refused, they are checked
+        # in the run without a learner
+        out(f'{method} {url} -> skipped, catalog write')
+        continue
+      statements = []
+      # Single connection pool, so the trace callback sees every statement of the request
+      with app.test_request_context(headers=headers):
+        app.db.get().set_trace_callback(statements.append)
+      response = client.open(url, method=method, json=body, headers=headers)
+      # Streamed bodies hold the request's connection until they are read
+      response.get_data()
+      response.close()
+      with app.test_request_context(headers=headers):
+        connection = app.db.get()
+        connection.set_trace_callback(None)
+        out(f'{method} {url} -> {response.status_code}')
+        for sql in statements:
+          if not sql.lstrip().upper().startswith(('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')):
+            continue
+          plan, scans = full_scans(connection, sql, tables)
+          status = 'FULL SCAN ' + ', '.join(scans) if scans else 'ok'
+          out(f'  [{status}] ' + ' '.join(sql.split())[:120])
+          for detail in plan:
+            out(f'      {detail}')
+          if scans:
+            failures.append((method, url, sql, scans))
+  finally:
+    app.db.pool.close_all()
+    for pool in list(app.db._shards.values()) + [app.db._empty_shard]:
+      if pool is not None:
+        pool.close_all()
+    if shard_dir:
+      shutil.rmtree(shard_dir, ignore_errors=True)
+    os.remove(copy_path)
+    for suffix in ('-wal', '-shm'):
+      if os.path.exists(copy_path + suffix):
+        os.remove(copy_path + suffix)
+
+  return failures
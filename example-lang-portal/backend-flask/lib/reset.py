@@ -0,0 +1,130 @@
+import json
+
+from lib.archive import drop_empty_archive, restore_orphans, restore_sessions
+
+# Deletes study history in small transactions so log_review and the other
+# writers only ever wait for one batch. Each batch takes the write lock,
+# deletes up to `batch_size` sessions together with all of their reviews
+# (archived ones included) and commits, so the database is consistent
+# between batches and a review can never be left behind without its
+# session. The aggregates (dashboard, daily_activity) are kept current by
+# the delete triggers as the batches go. Sessions started while a reset
+# runs are not part of it, the cleanup after a full reset only touches
+# reviews whose session is gone.
+
+def scope_filter(group_id=None, study_activity_id=None, last_session_id=None):
+  conditions = []
+  params = []
+  if last_session_id is not None:
+    conditions.append('id <= ?')
+    params.append(last_session_id)
+  if group_id is not None:
+    conditions.append('group_id = ?')
+    params.append(group_id)
+  if study_activity_id is not None:
+    conditions.append('study_activity_id = ?')
+    params.append(study_activity_id)
+  where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+  return where, params
+
+def delete_session_batch(connection, where, params, batch_size):
+  # Returns (sessions deleted, reviews deleted), (0, 0) when nothing is left
+  connection.execute('BEGIN IMMEDIATE')
+  try:
+    session_ids = [row[0] for row in connection.execute(
+      f'SELECT id FROM study_sessions {where} ORDER BY id LIMIT ?', params + [batch_size]
+    ).fetchall()]
+    if not session_ids:
+      connection.execute('ROLLBACK')
+      return 0, 0
+
+    cursor = connection.cursor()
+    restore_sessions(cursor, session_ids)
+    ids = json.dumps(session_ids)
+    reviews = cursor.execute('''
+      DELETE FROM word_review_items WHERE study_session_id IN (SELECT value FROM json_each(?))
+    ''', (ids,)).rowcount
+    cursor.execute('DELETE FROM study_sessions WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+    connection.execute('COMMIT')
+  except Exception:
+    connection.execute('ROLLBACK')
+    raise
+  return len(session_ids), reviews
+
+def delete_orphan_reviews(connection, after_id, batch_size):
+  # Reviews of sessions that no longer exist, only cleaned up by a full
+  # reset. Returns (reviews deleted, last id looked at), the next batch
+  # continues after that id. (0, after_id) when nothing is left.
+  connection.execute('BEGIN IMMEDIATE')
+  try:
+    review_ids = [row[0] for row in connection.execute('''
+      SELECT id FROM word_review_items
+      WHERE id > ? AND study_session_id NOT IN (SELECT id FROM study_sessions)
+      ORDER BY id LIMIT ?
+    ''', (after_id, batch_size)).fetchall()]
+    if not review_ids:
+      connection.execute('ROLLBACK')
+      return 0, after_id
+    connection.execute('''
+      DELETE FROM word_review_items WHERE id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(review_ids),))
+    connection.execute('COMMIT')
+  except Exception:
+    connection.execute('ROLLBACK')
+    raise
+  return len(review_ids), review_ids[-1]
+
+def reset_history(connection, group_id=None, study_activity_id=None, batch_size=200, on_batch=None):
+  # on_batch(sessions_deleted, reviews_deleted, sessions_total) after every commit
+  # Only the sessions that exist when the reset starts
+  last_session_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM study_sessions').fetchone()[0]
+  where, params = scope_filter(group_id, study_activity_id, last_session_id)
+  total = connection.execute(f'SELECT COUNT(*) FROM study_sessions {where}', params).fetchone()[0]
+
+  sessions_deleted = 0
+  reviews_deleted = 0
+  while True:
+    sessions, reviews = delete_session_batch(connection, where, params, batch_size)
+    if not sessions:
+      break
+    sessions_deleted += sessions
+    reviews_deleted += reviews
+    if on_batch:
+      on_batch(sessions_deleted, reviews_deleted, total)
+
+  if group_id is None and study_activity_id is None:
+    # Archived orphans go back to the hot table first, deleting them there
+    # undoes them in the aggregates
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+      restore_orphans(connection.cursor())
+      connection.execute('COMMIT')
+    except Exception:
+      connection.execute('ROLLBACK')
+      raise
+
+    after_id = 0
+    while True:
+      reviews, after_id = delete_orphan_reviews(connection, after_id, batch_size * 20)
+      if not reviews:
+        break
+      reviews_deleted += reviews
+      if on_batch:
+        on_batch(sessions_deleted, reviews_deleted, total)
+
+    # Without history every word is new again for the scheduler. A scoped
+    # reset keeps the schedule, words can belong to several groups. Words
+    # answered in a session started during the reset keep theirs.
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+      connection.execute('''
+        DELETE FROM word_schedule
+        WHERE word_id NOT IN (SELECT word_id FROM word_review_items_history)
+      ''')
+      drop_empty_archive(connection.cursor())
+      connection.execute('COMMIT')
+    except Exception:
+      connection.execute('ROLLBACK')
+      raise
+
+  return sessions_deleted, reviews_deleted
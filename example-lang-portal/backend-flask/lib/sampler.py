@@ -0,0 +1,187 @@
+import json
+import random
+import threading
+import time
+
+# Laplace smoothed error rate, so words that were never reviewed (or never
+# missed) still get drawn now and then
+def error_weight(correct_count, wrong_count):
+  return (wrong_count + 1) / (correct_count + wrong_count + 2)
+
+class WeightTree:
+  # Cumulative weights of one group as a Fenwick tree: changing a weight and
+  # finding the word at a cumulative weight are both O(log m)
+  def __init__(self, word_ids, weights):
+    self.word_ids = list(word_ids)
+    self.positions = {word_id: i for i, word_id in enumerate(self.word_ids)}
+    self.weights = list(weights)
+    self.tree = [0.0] * (len(self.weights) + 1)
+    # Linear time build, every node adds itself to its parent once
+    for i, weight in enumerate(self.weights, start=1):
+      self.tree[i] += weight
+      parent = i + (i & -i)
+      if parent < len(self.tree):
+        self.tree[parent] += self.tree[i]
+    self.built_at = time.monotonic()
+
+  def __len__(self):
+    return len(self.word_ids)
+
+  def total(self):
+    i = len(self.weights)
+    total = 0.0
+    while i > 0:
+      total += self.tree[i]
+      i -= i & -i
+    return total
+
+  def _add(self, position, delta):
+    i = position + 1
+    while i < len(self.tree):
+      self.tree[i] += delta
+      i += i & -i
+
+  def set_weight(self, word_id, weight):
+    position = self.positions.get(word_id)
+    if position is None:
+      return
+    self._add(position, weight - self.weights[position])
+    self.weights[position] = weight
+
+  def _find(self, target):
+    # Smallest position whose cumulative weight exceeds target
+    position = 0
+    step = 1 << (len(self.weights).bit_length())
+    while step:
+      following = position + step
+      if following < len(self.tree) and self.tree[following] <= target:
+        position = following
+        target -= self.tree[following]
+      step >>= 1
+    return min(position, len(self.weights) - 1)
+
+  def sample(self, n, rng):
+    # Draw without replacement by zeroing every drawn weight, then put the
+    # weights back, O(n log m) in total
+    drawn = []
+    removed = []
+    try:
+      while len(drawn) < n:
+        total = self.total()
+        if total <= 0:
+          break
+        position = self._find(rng.random() * total)
+        weight = self.weights[position]
+        if weight <= 0:
+          # Float rounding landed on an already drawn word
+          continue
+        drawn.append(self.word_ids[position])
+        removed.append((position, weight))
+        self._add(position, -weight)
+        self.weights[position] = 0.0
+    finally:
+      for position, weight in removed:
+        self._add(position, weight)
+        self.weights[position] = weight
+    return drawn
+
+class GroupSampler:
+  # Keeps a WeightTree per group in memory. Trees are built from one indexed
+  # read of the group on first use, review routes update the weights of the
+  # reviewed words in place. Trees are rebuilt after `ttl` seconds so writes
+  # made outside of this process (invoke tasks, other workers) and float
+  # drift do not accumulate. Trees are keyed by (learner, group_id), with
+  # sharded databases every learner has their own weights.
+  def __init__(self, ttl=300, max_groups=256, rng=None):
+    self.ttl = ttl
+    self.max_groups = max_groups
+    self.rng = rng or random.Random()
+    self._trees = {}
+    self._lock = threading.Lock()
+    self._stats = {'builds': 0, 'hits': 0, 'updates': 0}
+
+  def _build(self, cursor, group_id):
+    cursor.execute('''
+      SELECT wg.word_id,
+             COALESCE(r.correct_count, 0) AS correct_count,
+             COALESCE(r.wrong_count, 0) AS wrong_count
+      FROM word_groups wg
+      LEFT JOIN word_reviews r ON r.word_id = wg.word_id
+      WHERE wg.group_id = ?
+      ORDER BY wg.word_id
+    ''', (group_id,))
+    rows = cursor.fetchall()
+    return WeightTree(
+      [row["word_id"] for row in rows],
+      [error_weight(row["correct_count"], row["wrong_count"]) for row in rows]
+    )
+
+  def tree(self, cursor, group_id, learner=None):
+    key = (learner, group_id)
+    with self._lock:
+      tree = self._trees.get(key)
+      if tree is not None and time.monotonic() - tree.built_at <= self.ttl:
+        self._stats['hits'] += 1
+        return tree
+
+    tree = self._build(cursor, group_id)
+    with self._lock:
+      self._stats['builds'] += 1
+      self._trees.pop(key, None)
+      self._trees[key] = tree
+      while len(self._trees) > self.max_groups:
+        # Dicts keep insertion order, drop the oldest build
+        del self._trees[next(iter(self._trees))]
+    return tree
+
+  def sample(self, cursor, group_id, n, weighted=True, learner=None):
+    tree = self.tree(cursor, group_id, learner)
+    with self._lock:
+      if not weighted:
+        return self.rng.sample(tree.word_ids, min(n, len(tree)))
+      return tree.sample(n, self.rng)
+
+  def update(self, cursor, word_ids, learner=None):
+    # Called after reviews are committed, refreshes the weights of the
+    # reviewed words in every loaded group of the learner that contains them
+    with self._lock:
+      if not self._trees:
+        return
+    cursor.execute('''
+      SELECT wg.group_id, wg.word_id,
+             COALESCE(r.correct_count, 0) AS correct_count,
+             COALESCE(r.wrong_count, 0) AS wrong_count
+      FROM word_groups wg
+      LEFT JOIN word_reviews r ON r.word_id = wg.word_id
+      WHERE wg.word_id IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(sorted(set(word_ids))),))
+    rows = cursor.fetchall()
+    with self._lock:
+      for row in rows:
+        tree = self._trees.get((learner, row["group_id"]))
+        if tree is not None:
+          tree.set_weight(row["word_id"], error_weight(row["correct_count"], row["wrong_count"]))
+          self._stats['updates'] += 1
+
+  def invalidate(self, group_id):
+    # The group's words changed, its trees are rebuilt on the next draw
+    with self._lock:
+      for key in [key for key in self._trees if key[1] == group_id]:
+        del self._trees[key]
+
+  def clear(self, learner=None):
+    # Drops every tree, or only the learner's ones
+    with self._lock:
+      if learner is None:
+        self._trees.clear()
+      else:
+        for key in [key for key in self._trees if key[0] == learner]:
+          del self._trees[key]
+
+  def stats(self):
+    with self._lock:
+      stats = dict(self._stats)
+      stats['groups'] = len(self._trees)
+    stats['max_groups'] = self.max_groups
+    stats['ttl'] = self.ttl
+    return stats
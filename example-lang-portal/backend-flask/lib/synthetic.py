@@ -0,0 +1,143 @@
+import bisect
+import itertools
+import json
+import random
+
+# Synthetic data for load testing, used by `invoke generate-data` and
+# benchmarks/load_test.py. Sizes are configurable and the data is skewed the
+# way real usage is: a few groups are much bigger and studied much more than
+# the rest, a few words get most of the reviews, some words are harder than
+# others and recent days have more sessions than old ones. The same seed
+# always produces the same database.
+
+SYLLABLES = ['a', 'i', 'u', 'e', 'o', 'ka', 'ki', 'ku', 'ke', 'ko', 'sa', 'shi', 'su', 'se', 'so',
+             'ta', 'chi', 'tsu', 'te', 'to', 'na', 'ni', 'nu', 'ne', 'no', 'ha', 'hi', 'fu', 'he',
+             'ho', 'ma', 'mi', 'mu', 'me', 'mo', 'ya', 'yu', 'yo', 'ra', 'ri', 'ru', 're', 'ro',
+             'wa', 'n', 'ga', 'gi', 'gu', 'ge', 'go', 'da', 'de', 'do', 'ba', 'bi', 'bu', 'be', 'bo']
+ENGLISH = ['to eat', 'to drink', 'to pay', 'to walk', 'to run', 'to read', 'to write', 'to sleep',
+           'big', 'small', 'red', 'blue', 'new', 'old', 'house', 'school', 'teacher', 'river',
+           'mountain', 'morning', 'night', 'book', 'quiet', 'fast', 'slow', 'train', 'station',
+           'friend', 'water', 'fire', 'tree', 'sky', 'rain', 'city', 'car', 'shop', 'money']
+
+def cumulative_zipf(count, exponent=1.1):
+  # Cumulative weights where rank r is picked proportionally to 1 / r^exponent
+  return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+def pick(rng, cumulative):
+  return bisect.bisect(cumulative, rng.random() * cumulative[-1])
+
+def synthetic_word(rng, index):
+  characters = [chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(1, 3))]
+  readings = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 2))) for _ in characters]
+  parts = [{'kanji': kanji, 'romaji': [romaji]} for kanji, romaji in zip(characters, readings)]
+  # The index keeps (kanji, romaji) unique, importers dedupe on it
+  return (''.join(characters) + str(index), ''.join(readings), rng.choice(ENGLISH), json.dumps(parts, ensure_ascii=False))
+
+def generate(connection, words=10000, groups=20, sessions=5000, reviews=20, activities=3,
+             days=365, seed=42, chunk_size=10000, out=print):
+  rng = random.Random(seed)
+  cursor = connection.cursor()
+
+  def next_id(table):
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}')
+    return cursor.fetchone()[0]
+
+  cursor.execute('BEGIN IMMEDIATE')
+  try:
+    cursor.execute('SELECT id FROM study_activities ORDER BY id')
+    activity_ids = [row[0] for row in cursor.fetchall()]
+    if not activity_ids:
+      cursor.executemany('INSERT INTO study_activities (name, url, preview_url) VALUES (?, ?, ?)', [
+        (f'Synthetic Activity {i}', f'http://localhost:{8080 + i}', None) for i in range(1, activities + 1)
+      ])
+      cursor.execute('SELECT id FROM study_activities ORDER BY id')
+      activity_ids = [row[0] for row in cursor.fetchall()]
+
+    first_word = next_id('words')
+    word_ids = list(range(first_word, first_word + words))
+    for start in range(0, words, chunk_size):
+      cursor.executemany('INSERT INTO words (id, kanji, romaji, english, parts) VALUES (?, ?, ?, ?, ?)', [
+        (word_id,) + synthetic_word(rng, word_id) for word_id in word_ids[start:start + chunk_size]
+      ])
+    out(f'Inserted {words} words')
+
+    first_group = next_id('groups')
+    group_ids = list(range(first_group, first_group + groups))
+    cursor.executemany('INSERT INTO groups (id, name) VALUES (?, ?)', [
+      (group_id, f'Synthetic Group {group_id}') for group_id in group_ids
+    ])
+    # Group sizes follow a power law, a fifth of the words is in a second group
+    group_weights = cumulative_zipf(groups)
+    members = {group_id: [] for group_id in group_ids}
+    for word_id in word_ids:
+      chosen = {group_ids[pick(rng, group_weights)]}
+      if rng.random() < 0.2:
+        chosen.add(group_ids[pick(rng, group_weights)])
+      for group_id in chosen:
+        members[group_id].append(word_id)
+    memberships = [(word_id, group_id) for group_id, ids in members.items() for word_id in ids]
+    for start in range(0, len(memberships), chunk_size):
+      cursor.executemany('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)', memberships[start:start + chunk_size])
+    out(f'Inserted {groups} groups with {len(memberships)} memberships')
+
+    # Per word difficulty: the chance of answering it correctly
+    difficulty = {word_id: rng.betavariate(5, 2) for word_id in word_ids}
+    member_weights = {group_id: cumulative_zipf(len(ids)) for group_id, ids in members.items() if ids}
+    studied_groups = [group_id for group_id in group_ids if members[group_id]]
+    studied_weights = cumulative_zipf(len(studied_groups))
+    activity_weights = cumulative_zipf(len(activity_ids))
+
+    first_session = next_id('study_sessions')
+    session_rows = []
+    review_rows = []
+    review_count = 0
+
+    def flush():
+      cursor.executemany('''
+        INSERT INTO study_sessions (id, group_id, study_activity_id, created_at)
+        VALUES (?, ?, ?, datetime('now', ?))
+      ''', session_rows)
+      cursor.executemany('''
+        INSERT INTO word_review_items (word_id, study_session_id, correct, created_at)
+        VALUES (?, ?, ?, datetime('now', ?))
+      ''', review_rows)
+      session_rows.clear()
+      review_rows.clear()
+
+    for session_id in range(first_session, first_session + (sessions if studied_groups else 0)):
+      group_id = studied_groups[pick(rng, studied_weights)]
+      activity_id = activity_ids[pick(rng, activity_weights)]
+      # Exponential age, most sessions are recent
+      age = min(days * 86400, int(rng.expovariate(1 / (days * 86400 / 4))))
+      session_rows.append((session_id, group_id, activity_id, f'-{age} seconds'))
+      ids = members[group_id]
+      weights = member_weights[group_id]
+      answers = rng.randint(0, 2 * reviews)
+      for i in range(answers):
+        word_id = ids[pick(rng, weights)]
+        review_rows.append((word_id, session_id, rng.random() < difficulty[word_id], f'-{max(0, age - 20 * i)} seconds'))
+      review_count += answers
+      if len(review_rows) >= chunk_size:
+        flush()
+    flush()
+    sessions = sessions if studied_groups else 0
+    out(f'Inserted {sessions} study sessions with {review_count} review items')
+
+    connection.commit()
+  except Exception:
+    connection.rollback()
+    raise
+
+  return {'words': words, 'groups': groups, 'memberships': len(memberships), 'sessions': sessions, 'reviews': review_count}
+
+def create_schema(database):
+  # Empty database with the full schema: setup tables plus migrations
+  from flask import Flask
+  from lib.db import Db
+  from migrate import run_migrations
+  schema = Db(database=database)
+  with Flask(__name__).app_context():
+    schema.setup_tables(schema.cursor())
+    schema.close()
+  schema.pool.close_all()
+  run_migrations(database)
@@ -1,31 +1,49 @@
-import sqlite3
 import os
+import sys
+
+from lib.migrations import MigrationError, MigrationRunner, connect
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'sql', 'migrations')
+# Learner shards have their own schema, see Db in lib/db.py
+SHARD_MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'sql', 'shard_migrations')
+
+def run_migrations(db_path=None):
+    # Applies the pending migrations, see lib/migrations.py
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(__file__), 'words.db')
+    conn = connect(db_path)
 
-def run_migrations():
-    # Connect to the database
-    db_path = os.path.join(os.path.dirname(__file__), 'word_bank.db')
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    
     try:
-        # Get list of migration files
-        migrations_dir = os.path.join(os.path.dirname(__file__), 'sql', 'migrations')
-        migration_files = sorted([f for f in os.listdir(migrations_dir) if f.endswith('.sql')])
-        
-        # Run each migration
-        for migration_file in migration_files:
-            print(f"Running migration: {migration_file}")
-            with open(os.path.join(migrations_dir, migration_file)) as f:
-                migration_sql = f.read()
-                conn.executescript(migration_sql)
-                conn.commit()
-        
-        print("Migrations completed successfully")
-    except Exception as e:
+        return MigrationRunner(conn, MIGRATIONS_DIR).run()
+    except MigrationError as e:
         print(f"Error running migrations: {str(e)}")
-        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def run_shard_migrations(db_path, out=print):
+    # Creates a learner shard or applies its pending migrations
+    conn = connect(db_path)
+    try:
+        return MigrationRunner(conn, SHARD_MIGRATIONS_DIR, out=out).run()
+    finally:
+        conn.close()
+
+def migration_status(db_path=None):
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(__file__), 'words.db')
+    conn = connect(db_path)
+    try:
+        for migration, state in MigrationRunner(conn, MIGRATIONS_DIR).status():
+            print(f"{state:<12} {migration}")
     finally:
         conn.close()
 
 if __name__ == '__main__':
-    run_migrations()
+    try:
+        if '--status' in sys.argv[1:]:
+            migration_status()
+        else:
+            run_migrations()
+    except MigrationError:
+        sys.exit(1)
@@ -1,6 +1,54 @@
-from flask import jsonify
+from flask import jsonify, request
 from flask_cors import cross_origin
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+# Consecutive days with any sessions or reviews, ending today, or yesterday
+# when nothing happened yet today. Walks back one primary key lookup on
+# daily_activity per day of the streak, so it costs O(streak) whatever the
+# length of the history.
+def current_streak(cursor, group_id=None):
+    group_filter = 'AND group_id = :group_id' if group_id is not None else ''
+    cursor.execute(f'''
+        WITH RECURSIVE days(day) AS (
+            SELECT CASE
+                WHEN EXISTS (SELECT 1 FROM daily_activity WHERE date = date('now') {group_filter})
+                THEN date('now')
+                ELSE date('now', '-1 day')
+            END
+            UNION ALL
+            SELECT date(day, '-1 day')
+            FROM days
+            WHERE EXISTS (SELECT 1 FROM daily_activity WHERE date = days.day {group_filter})
+        )
+        SELECT COUNT(*) - 1 as streak FROM days
+    ''', {'group_id': group_id})
+    return cursor.fetchone()["streak"]
+
+# Per day totals from daily_activity for the last `days` days (today
+# included), only days with activity are returned
+def daily_totals(cursor, days, group_id=None):
+    today = datetime.now(timezone.utc).date()
+    start = today - timedelta(days=days - 1)
+    if group_id is None:
+        cursor.execute('''
+            SELECT date, SUM(sessions) as sessions, SUM(reviews) as reviews, SUM(correct) as correct
+            FROM daily_activity
+            WHERE date >= ?
+            GROUP BY date
+            ORDER BY date
+        ''', (start.isoformat(),))
+    else:
+        cursor.execute('''
+            SELECT date, sessions, reviews, correct
+            FROM daily_activity
+            WHERE group_id = ? AND date >= ?
+            ORDER BY date
+        ''', (group_id, start.isoformat()))
+    return start, today, cursor.fetchall()
+
+def day_count(default, maximum):
+    days = request.args.get('days', default, type=int)
+    return min(max(1, days), maximum)
 
 def load(app):
     @app.route('/dashboard/recent-session', methods=['GET'])
@@ -16,14 +64,20 @@ def load(app):
                     ss.group_id,
                     sa.name as activity_name,
                     ss.created_at,
-                    COUNT(CASE WHEN wri.correct = 1 THEN 1 END) as correct_count,
-                    COUNT(CASE WHEN wri.correct = 0 THEN 1 END) as wrong_count
-                FROM study_sessions ss
+                    COUNT(CASE WHEN wri.correct = 1 THEN 1 END)
+                        + COALESCE(ar.correct_count, 0) as correct_count,
+                    COUNT(CASE WHEN wri.correct = 0 THEN 1 END)
+                        + COALESCE(ar.review_items_count - ar.correct_count, 0) as wrong_count
+                FROM (
+                    SELECT id, group_id, study_activity_id, created_at
+                    FROM study_sessions
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                ) ss
                 JOIN study_activities sa ON ss.study_activity_id = sa.id
                 LEFT JOIN word_review_items wri ON ss.id = wri.study_session_id
+                LEFT JOIN archived_session_reviews ar ON ar.study_session_id = ss.id
                 GROUP BY ss.id
-                ORDER BY ss.created_at DESC
-                LIMIT 1
             ''')
             
             session = cursor.fetchone()
@@ -49,82 +103,39 @@ def load(app):
         try:
             cursor = app.db.cursor()
             
-            # Get total vocabulary count
-            cursor.execute('SELECT COUNT(*) as total_vocabulary FROM words')
-            total_vocabulary = cursor.fetchone()["total_vocabulary"]
-
-            # Get total unique words studied
-            cursor.execute('''
-                SELECT COUNT(DISTINCT word_id) as total_words
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
-            ''')
-            total_words = cursor.fetchone()["total_words"]
-            
-            # Get mastered words (words with >80% success rate and at least 5 attempts)
-            cursor.execute('''
-                WITH word_stats AS (
-                    SELECT 
-                        word_id,
-                        COUNT(*) as total_attempts,
-                        SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                    FROM word_review_items wri
-                    JOIN study_sessions ss ON wri.study_session_id = ss.id
-                    GROUP BY word_id
-                    HAVING total_attempts >= 5
-                )
-                SELECT COUNT(*) as mastered_words
-                FROM word_stats
-                WHERE success_rate >= 0.8
-            ''')
-            mastered_words = cursor.fetchone()["mastered_words"]
-            
-            # Get overall success rate
+            # All counters are kept up to date by triggers (see
+            # sql/migrations/0005_dashboard_stats.sql), so this is a single
+            # row read plus two small lookups instead of scanning the history
             cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
+                SELECT
+                    total_vocabulary,
+                    total_words_studied,
+                    mastered_words,
+                    total_reviews,
+                    correct_reviews,
+                    total_sessions
+                FROM dashboard_stats
+                WHERE id = 1
             ''')
-            success_rate = cursor.fetchone()["success_rate"] or 0
-            
-            # Get total number of study sessions
-            cursor.execute('SELECT COUNT(*) as total_sessions FROM study_sessions')
-            total_sessions = cursor.fetchone()["total_sessions"]
-            
-            # Get number of groups with activity in the last 30 days
+            stats = cursor.fetchone()
+
+            total_vocabulary = stats["total_vocabulary"] if stats else 0
+            total_words = stats["total_words_studied"] if stats else 0
+            mastered_words = stats["mastered_words"] if stats else 0
+            total_sessions = stats["total_sessions"] if stats else 0
+            success_rate = 0
+            if stats and stats["total_reviews"]:
+                success_rate = stats["correct_reviews"] * 1.0 / stats["total_reviews"]
+
+            # Get number of groups with a session in the last 30 days, a range
+            # of at most 30 days of the rollup
             cursor.execute('''
                 SELECT COUNT(DISTINCT group_id) as active_groups
-                FROM study_sessions
-                WHERE created_at >= date('now', '-30 days')
+                FROM daily_activity
+                WHERE date >= date('now', '-30 days') AND sessions > 0
             ''')
             active_groups = cursor.fetchone()["active_groups"]
             
-            # Calculate current streak (consecutive days with at least one study session)
-            cursor.execute('''
-                WITH daily_sessions AS (
-                    SELECT 
-                        date(created_at) as study_date,
-                        COUNT(*) as session_count
-                    FROM study_sessions
-                    GROUP BY date(created_at)
-                ),
-                streak_calc AS (
-                    SELECT 
-                        study_date,
-                        julianday(study_date) - julianday(lag(study_date, 1) over (order by study_date)) as days_diff
-                    FROM daily_sessions
-                )
-                SELECT COUNT(*) as streak
-                FROM (
-                    SELECT study_date
-                    FROM streak_calc
-                    WHERE days_diff = 1 OR days_diff IS NULL
-                    ORDER BY study_date DESC
-                )
-            ''')
-            current_streak = cursor.fetchone()["streak"]
-            
             return jsonify({
                 "total_vocabulary": total_vocabulary,
                 "total_words_studied": total_words,
@@ -132,8 +143,162 @@ def load(app):
                 "success_rate": success_rate,
                 "total_sessions": total_sessions,
                 "active_groups": active_groups,
-                "current_streak": current_streak
+                "current_streak": current_streak(cursor)
             })
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
+
+    # Endpoint: GET /dashboard/streak, optionally for one group with group_id
+    @app.route('/dashboard/streak', methods=['GET'])
+    @cross_origin()
+    def get_streak():
+        try:
+            cursor = app.db.cursor()
+            group_id = request.args.get('group_id', type=int)
+            streak = current_streak(cursor, group_id)
+
+            cursor.execute('''
+                SELECT COUNT(*) as active
+                FROM daily_activity
+                WHERE date = date('now') AND (:group_id IS NULL OR group_id = :group_id)
+            ''', {'group_id': group_id})
+            active_today = cursor.fetchone()["active"] > 0
+
+            return jsonify({
+                "group_id": group_id,
+                "current_streak": streak,
+                "active_today": active_today
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    # Endpoint: GET /dashboard/heatmap?days=365 with the days that had any
+    # activity, for a calendar heatmap. Optionally for one group with group_id.
+    @app.route('/dashboard/heatmap', methods=['GET'])
+    @cross_origin()
+    def get_heatmap():
+        try:
+            cursor = app.db.cursor()
+            group_id = request.args.get('group_id', type=int)
+            start, end, rows = daily_totals(cursor, day_count(365, 731), group_id)
+
+            return jsonify({
+                "group_id": group_id,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "days": [{
+                    "date": row["date"],
+                    "sessions": row["sessions"],
+                    "reviews": row["reviews"],
+                    "correct": row["correct"]
+                } for row in rows]
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    # Endpoint: GET /dashboard/trend?days=30 with one entry per day, days
+    # without activity included, and the success rate of each day
+    @app.route('/dashboard/trend', methods=['GET'])
+    @cross_origin()
+    def get_trend():
+        try:
+            cursor = app.db.cursor()
+            group_id = request.args.get('group_id', type=int)
+            start, end, rows = daily_totals(cursor, day_count(30, 365), group_id)
+            by_date = {row["date"]: row for row in rows}
+
+            days = []
+            totals = {"sessions": 0, "reviews": 0, "correct": 0}
+            day = start
+            while day <= end:
+                row = by_date.get(day.isoformat())
+                sessions = row["sessions"] if row else 0
+                reviews = row["reviews"] if row else 0
+                correct = row["correct"] if row else 0
+                days.append({
+                    "date": day.isoformat(),
+                    "sessions": sessions,
+                    "reviews": reviews,
+                    "correct": correct,
+                    "success_rate": correct / reviews if reviews else 0
+                })
+                totals["sessions"] += sessions
+                totals["reviews"] += reviews
+                totals["correct"] += correct
+                day += timedelta(days=1)
+
+            totals["success_rate"] = totals["correct"] / totals["reviews"] if totals["reviews"] else 0
+            return jsonify({
+                "group_id": group_id,
+                "days": days,
+                "totals": totals
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    # Endpoint: GET /dashboard/learners?days=30 for admins when the progress
+    # tables are sharded per learner (SHARD_DIR). Reads the summary row and
+    # the last `days` days of daily_activity of every shard in turn, and adds
+    # them up into overall totals and one activity series for all learners.
+    @app.route('/dashboard/learners', methods=['GET'])
+    @cross_origin()
+    def get_learners():
+        try:
+            if app.db.shard_dir is None:
+                return jsonify({"error": "Sharding is disabled, set SHARD_DIR"}), 404
+
+            days = day_count(30, 365)
+            learners = []
+            by_date = {}
+            totals = {
+                "total_words_studied": 0,
+                "mastered_words": 0,
+                "total_reviews": 0,
+                "correct_reviews": 0,
+                "total_sessions": 0,
+                "active_learners": 0
+            }
+            for learner, connection in app.db.shard_connections():
+                cursor = connection.cursor()
+                cursor.execute('''
+                    SELECT total_words_studied, mastered_words, total_reviews,
+                           correct_reviews, total_sessions
+                    FROM dashboard_stats
+                    WHERE id = 1
+                ''')
+                stats = cursor.fetchone()
+                # Leftmost column of the primary key, a single index seek
+                cursor.execute('SELECT MAX(date) as last_active FROM daily_activity')
+                last_active = cursor.fetchone()["last_active"]
+                start, end, rows = daily_totals(cursor, days)
+                for row in rows:
+                    day = by_date.setdefault(row["date"], {"sessions": 0, "reviews": 0, "correct": 0})
+                    day["sessions"] += row["sessions"]
+                    day["reviews"] += row["reviews"]
+                    day["correct"] += row["correct"]
+
+                for column in ("total_words_studied", "mastered_words", "total_reviews",
+                               "correct_reviews", "total_sessions"):
+                    totals[column] += stats[column]
+                if rows:
+                    totals["active_learners"] += 1
+                learners.append({
+                    "learner": learner,
+                    "total_words_studied": stats["total_words_studied"],
+                    "mastered_words": stats["mastered_words"],
+                    "total_sessions": stats["total_sessions"],
+                    "success_rate": stats["correct_reviews"] / stats["total_reviews"] if stats["total_reviews"] else 0,
+                    "last_active": last_active
+                })
+
+            totals["learners"] = len(learners)
+            totals["success_rate"] = totals["correct_reviews"] / totals["total_reviews"] if totals["total_reviews"] else 0
+            return jsonify({
+                "days": days,
+                "learners": learners,
+                "totals": totals,
+                "activity": [{"date": date, **by_date[date]} for date in sorted(by_date)]
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
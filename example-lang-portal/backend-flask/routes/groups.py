@@ -1,10 +1,85 @@
-from flask import request, jsonify, g
+from flask import request, jsonify, g, Response, send_file, stream_with_context, current_app
 from flask_cors import cross_origin
+from functools import wraps
 import json
+import os
+
+from lib.db import LEARNER_HEADER
+from lib.export import group_header, json_array_chunks, ndjson_lines, write_group_export
+from lib.pagination import InvalidCursor, decode_cursor, encode_cursor, include_total, keyset_condition
+
+MAX_MEMBERSHIPS_PER_BATCH = 1000
+
+def catalog_write(view):
+  # Memberships are part of the catalog, which learner shards only attach
+  # read-only. Refuse the change instead of failing on the write.
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+    if current_app.db.learner() is not None:
+      return jsonify({"error": f"Group memberships are shared by every learner, send the request without {LEARNER_HEADER}"}), 403
+    return view(*args, **kwargs)
+  return wrapper
+
+# Body of the bulk membership endpoints: {"word_ids": [...]} or a bare array
+def parse_word_ids(data):
+  if isinstance(data, dict):
+    data = data.get('word_ids')
+  if not isinstance(data, list):
+    raise ValueError("Request body must be an array of word ids")
+  if len(data) > MAX_MEMBERSHIPS_PER_BATCH:
+    raise ValueError(f"At most {MAX_MEMBERSHIPS_PER_BATCH} words can be changed at once")
+  # int() would turn true into 1, 1.7 into 1 and "3" into 3, only JSON
+  # integers are word ids
+  if any(type(word_id) is not int for word_id in data):
+    raise ValueError("word_ids must be integers")
+  return sorted(set(data))
 
 def load(app):
+  def change_memberships(id, word_ids, add):
+    # Adds or removes the words in one transaction, the insert and delete
+    # triggers on word_groups keep groups.words_count (and the group's
+    # export version and due queue) current as part of it. None when the
+    # group does not exist.
+    cursor = app.db.cursor()
+    cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+    if not cursor.fetchone():
+      return None
+
+    ids = json.dumps(word_ids)
+    cursor.execute('SELECT id FROM words WHERE id IN (SELECT value FROM json_each(?))', (ids,))
+    existing = sorted(row["id"] for row in cursor.fetchall())
+    not_found = sorted(set(word_ids) - set(existing))
+
+    if add:
+      cursor.execute('''
+        INSERT OR IGNORE INTO word_groups (word_id, group_id)
+        SELECT value, ? FROM json_each(?)
+      ''', (id, json.dumps(existing)))
+    else:
+      cursor.execute('''
+        DELETE FROM word_groups
+        WHERE group_id = ? AND word_id IN (SELECT value FROM json_each(?))
+      ''', (id, json.dumps(existing)))
+    changed = cursor.rowcount
+
+    cursor.execute('SELECT words_count FROM groups WHERE id = ?', (id,))
+    words_count = cursor.fetchone()["words_count"]
+    app.db.commit()
+    if changed:
+      app.cache.bump('groups', 'word_groups')
+      app.sampler.invalidate(id)
+
+    return {
+      "group_id": id,
+      "added" if add else "removed": changed,
+      "unchanged": len(existing) - changed,
+      "not_found": not_found,
+      "word_count": words_count
+    }
+
   @app.route('/groups', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups')
   def get_groups():
     try:
       cursor = app.db.cursor()
@@ -60,6 +135,7 @@ def load(app):
 
   @app.route('/groups/<int:id>', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups')
   def get_group(id):
     try:
       cursor = app.db.cursor()
@@ -83,6 +159,8 @@ def load(app):
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  # Pass cursor= (empty for the first page) to switch to keyset pagination,
+  # and include_total=false to leave out total_pages.
   @app.route('/groups/<int:id>/words', methods=['GET'])
   @cross_origin()
   def get_group_words(id):
@@ -105,8 +183,36 @@ def load(app):
       if order not in ['asc', 'desc']:
         order = 'asc'
 
+      sort_expressions = {
+        'kanji': 'w.kanji',
+        'romaji': 'w.romaji',
+        'english': 'w.english',
+        'correct_count': 'COALESCE(wr.correct_count, 0)',
+        'wrong_count': 'COALESCE(wr.wrong_count, 0)'
+      }
+      sort_expression = sort_expressions[sort_by]
+
+      keyset = 'cursor' in request.args
+      seek = ''
+      params = [id]
+      if keyset and request.args['cursor']:
+        try:
+          after = decode_cursor(request.args['cursor'], sort_by, order)
+        except InvalidCursor as e:
+          return jsonify({"error": str(e)}), 400
+        seek = 'AND ' + keyset_condition(sort_expression, 'w.id', order)
+        params.extend(after)
+
+      if keyset:
+        # Fetch one extra row to know whether there is a next page
+        limit = 'LIMIT ?'
+        params.append(words_per_page + 1)
+      else:
+        limit = 'LIMIT ? OFFSET ?'
+        params.extend([words_per_page, offset])
+
       # First, check if the group exists
-      cursor.execute('SELECT name FROM groups WHERE id = ?', (id,))
+      cursor.execute('SELECT name, words_count FROM groups WHERE id = ?', (id,))
       group = cursor.fetchone()
       if not group:
         return jsonify({"error": "Group not found"}), 404
@@ -120,20 +226,25 @@ def load(app):
         JOIN word_groups wg ON w.id = wg.word_id
         LEFT JOIN word_reviews wr ON w.id = wr.word_id
         WHERE wg.group_id = ?
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
-      ''', (id, words_per_page, offset))
+        {seek}
+        ORDER BY {sort_expression} {order}, w.id {order}
+        {limit}
+      ''', params)
       
       words = cursor.fetchall()
 
-      # Get total words count for pagination
-      cursor.execute('''
-        SELECT COUNT(*) 
-        FROM word_groups 
-        WHERE group_id = ?
-      ''', (id,))
-      total_words = cursor.fetchone()[0]
-      total_pages = (total_words + words_per_page - 1) // words_per_page
+      next_cursor = None
+      if keyset and len(words) > words_per_page:
+        words = words[:words_per_page]
+        last = words[-1]
+        next_cursor = encode_cursor(sort_by, order, last[sort_by], last["id"])
+
+      # Total pages from the words_count counter cache, kept current by the
+      # word_groups triggers (sql/migrations/0012_group_words_count.sql)
+      total_pages = None
+      if include_total(request.args):
+        total_words = group["words_count"] or 0
+        total_pages = (total_words + words_per_page - 1) // words_per_page
 
       # Format the response
       words_data = []
@@ -147,6 +258,13 @@ def load(app):
           "wrong_count": word["wrong_count"]
         })
 
+      if keyset:
+        return jsonify({
+          'words': words_data,
+          'next_cursor': next_cursor,
+          'total_pages': total_pages
+        })
+
       return jsonify({
         'words': words_data,
         'total_pages': total_pages,
@@ -157,6 +275,7 @@ def load(app):
 
   @app.route('/groups/<int:id>/words/raw', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups', 'word_groups', 'words')
   def get_group_words_raw(id):
     try:
       cursor = app.db.cursor()
@@ -199,6 +318,253 @@ def load(app):
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  # Endpoint: POST /groups/:id/words with {"word_ids": [...]} adds words to
+  # the group, DELETE with the same body removes them. Words that already
+  # are (or are not) members count as unchanged, unknown ids are listed in
+  # not_found. word_count is the group's size after the change.
+  @app.route('/groups/<int:id>/words', methods=['POST', 'DELETE'])
+  @cross_origin()
+  @catalog_write
+  def change_group_words(id):
+    try:
+      try:
+        word_ids = parse_word_ids(request.get_json(silent=True))
+      except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+      result = change_memberships(id, word_ids, add=request.method == 'POST')
+      if result is None:
+        return jsonify({"error": "Group not found"}), 404
+      return jsonify(result)
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: POST or DELETE /groups/:id/words/:word_id for a single word
+  @app.route('/groups/<int:id>/words/<int:word_id>', methods=['POST', 'DELETE'])
+  @cross_origin()
+  @catalog_write
+  def change_group_word(id, word_id):
+    try:
+      add = request.method == 'POST'
+      result = change_memberships(id, [word_id], add=add)
+      if result is None:
+        return jsonify({"error": "Group not found"}), 404
+      if result["not_found"]:
+        return jsonify({"error": "Word not found"}), 404
+      if not add and not result["removed"]:
+        return jsonify({"error": "Word is not in the group"}), 404
+      return jsonify(result), 201 if add and result["added"] else 200
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /groups/:id/export?format=ndjson|json streams the group
+  # with every word and its parts while the rows are read, see lib/export.py.
+  # format=json produces the document of /groups/:id/words/raw plus the version.
+  @app.route('/groups/<int:id>/export', methods=['GET'])
+  @cross_origin()
+  def export_group(id):
+    try:
+      export_format = request.args.get('format', 'ndjson')
+      if export_format not in ['ndjson', 'json']:
+        return jsonify({"error": "format must be ndjson or json"}), 400
+
+      cursor = app.db.cursor()
+      header = group_header(cursor, id)
+      if header is None:
+        return jsonify({"error": "Group not found"}), 404
+
+      if export_format == 'json':
+        chunks = json_array_chunks(cursor, header)
+        mimetype = 'application/json'
+      else:
+        chunks = ndjson_lines(cursor, header)
+        mimetype = 'application/x-ndjson'
+      # The request context, and with it the pooled connection, stays open
+      # until the last chunk was sent
+      return Response(stream_with_context(chunks), mimetype=mimetype)
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /groups/:id/export.ndjson.gz serves the precomputed gzipped
+  # NDJSON export. It is written again on the first request after the group
+  # changed (group_versions), the version doubles as the ETag.
+  @app.route('/groups/<int:id>/export.ndjson.gz', methods=['GET'])
+  @cross_origin()
+  def export_group_file(id):
+    try:
+      path, header = write_group_export(app.db.get(), id, app.config.get('EXPORT_DIR', 'exports'))
+      if path is None:
+        return jsonify({"error": "Group not found"}), 404
+
+      response = send_file(
+        os.path.abspath(path),
+        mimetype='application/x-ndjson',
+        as_attachment=True,
+        download_name=f'group_{id}.ndjson.gz',
+        etag=f'group-{id}-v{header["version"]}',
+        conditional=True
+      )
+      response.headers['X-Group-Version'] = str(header["version"])
+      return response
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /groups/:id/due?limit=N for the next cards to study. Words
+  # whose spaced-repetition due date has passed come first, oldest due date
+  # first, then words never reviewed fill the rest unless new=false.
+  @app.route('/groups/<int:id>/due', methods=['GET'])
+  @cross_origin()
+  def get_group_due_words(id):
+    try:
+      cursor = app.db.cursor()
+
+      limit = request.args.get('limit', 20, type=int)
+      limit = min(max(1, limit), 100)
+      include_new = request.args.get('new', 'true').lower() != 'false'
+
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+
+      # A learner shard's copy of the group's memberships, and so its due
+      # queue, may be behind the catalog. This is a read, the copy is brought
+      # up to date when the learner starts a session (POST /study_sessions).
+      # Until then the queue is computed from the catalog's memberships,
+      # which reads every member of the group.
+      if app.db.group_synced(id):
+        queue = 'group_due_queue'
+      else:
+        queue = '''(
+          SELECT wg.group_id, wg.word_id, ws.due_at
+          FROM word_groups wg
+          JOIN word_schedule ws ON ws.word_id = wg.word_id
+        )'''
+
+      # Range scan of (group_id, due_at), stops after `limit` rows
+      cursor.execute(f'''
+        SELECT w.id, w.kanji, w.romaji, w.english,
+               ws.due_at, ws.interval_days, ws.ease, ws.repetitions
+        FROM {queue} q
+        JOIN words w ON w.id = q.word_id
+        JOIN word_schedule ws ON ws.word_id = q.word_id
+        WHERE q.group_id = ? AND q.due_at <= datetime('now')
+        ORDER BY q.due_at, q.word_id
+        LIMIT ?
+      ''', (id, limit))
+      due = cursor.fetchall()
+
+      new_words = []
+      if include_new and len(due) < limit:
+        cursor.execute(f'''
+          SELECT w.id, w.kanji, w.romaji, w.english
+          FROM word_groups wg
+          JOIN words w ON w.id = wg.word_id
+          WHERE wg.group_id = ?
+            AND NOT EXISTS (
+              SELECT 1 FROM {queue} q
+              WHERE q.group_id = wg.group_id AND q.word_id = wg.word_id
+            )
+          ORDER BY wg.word_id
+          LIMIT ?
+        ''', (id, limit - len(due)))
+        new_words = cursor.fetchall()
+
+      # When the next scheduled word becomes due
+      cursor.execute(f'''
+        SELECT MIN(due_at)
+        FROM {queue} q
+        WHERE group_id = ? AND due_at > datetime('now')
+      ''', (id,))
+      next_due_at = cursor.fetchone()[0]
+
+      words_data = []
+      for word in due:
+        words_data.append({
+          "id": word["id"],
+          "kanji": word["kanji"],
+          "romaji": word["romaji"],
+          "english": word["english"],
+          "new": False,
+          "due_at": word["due_at"],
+          "interval_days": word["interval_days"],
+          "ease": word["ease"],
+          "repetitions": word["repetitions"]
+        })
+      for word in new_words:
+        words_data.append({
+          "id": word["id"],
+          "kanji": word["kanji"],
+          "romaji": word["romaji"],
+          "english": word["english"],
+          "new": True,
+          "due_at": None,
+          "interval_days": None,
+          "ease": None,
+          "repetitions": 0
+        })
+
+      return jsonify({
+        "group_id": id,
+        "words": words_data,
+        "next_due_at": next_due_at
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /groups/:id/sample?n=N&weight=errors for a random quiz set.
+  # Words are drawn without replacement, weighted by their error rate from
+  # the in-memory weight tree of the group (see lib/sampler.py), or uniformly
+  # with weight=uniform. Only the drawn words are read from the database.
+  @app.route('/groups/<int:id>/sample', methods=['GET'])
+  @cross_origin()
+  def get_group_sample(id):
+    try:
+      cursor = app.db.cursor()
+
+      n = request.args.get('n', 10, type=int)
+      n = min(max(1, n), 100)
+      weight = request.args.get('weight', 'errors')
+      if weight not in ['errors', 'uniform']:
+        return jsonify({"error": "weight must be errors or uniform"}), 400
+
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+
+      word_ids = app.sampler.sample(cursor, id, n, weighted=weight == 'errors', learner=app.db.learner())
+
+      cursor.execute('''
+        SELECT w.id, w.kanji, w.romaji, w.english,
+               COALESCE(r.correct_count, 0) AS correct_count,
+               COALESCE(r.wrong_count, 0) AS wrong_count
+        FROM words w
+        LEFT JOIN word_reviews r ON r.word_id = w.id
+        WHERE w.id IN (SELECT value FROM json_each(?))
+      ''', (json.dumps(word_ids),))
+      words = {word["id"]: word for word in cursor.fetchall()}
+
+      # Keep the order of the draw
+      words_data = []
+      for word_id in word_ids:
+        word = words.get(word_id)
+        if word is None:
+          continue
+        words_data.append({
+          "id": word["id"],
+          "kanji": word["kanji"],
+          "romaji": word["romaji"],
+          "english": word["english"],
+          "correct_count": word["correct_count"],
+          "wrong_count": word["wrong_count"]
+        })
+
+      return jsonify({
+        "group_id": id,
+        "weight": weight,
+        "words": words_data
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
   @app.route('/groups/<int:id>/study_sessions', methods=['GET'])
   @cross_origin()
   def get_group_study_sessions(id):
@@ -214,17 +580,19 @@ def load(app):
       sort_by = request.args.get('sort_by', 'created_at')
       order = request.args.get('order', 'desc')  # Default to newest first
 
-      # Map frontend sort keys to database columns
+      # Map frontend sort keys to result columns
       sort_mapping = {
-        'startTime': 'created_at',
-        'endTime': 'last_activity_time',
-        'activityName': 'a.name',
-        'groupName': 'g.name',
+        'startTime': 'start_time',
+        'endTime': 'end_time',
+        'activityName': 'activity_name',
+        'groupName': 'group_name',
         'reviewItemsCount': 'review_count'
       }
 
-      # Use mapped sort column or default to created_at
-      sort_column = sort_mapping.get(sort_by, 'created_at')
+      # Use mapped sort column or default to the start time
+      sort_column = sort_mapping.get(sort_by, 'start_time')
+      if order not in ['asc', 'desc']:
+        order = 'desc'
 
       # Get total count for pagination
       cursor.execute('''
@@ -235,42 +603,68 @@ def load(app):
       total_sessions = cursor.fetchone()[0]
       total_pages = (total_sessions + sessions_per_page - 1) // sessions_per_page
 
-      # Get study sessions for this group with dynamic calculations
+      # Review counts and last activity come from one grouped pass over
+      # word_review_items, limited to the sessions that can end up on the page,
+      # plus the counts of their archived reviews.
+      # The default sort by start time picks the page straight from the
+      # (group_id, created_at) index first, so its cost does not grow with the
+      # number of sessions in the group. Other sorts need every session of the
+      # group (and its aggregates) before they can be ordered.
+      if sort_column == 'start_time':
+        page_limit = f'ORDER BY s.created_at {order}, s.id {order} LIMIT ? OFFSET ?'
+        page_params = (id, sessions_per_page, offset)
+        outer_limit = ''
+        outer_params = ()
+      else:
+        page_limit = ''
+        page_params = (id,)
+        outer_limit = 'LIMIT ? OFFSET ?'
+        outer_params = (sessions_per_page, offset)
+
       cursor.execute(f'''
-        SELECT 
-          s.id,
-          s.group_id,
-          s.study_activity_id,
-          s.created_at as start_time,
-          (
-            SELECT MAX(created_at)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as last_activity_time,
+        WITH page AS (
+          SELECT
+            s.id,
+            s.group_id,
+            s.study_activity_id,
+            s.created_at as start_time
+          FROM study_sessions s
+          WHERE s.group_id = ?
+          {page_limit}
+        )
+        SELECT
+          page.*,
           a.name as activity_name,
           g.name as group_name,
-          (
-            SELECT COUNT(*)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as review_count
-        FROM study_sessions s
-        JOIN study_activities a ON s.study_activity_id = a.id
-        JOIN groups g ON s.group_id = g.id
-        WHERE s.group_id = ?
-        ORDER BY {sort_column} {order}
-        LIMIT ? OFFSET ?
-      ''', (id, sessions_per_page, offset))
+          COALESCE(
+            MAX(wri.last_activity_time, ar.last_activity_at),
+            wri.last_activity_time,
+            ar.last_activity_at,
+            datetime(page.start_time, '+30 minutes')
+          ) as end_time,
+          COALESCE(wri.review_count, 0) + COALESCE(ar.review_items_count, 0) as review_count
+        FROM page
+        JOIN study_activities a ON page.study_activity_id = a.id
+        JOIN groups g ON page.group_id = g.id
+        LEFT JOIN (
+          SELECT
+            study_session_id,
+            MAX(created_at) as last_activity_time,
+            COUNT(*) as review_count
+          FROM word_review_items
+          WHERE study_session_id IN (SELECT id FROM page)
+          GROUP BY study_session_id
+        ) wri ON wri.study_session_id = page.id
+        LEFT JOIN archived_session_reviews ar ON ar.study_session_id = page.id
+        ORDER BY {sort_column} {order}, page.id {order}
+        {outer_limit}
+      ''', page_params + outer_params)
       
       sessions = cursor.fetchall()
       sessions_data = []
       
       for session in sessions:
-        # If there's no last_activity_time, use start_time + 30 minutes
-        end_time = session["last_activity_time"]
-        if not end_time:
-            end_time = cursor.execute('SELECT datetime(?, "+30 minutes")', (session["start_time"],)).fetchone()[0]
-        
+        # Sessions without any review end 30 minutes after they started
         sessions_data.append({
           "id": session["id"],
           "group_id": session["group_id"],
@@ -278,7 +672,7 @@ def load(app):
           "study_activity_id": session["study_activity_id"],
           "activity_name": session["activity_name"],
           "start_time": session["start_time"],
-          "end_time": end_time,
+          "end_time": session["end_time"],
           "review_items_count": session["review_count"]
         })
 
@@ -0,0 +1,27 @@
+from flask import jsonify, request
+
+def load(app):
+  # Endpoint: GET /internal/db/pool to inspect the sqlite connection pool
+  @app.route('/internal/db/pool', methods=['GET'])
+  def get_db_pool_stats():
+    return jsonify(app.db.pool.stats())
+
+  # Endpoint: GET /internal/cache to inspect the response cache
+  @app.route('/internal/cache', methods=['GET'])
+  def get_response_cache_stats():
+    return jsonify(app.cache.stats())
+
+  # Endpoint: GET /internal/sampler to inspect the quiz sampler weight trees
+  @app.route('/internal/sampler', methods=['GET'])
+  def get_sampler_stats():
+    return jsonify(app.sampler.stats())
+
+  # Endpoint: GET /internal/profile for latency percentiles per route, only
+  # when the app runs with PROFILING on. DELETE resets the collected samples.
+  @app.route('/internal/profile', methods=['GET', 'DELETE'])
+  def get_profile():
+    if app.profiler is None:
+      return jsonify({"error": "Profiling is disabled, set PROFILING=True"}), 404
+    if request.method == 'DELETE':
+      app.profiler.reset()
+    return jsonify(app.profiler.stats())
@@ -0,0 +1,19 @@
+from flask import jsonify
+from flask_cors import cross_origin
+
+def load(app):
+  # Endpoint: GET /api/jobs for the recent background jobs, newest first.
+  # With learner shards only the jobs of the request's learner are listed.
+  @app.route('/api/jobs', methods=['GET'])
+  @cross_origin()
+  def get_jobs():
+    return jsonify({'jobs': app.jobs.list(app.db.learner())})
+
+  # Endpoint: GET /api/jobs/:id for the status and progress of one job
+  @app.route('/api/jobs/<int:id>', methods=['GET'])
+  @cross_origin()
+  def get_job(id):
+    job = app.jobs.get(id, app.db.learner())
+    if job is None:
+      return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
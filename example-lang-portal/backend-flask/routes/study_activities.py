@@ -5,6 +5,7 @@ import math
 def load(app):
     @app.route('/api/study-activities', methods=['GET'])
     @cross_origin()
+    @app.cache.cached('study_activities')
     def get_study_activities():
         cursor = app.db.cursor()
         cursor.execute('SELECT id, name, url, preview_url FROM study_activities')
@@ -19,6 +20,7 @@ def load(app):
 
     @app.route('/api/study-activities/<int:id>', methods=['GET'])
     @cross_origin()
+    @app.cache.cached('study_activities')
     def get_study_activity(id):
         cursor = app.db.cursor()
         cursor.execute('SELECT id, name, url, preview_url FROM study_activities WHERE id = ?', (id,))
@@ -67,11 +69,12 @@ def load(app):
                 sa.name as activity_name,
                 ss.created_at,
                 ss.study_activity_id as activity_id,
-                COUNT(wri.id) as review_items_count
+                COUNT(wri.id) + COALESCE(ar.review_items_count, 0) as review_items_count
             FROM study_sessions ss
             JOIN groups g ON g.id = ss.group_id
             JOIN study_activities sa ON sa.id = ss.study_activity_id
             LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
+            LEFT JOIN archived_session_reviews ar ON ar.study_session_id = ss.id
             WHERE ss.study_activity_id = ?
             GROUP BY ss.id, ss.group_id, g.name, sa.name, ss.created_at, ss.study_activity_id
             ORDER BY ss.created_at DESC
@@ -98,6 +101,7 @@ def load(app):
 
     @app.route('/api/study-activities/<int:id>/launch', methods=['GET'])
     @cross_origin()
+    @app.cache.cached('study_activities', 'groups')
     def get_study_activity_launch_data(id):
         cursor = app.db.cursor()
         
@@ -1,8 +1,23 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
-from datetime import datetime
+from datetime import datetime, timezone
+import json
 import math
 
+from lib.jobs import JobConflict
+from lib.reset import reset_history
+
+MAX_REVIEWS_PER_BATCH = 1000
+
+# answered_at is an ISO 8601 timestamp, stored in UTC like CURRENT_TIMESTAMP
+def parse_answered_at(value):
+  if value is None:
+    return None
+  answered_at = datetime.fromisoformat(str(value))
+  if answered_at.tzinfo is not None:
+    answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+  return answered_at.strftime('%Y-%m-%d %H:%M:%S')
+
 def load(app):
   @app.route('/study_sessions', methods=['POST'])
   @cross_origin()
@@ -43,10 +58,15 @@ def load(app):
       ''', (group_id, study_activity_id, datetime.now()))
       
       app.db.commit()
+      app.cache.bump('study_sessions')
       
       # Get the id of the newly created session
       session_id = cursor.lastrowid
 
+      # Bring the learner's copy of the group's memberships up to date for
+      # GET /groups/:id/due, here because it writes to the shard
+      app.db.sync_group(group['id'])
+
       return jsonify({"session_id": session_id}), 201
     except Exception as e:
       return jsonify({"error": str(e)}), 500
@@ -62,12 +82,11 @@ def load(app):
       per_page = request.args.get('per_page', 10, type=int)
       offset = (page - 1) * per_page
 
-      # Get total count
+      # Get total count (sessions always reference an existing group and
+      # activity, so no joins are needed and the count stays on an index)
       cursor.execute('''
         SELECT COUNT(*) as count 
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
+        FROM study_sessions
       ''')
       total_count = cursor.fetchone()['count']
 
@@ -80,12 +99,15 @@ def load(app):
           sa.id as activity_id,
           sa.name as activity_name,
           ss.created_at,
-          COUNT(wri.id) as review_items_count
+          (
+            SELECT COUNT(*)
+            FROM word_review_items wri
+            WHERE wri.study_session_id = ss.id
+          ) + COALESCE(ar.review_items_count, 0) as review_items_count
         FROM study_sessions ss
+        LEFT JOIN archived_session_reviews ar ON ar.study_session_id = ss.id
         JOIN groups g ON g.id = ss.group_id
         JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-        GROUP BY ss.id
         ORDER BY ss.created_at DESC
         LIMIT ? OFFSET ?
       ''', (per_page, offset))
@@ -116,7 +138,9 @@ def load(app):
     try:
       cursor = app.db.cursor()
       
-      # Get session details
+      # Get session details. A session can have archived reviews, so its
+      # history is read through word_review_items_history, where the
+      # study_session_id filter reaches the index of every archive table.
       cursor.execute('''
         SELECT 
           ss.id,
@@ -125,14 +149,16 @@ def load(app):
           sa.id as activity_id,
           sa.name as activity_name,
           ss.created_at,
-          COUNT(wri.id) as review_items_count
+          (
+            SELECT COUNT(*)
+            FROM word_review_items_history
+            WHERE study_session_id = ?
+          ) as review_items_count
         FROM study_sessions ss
         JOIN groups g ON g.id = ss.group_id
         JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
         WHERE ss.id = ?
-        GROUP BY ss.id
-      ''', (id,))
+      ''', (id, id))
       
       session = cursor.fetchone()
       if not session:
@@ -150,7 +176,7 @@ def load(app):
           COALESCE(SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END), 0) as session_correct_count,
           COALESCE(SUM(CASE WHEN wri.correct = 0 THEN 1 ELSE 0 END), 0) as session_wrong_count
         FROM words w
-        JOIN word_review_items wri ON wri.word_id = w.id
+        JOIN word_review_items_history wri ON wri.word_id = w.id
         WHERE wri.study_session_id = ?
         GROUP BY w.id
         ORDER BY w.kanji
@@ -163,7 +189,7 @@ def load(app):
       cursor.execute('''
         SELECT COUNT(DISTINCT w.id) as count
         FROM words w
-        JOIN word_review_items wri ON wri.word_id = w.id
+        JOIN word_review_items_history wri ON wri.word_id = w.id
         WHERE wri.study_session_id = ?
       ''', (id,))
       
@@ -207,61 +233,159 @@ def load(app):
     if word_id is None or correct is None:
         return jsonify({"error": "word_id and correct fields are required"}), 400
 
-    # Check if word exists
-    cursor.execute('SELECT id FROM words WHERE id = ?', (word_id,))
-    if not cursor.fetchone():
-        return jsonify({"error": "Word not found"}), 404
+    # Insert the individual review attempt into word_review_items. The insert
+    # only happens if both the word and the study session exist, and the
+    # word_reviews aggregate is updated by a trigger in the same transaction.
+    cursor.execute('''
+        INSERT INTO word_review_items (word_id, correct, study_session_id)
+        SELECT w.id, ?, ss.id
+        FROM words w, study_sessions ss
+        WHERE w.id = ? AND ss.id = ?
+    ''', (1 if correct else 0, word_id, id))
 
-    # Check if study session exists
-    cursor.execute('SELECT id FROM study_sessions WHERE id = ?', (id,))
-    if not cursor.fetchone():
+    if cursor.rowcount == 0:
+        # Nothing was inserted, find out which one is missing
+        cursor.execute('SELECT id FROM words WHERE id = ?', (word_id,))
+        if not cursor.fetchone():
+            return jsonify({"error": "Word not found"}), 404
         return jsonify({"error": "Study session not found"}), 404
 
-    # Insert the individual review attempt into word_review_items
-    cursor.execute('''
-        INSERT INTO word_review_items (word_id, correct, study_session_id) VALUES (?, ?, ?)
-    ''', (word_id, correct, id))
-    
-    # Update or insert aggregate review record in word_reviews
-    cursor.execute('''
-        SELECT * FROM word_reviews WHERE word_id = ?
-    ''', (word_id,))
-    review = cursor.fetchone()
-
-    if review:
-        # Update existing record
-        if correct:
-            cursor.execute('''
-           UPDATE word_reviews SET correct_count = correct_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-        else:
-            cursor.execute('''
-                UPDATE word_reviews SET wrong_count = wrong_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
-            VALUES (?, ?, ?, ?)
-        ''', (word_id, 1 if correct else 0, 0 if correct else 1, datetime.now()))
-
     app.db.commit()
+    app.cache.bump('word_review_items', 'word_reviews')
+    app.sampler.update(cursor, [word_id], learner=app.db.learner())
     return jsonify({"message": "Review logged successfully"})
 
+  # Endpoint: POST /study_sessions/:id/reviews to log a whole round of answers
+  # at once. Takes a JSON array of {word_id, correct, answered_at} objects and
+  # reports a result per item, valid items are stored in a single transaction.
+  @app.route('/study_sessions/<id>/reviews', methods=['POST'])
+  @cross_origin()
+  def log_reviews(id):
+    try:
+      data = request.get_json(silent=True)
+      if isinstance(data, dict):
+        data = data.get('reviews')
+      if not isinstance(data, list):
+        return jsonify({"error": "Request body must be an array of reviews"}), 400
+      if len(data) > MAX_REVIEWS_PER_BATCH:
+        return jsonify({"error": f"At most {MAX_REVIEWS_PER_BATCH} reviews can be logged at once"}), 400
+
+      cursor = app.db.cursor()
+
+      # Check if study session exists
+      cursor.execute('SELECT id FROM study_sessions WHERE id = ?', (id,))
+      session = cursor.fetchone()
+      if not session:
+        return jsonify({"error": "Study session not found"}), 404
+
+      results = []
+      pending = []
+      for index, item in enumerate(data):
+        result = {"index": index, "word_id": item.get('word_id') if isinstance(item, dict) else None}
+        results.append(result)
+        if not isinstance(item, dict) or item.get('word_id') is None or item.get('correct') is None:
+          result.update({"status": "error", "error": "word_id and correct fields are required"})
+          continue
+        # int() would turn true into 1 and "3" into 3, only JSON integers are word ids
+        word_id = item['word_id']
+        if type(word_id) is not int:
+          result.update({"status": "error", "error": "word_id must be an integer"})
+          continue
+        if not isinstance(item['correct'], bool):
+          result.update({"status": "error", "error": "correct must be true or false"})
+          continue
+        try:
+          answered_at = parse_answered_at(item.get('answered_at'))
+        except (TypeError, ValueError):
+          result.update({"status": "error", "error": "answered_at must be an ISO 8601 timestamp"})
+          continue
+        pending.append((result, (word_id, 1 if item['correct'] else 0, session["id"], answered_at)))
+
+      # Validate every word id with a single query
+      word_ids = sorted({row[0] for _, row in pending})
+      cursor.execute('''
+        SELECT id FROM words WHERE id IN (SELECT value FROM json_each(?))
+      ''', (json.dumps(word_ids),))
+      existing = {row["id"] for row in cursor.fetchall()}
+
+      rows = []
+      for result, row in pending:
+        if row[0] not in existing:
+          result.update({"status": "error", "error": "Word not found"})
+          continue
+        result["status"] = "created"
+        rows.append(row)
+
+      # One transaction for the whole batch, the word_reviews aggregate is
+      # updated by the insert trigger as part of it
+      if rows:
+        cursor.executemany('''
+          INSERT INTO word_review_items (word_id, correct, study_session_id, created_at)
+          VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+        ''', rows)
+        app.db.commit()
+        app.cache.bump('word_review_items', 'word_reviews')
+        app.sampler.update(cursor, [row[0] for row in rows], learner=app.db.learner())
+
+      return jsonify({
+        "created": len(rows),
+        "failed": len(results) - len(rows),
+        "results": results
+      }), 201 if rows or not results else 400
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: POST /api/study-sessions/reset to clear the study history in
+  # the background. Optional group_id and study_activity_id (JSON body or
+  # query string) limit the reset to matching sessions. Returns 202 with a
+  # job to poll at GET /api/jobs/<id>.
   @app.route('/api/study-sessions/reset', methods=['POST'])
   @cross_origin()
   def reset_study_sessions():
     try:
-      cursor = app.db.cursor()
-      
-      # First delete all word review items since they have foreign key constraints
-      cursor.execute('DELETE FROM word_review_items')
-      
-      # Then delete all study sessions
-      cursor.execute('DELETE FROM study_sessions')
-      
-      app.db.commit()
-      
-      return jsonify({"message": "Study history cleared successfully"}), 200
+      data = request.get_json(silent=True) or {}
+      try:
+        group_id = data.get('group_id', request.args.get('group_id'))
+        study_activity_id = data.get('study_activity_id', request.args.get('study_activity_id'))
+        group_id = int(group_id) if group_id is not None else None
+        study_activity_id = int(study_activity_id) if study_activity_id is not None else None
+      except (TypeError, ValueError):
+        return jsonify({"error": "group_id and study_activity_id must be integers"}), 400
+
+      # Jobs run outside of the request, the learner's shard is picked here
+      learner = app.db.learner()
+
+      def run(job, group_id, study_activity_id):
+        learner = job.learner
+
+        def on_batch(sessions, reviews, total):
+          job.update(sessions_deleted=sessions, reviews_deleted=reviews, sessions_total=total)
+          # Listings must not show sessions that are already gone
+          app.cache.bump('word_review_items', 'study_sessions')
+
+        with app.db.pool_for(learner).connection() as connection:
+          job.update(sessions_deleted=0, reviews_deleted=0)
+          reset_history(
+            connection,
+            group_id=group_id,
+            study_activity_id=study_activity_id,
+            batch_size=app.config.get('RESET_BATCH_SIZE', 200),
+            on_batch=on_batch
+          )
+        app.cache.bump('word_review_items', 'study_sessions')
+        app.sampler.clear(learner)
+
+      try:
+        job = app.jobs.submit(
+          'reset_study_sessions', run, exclusive=True,
+          group_id=group_id, study_activity_id=study_activity_id, learner=learner
+        )
+      except JobConflict as e:
+        return jsonify({"error": str(e), "job": e.job.to_dict()}), 409
+
+      response = jsonify({"message": "Study history reset started", "job": job.to_dict()})
+      response.status_code = 202
+      response.headers['Location'] = f'/api/jobs/{job.id}'
+      return response
     except Exception as e:
       return jsonify({"error": str(e)}), 500
\ No newline at end of file
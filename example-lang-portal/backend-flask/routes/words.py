@@ -2,8 +2,17 @@ from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
 
+from lib.pagination import InvalidCursor, decode_cursor, encode_cursor, include_total, keyset_condition
+
+# Turns free text into an FTS5 query where every term is a quoted prefix match
+def fts_query(text):
+  terms = text.split()
+  return ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+
 def load(app):
   # Endpoint: GET /words with pagination (50 words per page)
+  # Pass cursor= (empty for the first page) to switch to keyset pagination,
+  # and include_total=false to skip counting the whole table.
   @app.route('/words', methods=['GET'])
   @cross_origin()
   def get_words():
@@ -28,6 +37,34 @@ def load(app):
       if order not in ['asc', 'desc']:
         order = 'asc'
 
+      sort_expressions = {
+        'kanji': 'w.kanji',
+        'romaji': 'w.romaji',
+        'english': 'w.english',
+        'correct_count': 'COALESCE(r.correct_count, 0)',
+        'wrong_count': 'COALESCE(r.wrong_count, 0)'
+      }
+      sort_expression = sort_expressions[sort_by]
+
+      keyset = 'cursor' in request.args
+      where = ''
+      params = []
+      if keyset and request.args['cursor']:
+        try:
+          after = decode_cursor(request.args['cursor'], sort_by, order)
+        except InvalidCursor as e:
+          return jsonify({"error": str(e)}), 400
+        where = 'WHERE ' + keyset_condition(sort_expression, 'w.id', order)
+        params.extend(after)
+
+      if keyset:
+        # Fetch one extra row to know whether there is a next page
+        limit = 'LIMIT ?'
+        params.append(words_per_page + 1)
+      else:
+        limit = 'LIMIT ? OFFSET ?'
+        params.extend([words_per_page, offset])
+
       # Query to fetch words with sorting
       cursor.execute(f'''
         SELECT w.id, w.kanji, w.romaji, w.english, 
@@ -35,16 +72,26 @@ def load(app):
             COALESCE(r.wrong_count, 0) AS wrong_count
         FROM words w
         LEFT JOIN word_reviews r ON w.id = r.word_id
-        ORDER BY {sort_by} {order}
-        LIMIT ? OFFSET ?
-      ''', (words_per_page, offset))
+        {where}
+        ORDER BY {sort_expression} {order}, w.id {order}
+        {limit}
+      ''', params)
 
       words = cursor.fetchall()
 
+      next_cursor = None
+      if keyset and len(words) > words_per_page:
+        words = words[:words_per_page]
+        last = words[-1]
+        next_cursor = encode_cursor(sort_by, order, last[sort_by], last["id"])
+
       # Query the total number of words
-      cursor.execute('SELECT COUNT(*) FROM words')
-      total_words = cursor.fetchone()[0]
-      total_pages = (total_words + words_per_page - 1) // words_per_page
+      total_words = None
+      total_pages = None
+      if include_total(request.args):
+        cursor.execute('SELECT COUNT(*) FROM words')
+        total_words = cursor.fetchone()[0]
+        total_pages = (total_words + words_per_page - 1) // words_per_page
 
       # Format the response
       words_data = []
@@ -58,6 +105,14 @@ def load(app):
           "wrong_count": word["wrong_count"]
         })
 
+      if keyset:
+        return jsonify({
+          "words": words_data,
+          "next_cursor": next_cursor,
+          "total_pages": total_pages,
+          "total_words": total_words
+        })
+
       return jsonify({
         "words": words_data,
         "total_pages": total_pages,
@@ -67,8 +122,78 @@ def load(app):
 
     except Exception as e:
       return jsonify({"error": str(e)}), 500
-    finally:
-      app.db.close()
+
+  # Endpoint: GET /words/search?q= full-text search over kanji, romaji and
+  # english. Every term is matched as a prefix and results are ranked by BM25.
+  # Optional group_id filter, keyset pagination with cursor/next_cursor.
+  @app.route('/words/search', methods=['GET'])
+  @cross_origin()
+  def search_words():
+    try:
+      query = fts_query(request.args.get('q', ''))
+      if not query:
+        return jsonify({"error": "q is required"}), 400
+
+      limit = request.args.get('limit', 50, type=int)
+      limit = min(max(1, limit), 100)
+      group_id = request.args.get('group_id', type=int)
+
+      params = [query]
+      group_join = ''
+      if group_id is not None:
+        group_join = 'JOIN word_groups wg ON wg.word_id = w.id AND wg.group_id = ?'
+        params.append(group_id)
+
+      seek = ''
+      if request.args.get('cursor'):
+        try:
+          after = decode_cursor(request.args['cursor'], 'rank', 'asc')
+        except InvalidCursor as e:
+          return jsonify({"error": str(e)}), 400
+        seek = 'WHERE ' + keyset_condition('f.rank', 'f.id', 'asc')
+        params.extend(after)
+      # Fetch one extra row to know whether there is a next page
+      params.append(limit + 1)
+
+      cursor = app.db.cursor()
+      cursor.execute(f'''
+        SELECT w.id, w.kanji, w.romaji, w.english,
+            COALESCE(r.correct_count, 0) AS correct_count,
+            COALESCE(r.wrong_count, 0) AS wrong_count,
+            f.rank
+        FROM (
+          SELECT rowid AS id, bm25(words_fts) AS rank
+          FROM words_fts
+          WHERE words_fts MATCH ?
+        ) f
+        JOIN words w ON w.id = f.id
+        {group_join}
+        LEFT JOIN word_reviews r ON r.word_id = w.id
+        {seek}
+        ORDER BY f.rank, f.id
+        LIMIT ?
+      ''', params)
+      words = cursor.fetchall()
+
+      next_cursor = None
+      if len(words) > limit:
+        words = words[:limit]
+        next_cursor = encode_cursor('rank', 'asc', words[-1]["rank"], words[-1]["id"])
+
+      return jsonify({
+        "words": [{
+          "id": word["id"],
+          "kanji": word["kanji"],
+          "romaji": word["romaji"],
+          "english": word["english"],
+          "correct_count": word["correct_count"],
+          "wrong_count": word["wrong_count"],
+          "score": -word["rank"]
+        } for word in words],
+        "next_cursor": next_cursor
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
 
   # Endpoint: GET /words/:id to get a single word with its details
   @app.route('/words/<int:word_id>', methods=['GET'])
@@ -0,0 +1,66 @@
+-- Secondary indexes for the joins, filters and sorts used in routes/*.py.
+-- Every statement is idempotent so the migration can be re-run safely.
+
+-- word_reviews holds one aggregate row per word. Earlier versions of
+-- log_review could race and insert duplicates, fold them into the oldest row
+-- before adding the unique index.
+UPDATE word_reviews
+SET
+  correct_count = (SELECT SUM(correct_count) FROM word_reviews d WHERE d.word_id = word_reviews.word_id),
+  wrong_count = (SELECT SUM(wrong_count) FROM word_reviews d WHERE d.word_id = word_reviews.word_id),
+  last_reviewed = (SELECT MAX(last_reviewed) FROM word_reviews d WHERE d.word_id = word_reviews.word_id)
+WHERE id IN (
+  SELECT MIN(id) FROM word_reviews GROUP BY word_id HAVING COUNT(*) > 1
+);
+
+DELETE FROM word_reviews
+WHERE id NOT IN (SELECT MIN(id) FROM word_reviews GROUP BY word_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_word_reviews_word_id
+  ON word_reviews (word_id);
+
+-- word_groups is a pure join table, (group_id, word_id) is its natural key
+DELETE FROM word_groups
+WHERE rowid NOT IN (SELECT MIN(rowid) FROM word_groups GROUP BY group_id, word_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_word_groups_group_word
+  ON word_groups (group_id, word_id);
+
+-- Reverse lookup used by GET /words/<id> to list the groups of a word
+CREATE INDEX IF NOT EXISTS idx_word_groups_word_group
+  ON word_groups (word_id, group_id);
+
+-- Sortable word listings (/words, /groups/<id>/words), covering the listed columns
+CREATE INDEX IF NOT EXISTS idx_words_kanji
+  ON words (kanji, romaji, english);
+
+CREATE INDEX IF NOT EXISTS idx_words_romaji
+  ON words (romaji, kanji, english);
+
+CREATE INDEX IF NOT EXISTS idx_words_english
+  ON words (english, kanji, romaji);
+
+-- Sortable group listing (/groups, launch data)
+CREATE INDEX IF NOT EXISTS idx_groups_name
+  ON groups (name, words_count);
+
+CREATE INDEX IF NOT EXISTS idx_groups_words_count
+  ON groups (words_count, name);
+
+-- Per session aggregates: review counts, correct/wrong counts, last activity
+CREATE INDEX IF NOT EXISTS idx_word_review_items_session
+  ON word_review_items (study_session_id, correct, created_at, word_id);
+
+-- Per word aggregates for the dashboard (words studied, mastered words)
+CREATE INDEX IF NOT EXISTS idx_word_review_items_word
+  ON word_review_items (word_id, study_session_id, correct);
+
+-- Session listings ordered by time, globally, per group and per activity
+CREATE INDEX IF NOT EXISTS idx_study_sessions_created_at
+  ON study_sessions (created_at, group_id, study_activity_id);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_group_created_at
+  ON study_sessions (group_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_activity_created_at
+  ON study_sessions (study_activity_id, created_at, group_id);
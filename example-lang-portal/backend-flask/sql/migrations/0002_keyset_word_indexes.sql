@@ -0,0 +1,15 @@
+-- Keyset pagination orders words by (sort column, id). Putting id right after
+-- the sort column lets the index serve that order directly and seek to the
+-- next page, while still covering the listed columns.
+DROP INDEX IF EXISTS idx_words_kanji;
+DROP INDEX IF EXISTS idx_words_romaji;
+DROP INDEX IF EXISTS idx_words_english;
+
+CREATE INDEX IF NOT EXISTS idx_words_kanji_id
+  ON words (kanji, id, romaji, english);
+
+CREATE INDEX IF NOT EXISTS idx_words_romaji_id
+  ON words (romaji, id, kanji, english);
+
+CREATE INDEX IF NOT EXISTS idx_words_english_id
+  ON words (english, id, kanji, romaji);
@@ -0,0 +1,19 @@
+-- word_reviews is a materialized per word aggregate of word_review_items.
+-- Logging a review is a single INSERT into word_review_items, this trigger
+-- folds it into the aggregate with an upsert on the unique word_id index
+-- (see 0001), in the same transaction as the insert.
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_reviews_insert
+AFTER INSERT ON word_review_items
+BEGIN
+  INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    CASE WHEN NEW.correct THEN 0 ELSE 1 END,
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = correct_count + excluded.correct_count,
+    wrong_count = wrong_count + excluded.wrong_count,
+    last_reviewed = excluded.last_reviewed;
+END;
@@ -0,0 +1,20 @@
+-- Batched reviews carry their own answered_at, which can be older than the
+-- last review already folded into word_reviews. Keep the latest timestamp
+-- instead of the last one written.
+DROP TRIGGER IF EXISTS word_review_items_word_reviews_insert;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_reviews_insert
+AFTER INSERT ON word_review_items
+BEGIN
+  INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    CASE WHEN NEW.correct THEN 0 ELSE 1 END,
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = correct_count + excluded.correct_count,
+    wrong_count = wrong_count + excluded.wrong_count,
+    last_reviewed = MAX(COALESCE(last_reviewed, excluded.last_reviewed), excluded.last_reviewed);
+END;
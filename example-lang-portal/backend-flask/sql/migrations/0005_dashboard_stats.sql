@@ -0,0 +1,174 @@
+-- Incrementally maintained dashboard statistics. Triggers on words,
+-- study_sessions and word_review_items keep these tables current so
+-- /dashboard/stats reads a single summary row instead of aggregating the
+-- whole review history. `invoke check-dashboard-stats` recomputes everything
+-- from scratch and reports (or repairs) any drift.
+
+CREATE TABLE IF NOT EXISTS dashboard_stats (
+  id INTEGER PRIMARY KEY CHECK (id = 1),  -- Single summary row
+  total_vocabulary INTEGER NOT NULL DEFAULT 0,
+  total_words_studied INTEGER NOT NULL DEFAULT 0,
+  mastered_words INTEGER NOT NULL DEFAULT 0,  -- At least 5 attempts and 80% correct
+  total_reviews INTEGER NOT NULL DEFAULT 0,
+  correct_reviews INTEGER NOT NULL DEFAULT 0,
+  total_sessions INTEGER NOT NULL DEFAULT 0
+);
+
+-- Per word attempts, needed to know when a word becomes (or stops being) mastered
+CREATE TABLE IF NOT EXISTS dashboard_word_stats (
+  word_id INTEGER PRIMARY KEY,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0
+);
+
+-- Days with at least one study session, for the streak
+CREATE TABLE IF NOT EXISTS dashboard_study_days (
+  study_date TEXT PRIMARY KEY,
+  sessions INTEGER NOT NULL DEFAULT 0
+);
+
+-- Last session per group, for the groups active in the last 30 days
+CREATE TABLE IF NOT EXISTS dashboard_group_activity (
+  group_id INTEGER PRIMARY KEY,
+  last_session_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_dashboard_group_activity_last_session_at
+  ON dashboard_group_activity (last_session_at);
+
+-- Backfill from the existing history
+INSERT OR IGNORE INTO dashboard_stats (id) VALUES (1);
+
+DELETE FROM dashboard_word_stats;
+INSERT INTO dashboard_word_stats (word_id, attempts, correct)
+SELECT wri.word_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+FROM word_review_items wri
+JOIN study_sessions ss ON wri.study_session_id = ss.id
+GROUP BY wri.word_id;
+
+DELETE FROM dashboard_study_days;
+INSERT INTO dashboard_study_days (study_date, sessions)
+SELECT date(created_at), COUNT(*)
+FROM study_sessions
+GROUP BY date(created_at);
+
+DELETE FROM dashboard_group_activity;
+INSERT INTO dashboard_group_activity (group_id, last_session_at)
+SELECT group_id, MAX(created_at)
+FROM study_sessions
+GROUP BY group_id;
+
+UPDATE dashboard_stats SET
+  total_vocabulary = (SELECT COUNT(*) FROM words),
+  total_words_studied = (SELECT COUNT(*) FROM dashboard_word_stats),
+  mastered_words = (
+    SELECT COUNT(*) FROM dashboard_word_stats
+    WHERE attempts >= 5 AND correct * 5 >= attempts * 4
+  ),
+  total_reviews = (SELECT COALESCE(SUM(attempts), 0) FROM dashboard_word_stats),
+  correct_reviews = (SELECT COALESCE(SUM(correct), 0) FROM dashboard_word_stats),
+  total_sessions = (SELECT COUNT(*) FROM study_sessions)
+WHERE id = 1;
+
+-- Words
+CREATE TRIGGER IF NOT EXISTS words_dashboard_stats_insert
+AFTER INSERT ON words
+BEGIN
+  UPDATE dashboard_stats SET total_vocabulary = total_vocabulary + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_dashboard_stats_delete
+AFTER DELETE ON words
+BEGIN
+  UPDATE dashboard_stats SET total_vocabulary = total_vocabulary - 1 WHERE id = 1;
+END;
+
+-- Study sessions
+CREATE TRIGGER IF NOT EXISTS study_sessions_dashboard_stats_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions + 1 WHERE id = 1;
+
+  INSERT INTO dashboard_study_days (study_date, sessions)
+  VALUES (date(NEW.created_at), 1)
+  ON CONFLICT(study_date) DO UPDATE SET sessions = sessions + 1;
+
+  INSERT INTO dashboard_group_activity (group_id, last_session_at)
+  VALUES (NEW.group_id, NEW.created_at)
+  ON CONFLICT(group_id) DO UPDATE SET
+    last_session_at = MAX(COALESCE(last_session_at, excluded.last_session_at), excluded.last_session_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_dashboard_stats_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions - 1 WHERE id = 1;
+
+  UPDATE dashboard_study_days SET sessions = sessions - 1 WHERE study_date = date(OLD.created_at);
+  DELETE FROM dashboard_study_days WHERE study_date = date(OLD.created_at) AND sessions <= 0;
+
+  -- Uses idx_study_sessions_group_created_at, so only the group's newest session is read
+  UPDATE dashboard_group_activity
+  SET last_session_at = (SELECT MAX(created_at) FROM study_sessions WHERE group_id = OLD.group_id)
+  WHERE group_id = OLD.group_id;
+  DELETE FROM dashboard_group_activity WHERE group_id = OLD.group_id AND last_session_at IS NULL;
+END;
+
+-- Word review items. The mastered count is adjusted by taking the word out
+-- before its counters change and putting it back afterwards.
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_insert
+AFTER INSERT ON word_review_items
+BEGIN
+  INSERT INTO dashboard_word_stats (word_id) VALUES (NEW.word_id)
+  ON CONFLICT(word_id) DO NOTHING;
+
+  UPDATE dashboard_stats SET
+    total_words_studied = total_words_studied + (
+      SELECT attempts = 0 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    mastered_words = mastered_words - (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    total_reviews = total_reviews + 1,
+    correct_reviews = correct_reviews + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts + 1,
+    correct = correct + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE word_id = NEW.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    )
+  WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_delete
+AFTER DELETE ON word_review_items
+BEGIN
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words - COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_reviews = total_reviews - 1,
+    correct_reviews = correct_reviews - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE word_id = OLD.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_words_studied = total_words_studied - COALESCE((
+      SELECT attempts <= 0 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0)
+  WHERE id = 1;
+
+  DELETE FROM dashboard_word_stats WHERE word_id = OLD.word_id AND attempts <= 0;
+END;
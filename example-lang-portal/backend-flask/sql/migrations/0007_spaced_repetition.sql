@@ -0,0 +1,133 @@
+-- SM-2 scheduling state per word, updated by a trigger in the same
+-- transaction as the review that changes it. Answers are binary, a correct
+-- answer is graded 4 (ease unchanged) and a wrong one 1 (ease - 0.54, the
+-- SM-2 update for q=1). A wrong answer starts the word over with a one day
+-- interval, correct answers go 1 day, 6 days, then interval * ease, capped
+-- at 100 years.
+CREATE TABLE IF NOT EXISTS word_schedule (
+  word_id INTEGER PRIMARY KEY,
+  repetitions INTEGER NOT NULL DEFAULT 0,  -- Correct answers in a row
+  interval_days REAL NOT NULL DEFAULT 1.0,
+  ease REAL NOT NULL DEFAULT 2.5,
+  due_at DATETIME NOT NULL,
+  reviewed_at DATETIME NOT NULL,
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+-- The due date of every scheduled word in every group it belongs to, so the
+-- next cards of a group are a range scan of (group_id, due_at)
+CREATE TABLE IF NOT EXISTS group_due_queue (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  due_at DATETIME NOT NULL,
+  PRIMARY KEY (group_id, word_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_due_queue_due_at ON group_due_queue(group_id, due_at, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_due_queue_word ON group_due_queue(word_id);
+
+-- Replay the existing history in review order, only on the first run
+INSERT INTO word_schedule (word_id, repetitions, interval_days, ease, due_at, reviewed_at)
+WITH RECURSIVE ordered AS MATERIALIZED (
+  SELECT
+    word_id,
+    correct,
+    created_at,
+    row_number() OVER (PARTITION BY word_id ORDER BY created_at, id) as n
+  FROM word_review_items
+),
+replay (word_id, n, repetitions, interval_days, ease, reviewed_at) AS (
+  SELECT
+    word_id,
+    n,
+    CASE WHEN correct THEN 1 ELSE 0 END,
+    1.0,
+    CASE WHEN correct THEN 2.5 ELSE 1.96 END,
+    created_at
+  FROM ordered
+  WHERE n = 1
+  UNION ALL
+  SELECT
+    o.word_id,
+    o.n,
+    CASE WHEN o.correct THEN r.repetitions + 1 ELSE 0 END,
+    CASE
+      WHEN NOT o.correct OR r.repetitions = 0 THEN 1.0
+      WHEN r.repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(r.interval_days * r.ease, 2))
+    END,
+    CASE WHEN o.correct THEN r.ease ELSE MAX(1.3, r.ease - 0.54) END,
+    o.created_at
+  FROM replay r
+  JOIN ordered o ON o.word_id = r.word_id AND o.n = r.n + 1
+)
+SELECT word_id, repetitions, interval_days, ease, datetime(julianday(reviewed_at) + interval_days), reviewed_at
+FROM replay
+WHERE (word_id, n) IN (SELECT word_id, MAX(n) FROM ordered GROUP BY word_id)
+  AND NOT EXISTS (SELECT 1 FROM word_schedule);
+
+INSERT OR IGNORE INTO group_due_queue (group_id, word_id, due_at)
+SELECT wg.group_id, ws.word_id, ws.due_at
+FROM word_schedule ws
+JOIN word_groups wg ON wg.word_id = ws.word_id;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_schedule_insert
+AFTER INSERT ON word_review_items
+BEGIN
+  INSERT INTO word_schedule (word_id, repetitions, interval_days, ease, due_at, reviewed_at)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    1.0,
+    CASE WHEN NEW.correct THEN 2.5 ELSE 1.96 END,
+    datetime(julianday(NEW.created_at) + 1.0),
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    repetitions = CASE WHEN NEW.correct THEN repetitions + 1 ELSE 0 END,
+    interval_days = CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END,
+    ease = CASE WHEN NEW.correct THEN ease ELSE MAX(1.3, ease - 0.54) END,
+    due_at = datetime(julianday(NEW.created_at) + CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END),
+    reviewed_at = NEW.created_at;
+END;
+
+-- Keep the queue in step with the schedule and with group membership
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_insert
+AFTER INSERT ON word_schedule
+BEGIN
+  INSERT OR REPLACE INTO group_due_queue (group_id, word_id, due_at)
+  SELECT group_id, NEW.word_id, NEW.due_at FROM word_groups WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_update
+AFTER UPDATE OF due_at ON word_schedule
+BEGIN
+  UPDATE group_due_queue SET due_at = NEW.due_at WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_delete
+AFTER DELETE ON word_schedule
+BEGIN
+  DELETE FROM group_due_queue WHERE word_id = OLD.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_groups_group_due_queue_insert
+AFTER INSERT ON word_groups
+BEGIN
+  INSERT OR IGNORE INTO group_due_queue (group_id, word_id, due_at)
+  SELECT NEW.group_id, word_id, due_at FROM word_schedule WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_groups_group_due_queue_delete
+AFTER DELETE ON word_groups
+BEGIN
+  DELETE FROM group_due_queue WHERE group_id = OLD.group_id AND word_id = OLD.word_id;
+END;
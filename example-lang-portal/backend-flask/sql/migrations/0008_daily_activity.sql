@@ -0,0 +1,78 @@
+-- Sessions, reviews and correct answers per UTC day and group, maintained by
+-- triggers so the streak, heatmap and trend endpoints read a bounded range of
+-- days instead of aggregating the whole history. Sessions count on the day
+-- they were started, reviews on the day they were answered, both under the
+-- group of their study session. `invoke backfill-daily-activity` rebuilds
+-- the table from scratch.
+CREATE TABLE IF NOT EXISTS daily_activity (
+  date TEXT NOT NULL,
+  group_id INTEGER NOT NULL,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (date, group_id)
+);
+
+-- Per group ranges (heatmap and trend of one group)
+CREATE INDEX IF NOT EXISTS idx_daily_activity_group_date
+  ON daily_activity (group_id, date, sessions, reviews, correct);
+
+-- Backfill from the existing history, only on the first run
+INSERT INTO daily_activity (date, group_id, sessions, reviews, correct)
+SELECT date, group_id, SUM(sessions), SUM(reviews), SUM(correct)
+FROM (
+  SELECT date(created_at) as date, group_id, COUNT(*) as sessions, 0 as reviews, 0 as correct
+  FROM study_sessions
+  GROUP BY date(created_at), group_id
+  UNION ALL
+  SELECT date(wri.created_at), ss.group_id, 0, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+  FROM word_review_items wri
+  JOIN study_sessions ss ON wri.study_session_id = ss.id
+  GROUP BY date(wri.created_at), ss.group_id
+)
+WHERE NOT EXISTS (SELECT 1 FROM daily_activity)
+GROUP BY date, group_id;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_daily_activity_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  INSERT INTO daily_activity (date, group_id, sessions)
+  VALUES (date(NEW.created_at), NEW.group_id, 1)
+  ON CONFLICT(date, group_id) DO UPDATE SET sessions = sessions + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_daily_activity_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE daily_activity SET sessions = sessions - 1
+  WHERE date = date(OLD.created_at) AND group_id = OLD.group_id;
+  DELETE FROM daily_activity
+  WHERE date = date(OLD.created_at) AND group_id = OLD.group_id
+    AND sessions <= 0 AND reviews <= 0;
+END;
+
+-- Reviews of a session that does not exist are not counted, like on the dashboard
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_insert
+AFTER INSERT ON word_review_items
+BEGIN
+  INSERT INTO daily_activity (date, group_id, reviews, correct)
+  SELECT date(NEW.created_at), group_id, 1, CASE WHEN NEW.correct THEN 1 ELSE 0 END
+  FROM study_sessions WHERE id = NEW.study_session_id
+  ON CONFLICT(date, group_id) DO UPDATE SET
+    reviews = reviews + 1,
+    correct = correct + excluded.correct;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_delete
+AFTER DELETE ON word_review_items
+BEGIN
+  UPDATE daily_activity SET
+    reviews = reviews - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id);
+  DELETE FROM daily_activity
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id)
+    AND sessions <= 0 AND reviews <= 0;
+END;
@@ -0,0 +1,87 @@
+-- Cold storage for old word_review_items. `invoke archive-reviews` moves
+-- reviews older than a horizon into one table per month
+-- (word_review_items_YYYY_MM, listed in review_archive_months) so the hot
+-- table and its indexes only hold recent answers. The aggregates built from
+-- reviews (word_reviews, dashboard tables, daily_activity, word_schedule)
+-- keep counting archived reviews.
+
+-- Set to 1 only inside the archiving transaction, tells the delete triggers
+-- that reviews are being moved and not forgotten
+CREATE TABLE IF NOT EXISTS review_archive_control (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  archiving INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO review_archive_control (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS review_archive_months (
+  month TEXT PRIMARY KEY,  -- YYYY_MM
+  table_name TEXT NOT NULL,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Review counts of the archived part of each session, added to the counts of
+-- the hot table by the session listings
+CREATE TABLE IF NOT EXISTS archived_session_reviews (
+  study_session_id INTEGER PRIMARY KEY,
+  review_items_count INTEGER NOT NULL DEFAULT 0,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  last_activity_at DATETIME
+);
+
+-- Every review, hot and archived. Rebuilt by the archiver whenever a month
+-- table is added. Filters on study_session_id = ? are pushed into each
+-- branch and use the per table session index.
+DROP VIEW IF EXISTS word_review_items_history;
+CREATE VIEW word_review_items_history AS
+SELECT id, word_id, study_session_id, correct, created_at FROM word_review_items;
+
+-- Moving reviews out of the hot table must not undo them in the aggregates
+DROP TRIGGER IF EXISTS word_review_items_dashboard_stats_delete;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_delete
+AFTER DELETE ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words - COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_reviews = total_reviews - 1,
+    correct_reviews = correct_reviews - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE word_id = OLD.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_words_studied = total_words_studied - COALESCE((
+      SELECT attempts <= 0 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0)
+  WHERE id = 1;
+
+  DELETE FROM dashboard_word_stats WHERE word_id = OLD.word_id AND attempts <= 0;
+END;
+
+DROP TRIGGER IF EXISTS word_review_items_daily_activity_delete;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_delete
+AFTER DELETE ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  UPDATE daily_activity SET
+    reviews = reviews - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id);
+  DELETE FROM daily_activity
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id)
+    AND sessions <= 0 AND reviews <= 0;
+END;
@@ -0,0 +1,100 @@
+-- Review items copied back from the archive (see lib/archive.py) are
+-- already counted in every aggregate, so the insert triggers skip them the
+-- same way the delete triggers skip rows moved into the archive. Deleting a
+-- restored row then undoes it in the aggregates like any other review.
+
+DROP TRIGGER IF EXISTS word_review_items_word_reviews_insert;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_reviews_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    CASE WHEN NEW.correct THEN 0 ELSE 1 END,
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = correct_count + excluded.correct_count,
+    wrong_count = wrong_count + excluded.wrong_count,
+    last_reviewed = MAX(COALESCE(last_reviewed, excluded.last_reviewed), excluded.last_reviewed);
+END;
+
+DROP TRIGGER IF EXISTS word_review_items_dashboard_stats_insert;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO dashboard_word_stats (word_id) VALUES (NEW.word_id)
+  ON CONFLICT(word_id) DO NOTHING;
+
+  UPDATE dashboard_stats SET
+    total_words_studied = total_words_studied + (
+      SELECT attempts = 0 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    mastered_words = mastered_words - (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    total_reviews = total_reviews + 1,
+    correct_reviews = correct_reviews + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts + 1,
+    correct = correct + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE word_id = NEW.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    )
+  WHERE id = 1;
+END;
+
+DROP TRIGGER IF EXISTS word_review_items_word_schedule_insert;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_schedule_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO word_schedule (word_id, repetitions, interval_days, ease, due_at, reviewed_at)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    1.0,
+    CASE WHEN NEW.correct THEN 2.5 ELSE 1.96 END,
+    datetime(julianday(NEW.created_at) + 1.0),
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    repetitions = CASE WHEN NEW.correct THEN repetitions + 1 ELSE 0 END,
+    interval_days = CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END,
+    ease = CASE WHEN NEW.correct THEN ease ELSE MAX(1.3, ease - 0.54) END,
+    due_at = datetime(julianday(NEW.created_at) + CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END),
+    reviewed_at = NEW.created_at;
+END;
+
+DROP TRIGGER IF EXISTS word_review_items_daily_activity_insert;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO daily_activity (date, group_id, reviews, correct)
+  SELECT date(NEW.created_at), group_id, 1, CASE WHEN NEW.correct THEN 1 ELSE 0 END
+  FROM study_sessions WHERE id = NEW.study_session_id
+  ON CONFLICT(date, group_id) DO UPDATE SET
+    reviews = reviews + 1,
+    correct = correct + excluded.correct;
+END;
@@ -0,0 +1,45 @@
+-- A version per group, bumped by triggers whenever the group's export would
+-- change: words added or removed, a member word edited or the group renamed.
+-- Precomputed group exports (lib/export.py) are named after this version, so
+-- a stale file is never served. Groups without a row are at version 0.
+CREATE TABLE IF NOT EXISTS group_versions (
+  group_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS word_groups_group_versions_insert
+AFTER INSERT ON word_groups
+BEGIN
+  INSERT INTO group_versions (group_id, version) VALUES (NEW.group_id, 1)
+  ON CONFLICT(group_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_groups_group_versions_delete
+AFTER DELETE ON word_groups
+BEGIN
+  INSERT INTO group_versions (group_id, version) VALUES (OLD.group_id, 1)
+  ON CONFLICT(group_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_group_versions_update
+AFTER UPDATE ON words
+BEGIN
+  INSERT INTO group_versions (group_id, version)
+  SELECT group_id, 1 FROM word_groups WHERE word_id = NEW.id
+  ON CONFLICT(group_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_group_versions_delete
+AFTER DELETE ON words
+BEGIN
+  INSERT INTO group_versions (group_id, version)
+  SELECT group_id, 1 FROM word_groups WHERE word_id = OLD.id
+  ON CONFLICT(group_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_group_versions_update
+AFTER UPDATE OF name ON groups
+BEGIN
+  INSERT INTO group_versions (group_id, version) VALUES (NEW.id, 1)
+  ON CONFLICT(group_id) DO UPDATE SET version = version + 1;
+END;
@@ -0,0 +1,19 @@
+-- groups.words_count is a counter cache of the group's rows in word_groups.
+-- It used to be set once by the seed import and drifted with every later
+-- change. Recount once, then keep it current with triggers in the same
+-- transaction as the membership change. INSERT OR IGNORE of an existing
+-- membership inserts nothing and fires nothing, so it is not counted twice.
+UPDATE groups
+SET words_count = (SELECT COUNT(*) FROM word_groups WHERE group_id = groups.id);
+
+CREATE TRIGGER IF NOT EXISTS word_groups_words_count_insert
+AFTER INSERT ON word_groups
+BEGIN
+  UPDATE groups SET words_count = COALESCE(words_count, 0) + 1 WHERE id = NEW.group_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_groups_words_count_delete
+AFTER DELETE ON word_groups
+BEGIN
+  UPDATE groups SET words_count = words_count - 1 WHERE id = OLD.group_id;
+END;
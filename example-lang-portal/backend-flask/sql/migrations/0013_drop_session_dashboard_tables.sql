@@ -0,0 +1,23 @@
+-- Since 0008 the streak and the active groups come from daily_activity.
+-- dashboard_study_days and dashboard_group_activity (0005) are no longer
+-- read, but the session triggers still kept them current, the delete
+-- trigger with a MAX(created_at) lookup per deleted session. The triggers
+-- now only count sessions for dashboard_stats.
+DROP TRIGGER IF EXISTS study_sessions_dashboard_stats_insert;
+DROP TRIGGER IF EXISTS study_sessions_dashboard_stats_delete;
+
+DROP INDEX IF EXISTS idx_dashboard_group_activity_last_session_at;
+DROP TABLE IF EXISTS dashboard_study_days;
+DROP TABLE IF EXISTS dashboard_group_activity;
+
+CREATE TRIGGER study_sessions_dashboard_stats_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER study_sessions_dashboard_stats_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions - 1 WHERE id = 1;
+END;
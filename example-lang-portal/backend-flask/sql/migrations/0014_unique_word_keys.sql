@@ -0,0 +1,21 @@
+-- A word is identified by (kanji, romaji). Until now only the importer
+-- enforced that, by loading every key into memory, and the seed data already
+-- holds a duplicate. Words that are already duplicated keep their rows: their
+-- ids are referenced by reviews in the archive month tables and in learner
+-- shards. They are marked with the id of the first word with the same key
+-- and left out of the unique index, every new word must have a new key.
+ALTER TABLE words ADD COLUMN duplicate_of INTEGER;
+
+UPDATE words
+SET duplicate_of = (
+  SELECT MIN(first.id) FROM words first
+  WHERE first.kanji = words.kanji AND first.romaji = words.romaji
+)
+WHERE id > (
+  SELECT MIN(first.id) FROM words first
+  WHERE first.kanji = words.kanji AND first.romaji = words.romaji
+);
+
+-- Also lets the importer look up a chunk of keys with one seek per key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_words_kanji_romaji
+  ON words (kanji, romaji) WHERE duplicate_of IS NULL;
@@ -0,0 +1,307 @@
+-- Schema of a learner shard (see Db in lib/db.py): the progress tables of
+-- one learner and the aggregates built from them, in the final form of
+-- sql/migrations/0003 to 0010. The vocabulary catalog (words, groups,
+-- word_groups, study_activities) stays in the main database, which every
+-- shard connection attaches read-only as `catalog`. Triggers only see their
+-- own database, so nothing here reads the catalog: word and group ids are
+-- plain integers, and group_due_queue and dashboard_stats.total_vocabulary
+-- come from TEMP views created by each shard connection (SHARD_TEMP_VIEWS).
+
+CREATE TABLE IF NOT EXISTS study_sessions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  group_id INTEGER NOT NULL,  -- The group of words being studied
+  study_activity_id INTEGER NOT NULL,  -- The activity performed
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP  -- Timestamp of the session
+);
+
+CREATE TABLE IF NOT EXISTS word_review_items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  study_session_id INTEGER NOT NULL,  -- Link to study session
+  correct BOOLEAN NOT NULL,  -- Whether the answer was correct (true) or wrong (false)
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the review
+  FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+);
+
+CREATE TABLE IF NOT EXISTS word_reviews (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  correct_count INTEGER DEFAULT 0,
+  wrong_count INTEGER DEFAULT 0,
+  last_reviewed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS word_schedule (
+  word_id INTEGER PRIMARY KEY,
+  repetitions INTEGER NOT NULL DEFAULT 0,  -- Correct answers in a row
+  interval_days REAL NOT NULL DEFAULT 1.0,
+  ease REAL NOT NULL DEFAULT 2.5,
+  due_at DATETIME NOT NULL,
+  reviewed_at DATETIME NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_stats (
+  id INTEGER PRIMARY KEY CHECK (id = 1),  -- Single summary row
+  total_vocabulary INTEGER NOT NULL DEFAULT 0,
+  total_words_studied INTEGER NOT NULL DEFAULT 0,
+  mastered_words INTEGER NOT NULL DEFAULT 0,  -- At least 5 attempts and 80% correct
+  total_reviews INTEGER NOT NULL DEFAULT 0,
+  correct_reviews INTEGER NOT NULL DEFAULT 0,
+  total_sessions INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_word_stats (
+  word_id INTEGER PRIMARY KEY,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_study_days (
+  study_date TEXT PRIMARY KEY,
+  sessions INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS dashboard_group_activity (
+  group_id INTEGER PRIMARY KEY,
+  last_session_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS daily_activity (
+  date TEXT NOT NULL,
+  group_id INTEGER NOT NULL,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (date, group_id)
+);
+
+CREATE TABLE IF NOT EXISTS review_archive_control (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  archiving INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS review_archive_months (
+  month TEXT PRIMARY KEY,  -- YYYY_MM
+  table_name TEXT NOT NULL,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS archived_session_reviews (
+  study_session_id INTEGER PRIMARY KEY,
+  review_items_count INTEGER NOT NULL DEFAULT 0,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  last_activity_at DATETIME
+);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_created_at
+  ON study_sessions (created_at, group_id, study_activity_id);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_group_created_at
+  ON study_sessions (group_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_activity_created_at
+  ON study_sessions (study_activity_id, created_at, group_id);
+
+CREATE INDEX IF NOT EXISTS idx_word_review_items_session
+  ON word_review_items (study_session_id, correct, created_at, word_id);
+
+CREATE INDEX IF NOT EXISTS idx_word_review_items_word
+  ON word_review_items (word_id, study_session_id, correct);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_word_reviews_word_id
+  ON word_reviews (word_id);
+
+CREATE INDEX IF NOT EXISTS idx_dashboard_group_activity_last_session_at
+  ON dashboard_group_activity (last_session_at);
+
+CREATE INDEX IF NOT EXISTS idx_daily_activity_group_date
+  ON daily_activity (group_id, date, sessions, reviews, correct);
+
+INSERT OR IGNORE INTO dashboard_stats (id) VALUES (1);
+INSERT OR IGNORE INTO review_archive_control (id) VALUES (1);
+
+-- Every review, hot and archived, rebuilt by the archiver (lib/archive.py)
+DROP VIEW IF EXISTS word_review_items_history;
+CREATE VIEW word_review_items_history AS
+SELECT id, word_id, study_session_id, correct, created_at FROM word_review_items;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_dashboard_stats_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions + 1 WHERE id = 1;
+
+  INSERT INTO dashboard_study_days (study_date, sessions)
+  VALUES (date(NEW.created_at), 1)
+  ON CONFLICT(study_date) DO UPDATE SET sessions = sessions + 1;
+
+  INSERT INTO dashboard_group_activity (group_id, last_session_at)
+  VALUES (NEW.group_id, NEW.created_at)
+  ON CONFLICT(group_id) DO UPDATE SET
+    last_session_at = MAX(COALESCE(last_session_at, excluded.last_session_at), excluded.last_session_at);
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_dashboard_stats_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions - 1 WHERE id = 1;
+
+  UPDATE dashboard_study_days SET sessions = sessions - 1 WHERE study_date = date(OLD.created_at);
+  DELETE FROM dashboard_study_days WHERE study_date = date(OLD.created_at) AND sessions <= 0;
+
+  -- Uses idx_study_sessions_group_created_at, so only the group's newest session is read
+  UPDATE dashboard_group_activity
+  SET last_session_at = (SELECT MAX(created_at) FROM study_sessions WHERE group_id = OLD.group_id)
+  WHERE group_id = OLD.group_id;
+  DELETE FROM dashboard_group_activity WHERE group_id = OLD.group_id AND last_session_at IS NULL;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_daily_activity_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  INSERT INTO daily_activity (date, group_id, sessions)
+  VALUES (date(NEW.created_at), NEW.group_id, 1)
+  ON CONFLICT(date, group_id) DO UPDATE SET sessions = sessions + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_daily_activity_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE daily_activity SET sessions = sessions - 1
+  WHERE date = date(OLD.created_at) AND group_id = OLD.group_id;
+  DELETE FROM daily_activity
+  WHERE date = date(OLD.created_at) AND group_id = OLD.group_id
+    AND sessions <= 0 AND reviews <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_delete
+AFTER DELETE ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words - COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_reviews = total_reviews - 1,
+    correct_reviews = correct_reviews - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE word_id = OLD.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + COALESCE((
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0),
+    total_words_studied = total_words_studied - COALESCE((
+      SELECT attempts <= 0 FROM dashboard_word_stats WHERE word_id = OLD.word_id
+    ), 0)
+  WHERE id = 1;
+
+  DELETE FROM dashboard_word_stats WHERE word_id = OLD.word_id AND attempts <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_delete
+AFTER DELETE ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  UPDATE daily_activity SET
+    reviews = reviews - 1,
+    correct = correct - (CASE WHEN OLD.correct THEN 1 ELSE 0 END)
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id);
+  DELETE FROM daily_activity
+  WHERE date = date(OLD.created_at)
+    AND group_id = (SELECT group_id FROM study_sessions WHERE id = OLD.study_session_id)
+    AND sessions <= 0 AND reviews <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_reviews_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    CASE WHEN NEW.correct THEN 0 ELSE 1 END,
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    correct_count = correct_count + excluded.correct_count,
+    wrong_count = wrong_count + excluded.wrong_count,
+    last_reviewed = MAX(COALESCE(last_reviewed, excluded.last_reviewed), excluded.last_reviewed);
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_dashboard_stats_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO dashboard_word_stats (word_id) VALUES (NEW.word_id)
+  ON CONFLICT(word_id) DO NOTHING;
+
+  UPDATE dashboard_stats SET
+    total_words_studied = total_words_studied + (
+      SELECT attempts = 0 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    mastered_words = mastered_words - (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    ),
+    total_reviews = total_reviews + 1,
+    correct_reviews = correct_reviews + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE id = 1;
+
+  UPDATE dashboard_word_stats SET
+    attempts = attempts + 1,
+    correct = correct + (CASE WHEN NEW.correct THEN 1 ELSE 0 END)
+  WHERE word_id = NEW.word_id;
+
+  UPDATE dashboard_stats SET
+    mastered_words = mastered_words + (
+      SELECT attempts >= 5 AND correct * 5 >= attempts * 4 FROM dashboard_word_stats WHERE word_id = NEW.word_id
+    )
+  WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_word_schedule_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO word_schedule (word_id, repetitions, interval_days, ease, due_at, reviewed_at)
+  VALUES (
+    NEW.word_id,
+    CASE WHEN NEW.correct THEN 1 ELSE 0 END,
+    1.0,
+    CASE WHEN NEW.correct THEN 2.5 ELSE 1.96 END,
+    datetime(julianday(NEW.created_at) + 1.0),
+    NEW.created_at
+  )
+  ON CONFLICT(word_id) DO UPDATE SET
+    repetitions = CASE WHEN NEW.correct THEN repetitions + 1 ELSE 0 END,
+    interval_days = CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END,
+    ease = CASE WHEN NEW.correct THEN ease ELSE MAX(1.3, ease - 0.54) END,
+    due_at = datetime(julianday(NEW.created_at) + CASE
+      WHEN NOT NEW.correct OR repetitions = 0 THEN 1.0
+      WHEN repetitions = 1 THEN 6.0
+      ELSE MIN(36500.0, round(interval_days * ease, 2))
+    END),
+    reviewed_at = NEW.created_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_daily_activity_insert
+AFTER INSERT ON word_review_items
+WHEN (SELECT archiving FROM review_archive_control WHERE id = 1) = 0
+BEGIN
+  INSERT INTO daily_activity (date, group_id, reviews, correct)
+  SELECT date(NEW.created_at), group_id, 1, CASE WHEN NEW.correct THEN 1 ELSE 0 END
+  FROM study_sessions WHERE id = NEW.study_session_id
+  ON CONFLICT(date, group_id) DO UPDATE SET
+    reviews = reviews + 1,
+    correct = correct + excluded.correct;
+END;
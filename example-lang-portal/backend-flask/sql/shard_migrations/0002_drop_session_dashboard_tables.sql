@@ -0,0 +1,21 @@
+-- Same as sql/migrations/0013: dashboard_study_days and
+-- dashboard_group_activity are not read anywhere, the session triggers only
+-- count sessions for dashboard_stats.
+DROP TRIGGER IF EXISTS study_sessions_dashboard_stats_insert;
+DROP TRIGGER IF EXISTS study_sessions_dashboard_stats_delete;
+
+DROP INDEX IF EXISTS idx_dashboard_group_activity_last_session_at;
+DROP TABLE IF EXISTS dashboard_study_days;
+DROP TABLE IF EXISTS dashboard_group_activity;
+
+CREATE TRIGGER study_sessions_dashboard_stats_insert
+AFTER INSERT ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER study_sessions_dashboard_stats_delete
+AFTER DELETE ON study_sessions
+BEGIN
+  UPDATE dashboard_stats SET total_sessions = total_sessions - 1 WHERE id = 1;
+END;
@@ -0,0 +1,62 @@
+-- The due queue of sql/migrations/0007 as a real table in the shard, so the
+-- next cards of a group are again a range scan of (group_id, due_at) that
+-- stops after `limit` rows. Shard triggers cannot read the catalog's
+-- word_groups, so the shard keeps its own copy of the memberships in
+-- group_members. Db.sync_group (lib/db.py) brings a group's copy up to date
+-- whenever the group's version in catalog.group_versions moved, the
+-- triggers below then add or remove the group's queue rows.
+CREATE TABLE IF NOT EXISTS group_members (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  PRIMARY KEY (group_id, word_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_members_word ON group_members(word_id, group_id);
+
+-- catalog.group_versions.version of each group when it was last copied
+CREATE TABLE IF NOT EXISTS group_members_versions (
+  group_id INTEGER PRIMARY KEY,
+  version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS group_due_queue (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  due_at DATETIME NOT NULL,
+  PRIMARY KEY (group_id, word_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_due_queue_due_at ON group_due_queue(group_id, due_at, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_due_queue_word ON group_due_queue(word_id);
+
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_insert
+AFTER INSERT ON word_schedule
+BEGIN
+  INSERT OR REPLACE INTO group_due_queue (group_id, word_id, due_at)
+  SELECT group_id, NEW.word_id, NEW.due_at FROM group_members WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_update
+AFTER UPDATE OF due_at ON word_schedule
+BEGIN
+  UPDATE group_due_queue SET due_at = NEW.due_at WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_schedule_group_due_queue_delete
+AFTER DELETE ON word_schedule
+BEGIN
+  DELETE FROM group_due_queue WHERE word_id = OLD.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_members_group_due_queue_insert
+AFTER INSERT ON group_members
+BEGIN
+  INSERT OR IGNORE INTO group_due_queue (group_id, word_id, due_at)
+  SELECT NEW.group_id, word_id, due_at FROM word_schedule WHERE word_id = NEW.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_members_group_due_queue_delete
+AFTER DELETE ON group_members
+BEGIN
+  DELETE FROM group_due_queue WHERE group_id = OLD.group_id AND word_id = OLD.word_id;
+END;
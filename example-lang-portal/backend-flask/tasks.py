@@ -1,9 +1,143 @@
 from invoke import task
-from lib.db import db
+from lib.db import Db, db
 
 @task
 def init_db(c):
   from flask import Flask
+  from migrate import run_migrations
   app = Flask(__name__)
   db.init(app)
-  print("Database initialized successfully.")
\ No newline at end of file
+  run_migrations(db.database)
+  print("Database initialized successfully.")
+
+@task(help={
+  'status': 'Only list every migration as applied, pending, backfilling or changed',
+})
+def migrate(c, database='words.db', status=False):
+  from lib.migrations import MigrationError
+  from migrate import migration_status, run_migrations
+  if status:
+    migration_status(database)
+    return
+  try:
+    run_migrations(database)
+  except MigrationError:
+    raise SystemExit(1)
+
+@task(help={
+  'shard_dir': 'Directory of the learner shards (SHARD_DIR)',
+})
+def migrate_shards(c, shard_dir='shards'):
+  # Applies the pending sql/shard_migrations to every learner shard. The app
+  # also does this the first time it opens a shard.
+  from migrate import run_shard_migrations
+  shards = Db(shard_dir=shard_dir)
+  for learner in shards.learners():
+    print(f"Shard {learner}:")
+    run_shard_migrations(shards.shard_path(learner))
+
+@task(help={
+  'learner': 'Check the routes as this learner, against a learner shard (SHARD_DIR mode)',
+})
+def verify_query_plans(c, database='words.db', learner=None):
+  # Fails if any route query still scans a whole table
+  from lib.query_plans import verify
+  failures = verify(database, learner=learner)
+  if failures:
+    print(f"\n{len(failures)} statement(s) do a full table scan:")
+    for method, url, sql, scans in failures:
+      print(f"  {method} {url}: {', '.join(scans)}")
+    raise SystemExit(1)
+  print("\nNo full table scans found.")
+
+@task
+def check_dashboard_stats(c, database='words.db', repair=False):
+  # Recomputes the dashboard statistics from scratch and reports any drift
+  from lib.dashboard_stats import check, repair as repair_stats
+  with Db(database=database).pool.connection() as connection:
+    drift = check(connection)
+    for line in drift:
+      print(line)
+    if not drift:
+      print("Dashboard statistics are consistent.")
+      return
+    if repair:
+      repair_stats(connection)
+      print(f"Repaired {len(drift)} drifted value(s).")
+      return
+  raise SystemExit(1)
+
+@task(help={
+  'check': 'Only report rows that differ from the history, exit non-zero on drift',
+})
+def backfill_daily_activity(c, database='words.db', check=False):
+  # Rebuilds the daily_activity rollup from study_sessions and word_review_items
+  from lib.daily_activity import backfill, check as check_activity
+  with Db(database=database).pool.connection() as connection:
+    if check:
+      drift = check_activity(connection)
+      for line in drift:
+        print(line)
+      if drift:
+        raise SystemExit(1)
+      print("Daily activity is consistent.")
+      return
+    count = backfill(connection)
+    print(f"Rebuilt daily_activity with {count} row(s).")
+
+@task(help={
+  'horizon_days': 'Reviews older than this many days are moved to cold storage',
+  'vacuum': 'Run VACUUM afterwards to give the freed pages back',
+})
+def archive_reviews(c, database='words.db', horizon_days=180, vacuum=False):
+  # Moves old word_review_items into monthly archive tables, one transaction per month
+  from lib.archive import archive
+  with Db(database=database).pool.connection() as connection:
+    moved = archive(connection, horizon_days=int(horizon_days))
+    print(f"Archived {moved} review(s) older than {int(horizon_days)} days.")
+    if vacuum and moved:
+      connection.execute('VACUUM')
+
+@task(iterable=['group'], help={
+  'group': 'Group id to export, can be repeated, every group by default',
+  'export_dir': 'Directory of the gzipped NDJSON exports served by /groups/<id>/export.ndjson.gz',
+})
+def export_groups(c, database='words.db', group=None, export_dir='exports'):
+  # Writes the export of every group whose current version has no file yet
+  from lib.export import write_group_export
+  with Db(database=database).pool.connection() as connection:
+    group_ids = [int(id) for id in group] if group else [
+      row[0] for row in connection.execute('SELECT id FROM groups ORDER BY id')
+    ]
+    for group_id in group_ids:
+      path, header = write_group_export(connection, group_id, export_dir)
+      if path is None:
+        print(f"Group {group_id} not found.")
+      else:
+        print(f"{path} ({header['group_name']}, version {header['version']})")
+
+@task(iterable=['group'], help={
+  'path': 'JSON Lines (.jsonl), JSON array (.json) or CSV (.csv) file',
+  'group': 'Group name to add every imported word to, can be repeated',
+  'format': 'jsonl, json or csv, detected from the file extension by default',
+})
+def import_words(c, path, database='words.db', group=None, format=None, chunk_size=1000):
+  # Streams a vocabulary file of any size into the database in one transaction
+  from lib.importer import import_file
+  with Db(database=database).pool.connection() as connection:
+    import_file(connection, path, format=format, groups=group or [], chunk_size=int(chunk_size))
+
+@task(help={
+  'words': 'Number of words to add',
+  'groups': 'Number of groups, sizes follow a power law',
+  'sessions': 'Number of study sessions, spread over --days with recent days busier',
+  'reviews': 'Average review items per session',
+  'seed': 'Random seed, the same seed gives the same data',
+})
+def generate_data(c, database='words.db', words=10000, groups=20, sessions=5000, reviews=20, days=365, seed=42):
+  # Fills a database with skewed synthetic data for load testing, creating the schema first
+  from lib.synthetic import create_schema, generate
+  create_schema(database)
+  with Db(database=database).pool.connection() as connection:
+    generate(connection, words=int(words), groups=int(groups), sessions=int(sessions),
+             reviews=int(reviews), days=int(days), seed=int(seed))
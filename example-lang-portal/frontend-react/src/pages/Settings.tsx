@@ -20,12 +20,12 @@ export default function Settings() {
           throw new Error('Failed to reset history');
         }
 
-        // Reset was successful
+        // The reset runs in the background on the server
         setShowResetDialog(false);
         setResetConfirmation('');
         
         // Show success message
-        alert('Study history has been cleared successfully');
+        alert('Study history is being cleared');
       } catch (error) {
         console.error('Error resetting history:', error);
         alert('Failed to reset history. Please try again.');
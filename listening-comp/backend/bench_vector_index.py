@@ -0,0 +1,104 @@
+"""Recall@k and query latency of the chroma and numpy question indexes.
+
+Fills both backends of QuestionVectorStore with the same synthetic questions
+(clustered random embeddings, no Bedrock calls) and runs the same queries
+against each. Recall is measured against an exact float64 search.
+
+    python bench_vector_index.py --sizes 1000 10000 100000
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from vector_store import BACKENDS, MAX_BATCH_SIZE, BedrockEmbeddings
+
+def synthetic_questions(n, dimension, rng, clusters=200):
+    # Questions about the same topic sit close together, like real ones
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dimension)).astype(np.float32)
+    ids = [f"q_{i:08d}" for i in range(n)]
+    documents = [f"pregunta sintética {i}" for i in range(n)]
+    metadatas = [{
+        "scenario_id": f"scenario_{label}",
+        "options": "['A) uno', 'B) dos', 'C) tres', 'D) cuatro']",
+        "correct_answer": "A",
+        "topic": f"topic {label % 20}"
+    } for label in labels]
+    return ids, vectors, documents, metadatas, centers
+
+def exact_top_k(vectors, queries, k, chunk=10000):
+    queries = queries.astype(np.float64)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = np.empty((len(queries), len(vectors)))
+    # float64 copies of the whole matrix would not fit at 100k questions
+    for start in range(0, len(vectors), chunk):
+        rows = vectors[start:start + chunk].astype(np.float64)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+        scores[:, start:start + chunk] = queries @ rows.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run(backend, n, ids, vectors, documents, metadatas, queries, truth, k):
+    directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        index = BACKENDS[backend](directory, vectors.shape[1])
+        started = time.perf_counter()
+        # One write for the numpy index, it rewrites its files on every upsert
+        batch = MAX_BATCH_SIZE if backend == "chroma" else n
+        for start in range(0, n, batch):
+            end = start + batch
+            index.upsert(ids[start:end], vectors[start:end], documents[start:end], metadatas[start:end])
+        build_seconds = time.perf_counter() - started
+        if backend == "numpy":
+            # Searches start from the memory-mapped file, like after a restart
+            index = BACKENDS[backend](directory, vectors.shape[1])
+
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            results = index.query(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = {int(result["id"][2:]) for result in results}
+            recalls.append(len(found & expected) / k)
+        return {
+            "build_s": build_seconds,
+            "recall": float(np.mean(recalls)),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--dimension', type=int, default=BedrockEmbeddings.EMBEDDING_DIMENSION)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'questions':>9} {'build s':>8} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for n in args.sizes:
+        rng = np.random.default_rng(args.seed)
+        ids, vectors, documents, metadatas, centers = synthetic_questions(n, args.dimension, rng)
+        # Queries near the topics, not copies of stored questions
+        labels = rng.integers(0, len(centers), args.queries)
+        queries = centers[labels] + 0.6 * rng.standard_normal((args.queries, args.dimension)).astype(np.float32)
+        truth = exact_top_k(vectors, queries, args.k)
+        for backend in args.backends:
+            row = run(backend, n, ids, vectors, documents, metadatas, queries, truth, args.k)
+            print(f"{backend:<8} {n:>9} {row['build_s']:>8.1f} {row['recall']:>9.3f} "
+                  f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}", flush=True)
+
+if __name__ == '__main__':
+    main()
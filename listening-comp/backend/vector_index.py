@@ -0,0 +1,213 @@
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+class NumpyVectorIndex:
+    """In-process vector index: exact cosine search over a memory-mapped matrix
+
+    Every version of the index is a subdirectory `v<n>` of `directory` with
+      vectors.npy  - float32 matrix, one L2-normalized row per item, opened
+                     with mmap so only the pages a search touches are read
+      columns.npz  - the ids, documents and every metadata field as columns,
+                     each stored as UTF-8 bytes plus row offsets
+    and the file CURRENT names the version in use. A change writes a new
+    version and then replaces CURRENT, so a crash leaves either the old or
+    the new version, never half of each. Rewriting everything is fine for a
+    question bank that changes a few files at a time.
+    A search is one matrix-vector product and an argpartition for the top k."""
+    def __init__(self, directory: str, dimension: int):
+        self.directory = directory
+        self.dimension = dimension
+        self.current_path = os.path.join(directory, "CURRENT")
+        self.lock = threading.Lock()
+        self._load()
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(self.current_path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        version = self._current_version()
+        # Indexes written before versions existed keep their files in `directory`
+        version_path = os.path.join(self.directory, version) if version else self.directory
+        vectors_path = os.path.join(version_path, "vectors.npy")
+        columns_path = os.path.join(version_path, "columns.npz")
+        if os.path.exists(vectors_path) and os.path.exists(columns_path):
+            vectors = np.load(vectors_path, mmap_mode='r')
+            with np.load(columns_path) as archive:
+                columns = {
+                    name[:-len(".data")]: (archive[name], archive[name[:-len(".data")] + ".offsets"])
+                    for name in archive.files if name.endswith(".data")
+                }
+            if len(columns["id"][1]) - 1 != len(vectors):
+                raise ValueError(f"{self.directory}: vectors.npy and columns.npz do not match")
+        else:
+            vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            columns = {"id": (np.zeros(0, dtype=np.uint8), np.zeros(1, dtype=np.int64))}
+        ids = self._decode_column(columns["id"])
+        # Searches read this tuple once, writers swap it in one assignment
+        self.state = (vectors, columns, {question_id: row for row, question_id in enumerate(ids)})
+
+    @staticmethod
+    def _encode_column(values: List[str]):
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+        return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+    @staticmethod
+    def _decode_value(column, row: int) -> str:
+        data, offsets = column
+        return data[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+    @classmethod
+    def _decode_column(cls, column) -> List[str]:
+        return [cls._decode_value(column, row) for row in range(len(column[1]) - 1)]
+
+    def _row(self, columns, row: int, distance: Optional[float] = None) -> Dict[str, Any]:
+        result = {
+            "id": self._decode_value(columns["id"], row),
+            "text": self._decode_value(columns["document"], row),
+            "metadata": {
+                name: self._decode_value(column, row)
+                for name, column in columns.items() if name not in ("id", "document")
+            }
+        }
+        if distance is not None:
+            result["distance"] = distance
+        return result
+
+    def _versions(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [name for name in os.listdir(self.directory)
+                if name.startswith("v") and name[1:].isdigit()]
+
+    def _remove_versions(self, keep: Optional[str] = None):
+        # Older versions, and new ones left behind by a crash before CURRENT
+        # was switched. Open memory maps keep their data until they are closed.
+        for name in self._versions():
+            if name != keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def _write(self, ids: List[str], vectors: np.ndarray, columns: Dict[str, List[str]]):
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        version = "v" + str(max([int(name[1:]) for name in self._versions()], default=0) + 1)
+        version_path = os.path.join(self.directory, version)
+        os.mkdir(version_path)
+        matrix = np.lib.format.open_memmap(
+            os.path.join(version_path, "vectors.npy"), mode='w+', dtype=np.float32, shape=vectors.shape
+        )
+        matrix[:] = vectors
+        matrix.flush()
+        del matrix
+        arrays = {}
+        for name, values in dict(columns, id=ids).items():
+            arrays[name + ".data"], arrays[name + ".offsets"] = self._encode_column(values)
+        np.savez(os.path.join(version_path, "columns.npz"), **arrays)
+        temp_current = self.current_path + ".tmp"
+        with open(temp_current, 'w', encoding='utf-8') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_current, self.current_path)
+        self._load()
+        self._remove_versions(keep=version)
+        for name in ("vectors.npy", "columns.npz"):
+            if os.path.exists(os.path.join(self.directory, name)):
+                os.remove(os.path.join(self.directory, name))
+
+    def _materialize(self):
+        # Current contents as plain lists and an in-memory matrix, for rewriting
+        vectors, columns, positions = self.state
+        decoded = {name: self._decode_column(column) for name, column in columns.items()}
+        ids = decoded.pop("id")
+        return ids, np.array(vectors, dtype=np.float32), decoded
+
+    def existing(self, ids: List[str]) -> set:
+        positions = self.state[2]
+        return {question_id for question_id in ids if question_id in positions}
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        with self.lock:
+            old_ids, vectors, columns = self._materialize()
+            columns.setdefault("document", [""] * len(old_ids))
+            for metadata in metadatas:
+                for name in metadata:
+                    columns.setdefault(name, [""] * len(old_ids))
+            positions = {question_id: row for row, question_id in enumerate(old_ids)}
+            new_rows = []
+            for i, question_id in enumerate(ids):
+                row = positions.get(question_id)
+                if row is None:
+                    row = len(old_ids)
+                    positions[question_id] = row
+                    old_ids.append(question_id)
+                    for values in columns.values():
+                        values.append("")
+                    new_rows.append(embeddings[i])
+                else:
+                    vectors[row] = embeddings[i]
+                columns["document"][row] = documents[i]
+                for name in columns:
+                    if name != "document":
+                        columns[name][row] = str(metadatas[i].get(name, ""))
+            if new_rows:
+                vectors = np.vstack([vectors.reshape(-1, self.dimension), np.stack(new_rows)])
+            self._write(old_ids, vectors, columns)
+
+    def delete(self, ids: List[str]):
+        with self.lock:
+            positions = self.state[2]
+            doomed = {positions[question_id] for question_id in ids if question_id in positions}
+            if not doomed:
+                return
+            old_ids, vectors, columns = self._materialize()
+            keep = [row for row in range(len(old_ids)) if row not in doomed]
+            self._write(
+                [old_ids[row] for row in keep],
+                vectors[keep].reshape(-1, self.dimension),
+                {name: [values[row] for row in keep] for name, values in columns.items()}
+            )
+
+    def query(self, embedding: np.ndarray, n_results: int) -> List[Dict[str, Any]]:
+        vectors, columns, _ = self.state
+        k = min(n_results, len(vectors))
+        if k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = vectors @ query
+        # argpartition finds the k best in linear time, only those k are sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # Same distance as chroma's cosine space
+        return [self._row(columns, int(row), float(1 - scores[row])) for row in top]
+
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        _, columns, positions = self.state
+        row = positions.get(question_id)
+        return self._row(columns, row) if row is not None else None
+
+    def ids(self) -> List[str]:
+        return list(self.state[2])
+
+    def count(self) -> int:
+        return len(self.state[0])
+
+    def reset(self):
+        with self.lock:
+            for name in ("CURRENT", "vectors.npy", "columns.npz"):
+                if os.path.exists(os.path.join(self.directory, name)):
+                    os.remove(os.path.join(self.directory, name))
+            self._remove_versions()
+            self._load()
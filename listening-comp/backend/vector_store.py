@@ -1,73 +1,371 @@
+import argparse
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 import json
+import random
+import sqlite3
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionClosedError, ReadTimeoutError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
 import numpy as np
-from pathlib import Path
+from pathlib import Path, PurePath
+
+try:
+    from .vector_index import NumpyVectorIndex
+except ImportError:
+    # Run as a script from the backend directory
+    from vector_index import NumpyVectorIndex
+
+# Error codes Bedrock uses when requests come in faster than the account's quota
+THROTTLING_ERRORS = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+}
+# Failures on the service's side that say nothing about the request rate.
+# Retried with the same backoff, without lowering the concurrency. Any
+# other 5xx response counts too.
+TRANSIENT_ERRORS = {
+    "InternalServerException",
+    "ModelTimeoutException",
+}
+# The connection failed or timed out before a response came back
+NETWORK_ERRORS = (BotocoreConnectionError, ConnectionClosedError, ReadTimeoutError)
+
+# Questions per upsert/delete call, chromadb rejects very large batches
+MAX_BATCH_SIZE = 1000
+
+class EmbeddingError(Exception):
+    """Raised when some texts could not be embedded, instead of returning zero vectors"""
+    def __init__(self, failures: Dict[int, str]):
+        self.failures = failures
+        first = next(iter(failures.items()))
+        super().__init__(
+            f"Could not embed {len(failures)} text(s), first failure at index {first[0]}: {first[1]}"
+        )
+
+class EmbeddingCache:
+    """On-disk cache of embeddings keyed by a hash of the model id and the text"""
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self.lock:
+            # Stay below sqlite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self.connection.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+class AdaptiveLimiter:
+    """Caps the number of requests in flight. The cap is halved when Bedrock
+    throttles and grows back by one after every `recover_after` successes."""
+    def __init__(self, max_concurrency: int, recover_after: int = 10):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.recover_after = recover_after
+        self.in_flight = 0
+        self.successes = 0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            else:
+                self.successes += 1
+                if self.successes >= self.recover_after and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
 
 class BedrockEmbeddings:
-    """Wrapper for Bedrock's embedding models"""
+    """Wrapper for Bedrock's embedding models
+    
+    Texts are embedded concurrently on a thread pool. Throttled requests are
+    retried with exponential backoff and lower the number of requests in
+    flight, dropped connections and server errors are retried the same way
+    without lowering it. With a cache path, every text is embedded once per
+    model and later calls read the stored vector."""
     EMBEDDING_DIMENSION = 1024  # Titan model's embedding dimension
-    def __init__(self, model_id: str = "amazon.titan-embed-text-v2:0"):
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
+    def __init__(self, model_id: str = "amazon.titan-embed-text-v2:0", cache_path: Optional[str] = None,
+                 max_workers: int = 8, max_retries: int = 6, base_delay: float = 0.5, max_delay: float = 20.0):
+        # Retries are done here, botocore's own retries would not lower the concurrency
+        self.bedrock_client = boto3.client(
+            'bedrock-runtime',
+            region_name="us-east-1",
+            config=Config(max_pool_connections=max_workers, retries={"mode": "standard", "max_attempts": 1})
+        )
         self.model_id = model_id
+        self.cache = EmbeddingCache(cache_path) if cache_path else None
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = AdaptiveLimiter(max_workers)
+        self.stats = {"requests": 0, "cache_hits": 0, "throttled": 0, "transient_errors": 0}
+        self.stats_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1):
+        with self.stats_lock:
+            self.stats[name] += n
+
+    def _invoke(self, text: str) -> np.ndarray:
+        response = self.bedrock_client.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps({"inputText": text})
+        )
+        response_body = json.loads(response['body'].read())
+        return np.asarray(response_body['embedding'], dtype=np.float32)
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        """Embed a single text, retrying throttled and transient failures with jittered exponential backoff
+        
+        Validation and access errors fail right away."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            throttled = False
+            try:
+                self._count("requests")
+                return self._invoke(text)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+                throttled = code in THROTTLING_ERRORS
+                transient = code in TRANSIENT_ERRORS or status >= 500
+                if not (throttled or transient) or attempt == self.max_retries:
+                    raise
+                self._count("throttled" if throttled else "transient_errors")
+            except NETWORK_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                self._count("transient_errors")
+            finally:
+                self.limiter.release(throttled)
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            time.sleep(random.uniform(delay / 2, delay))
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into a float32 matrix with one row per text
+        
+        Raises EmbeddingError naming every text that failed. Vectors that were
+        embedded before the failure are cached all the same."""
+        if not texts:
+            return np.zeros((0, self.EMBEDDING_DIMENSION), dtype=np.float32)
+
+        keys = [EmbeddingCache.key(self.model_id, text) for text in texts]
+        vectors = self.cache.get_many(list(set(keys))) if self.cache is not None else {}
+        self._count("cache_hits", sum(1 for key in keys if key in vectors))
+
+        # Duplicate texts are embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        failures = {}
+        embedded = {}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                futures = {key: executor.submit(self._embed_one, text) for key, text in missing.items()}
+                for key, future in futures.items():
+                    try:
+                        embedded[key] = future.result()
+                    except Exception as e:
+                        failures[key] = f"{type(e).__name__}: {e}"
+            if self.cache is not None:
+                self.cache.put_many(embedded)
+            vectors.update(embedded)
+
+        if failures:
+            raise EmbeddingError({i: failures[key] for i, key in enumerate(keys) if key in failures})
+        return np.stack([vectors[key] for key in keys])
 
     def __call__(self, input: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts using Bedrock's Titan model"""
-        embeddings = []
-        for text in input:
-            try:
-                body = json.dumps({"inputText": text})
-                response = self.bedrock_client.invoke_model(
-                    modelId=self.model_id,
-                    body=body
-                )
-                response_body = json.loads(response['body'].read())
-                embedding = response_body['embedding']
-                embeddings.append(embedding)
-            except Exception as e:
-                print(f"Error generating embedding: {str(e)}")
-                # Return a zero vector as fallback
-                embeddings.append([0.0] * self.EMBEDDING_DIMENSION)
-        return embeddings
+        return self.embed(list(input)).tolist()
 
-class QuestionVectorStore:
-    def __init__(self, persist_directory: str = "question_db", recreate: bool = False):
-        """Initialize the vector store for questions with Bedrock embeddings"""
-        self.persist_directory = persist_directory
-        self.embeddings = BedrockEmbeddings()
+class ChromaIndex:
+    """Questions in a chromadb collection. Embeddings are computed by
+    QuestionVectorStore and passed in, like for NumpyVectorIndex."""
+    COLLECTION_NAME = "spanish_questions"
+
+    def __init__(self, persist_directory: str, dimension: int):
+        self.directory = persist_directory
+        self.dimension = dimension
         self.client = chromadb.Client(Settings(
             persist_directory=persist_directory,
             is_persistent=True
         ))
+        self.collection = self._open()
+
+    def _open(self):
+        return self.client.get_or_create_collection(
+            name=self.COLLECTION_NAME,
+            metadata={"hnsw:space": "cosine", "dimension": self.dimension},
+            embedding_function=None
+        )
+
+    def existing(self, ids: List[str]) -> set:
+        return set(self.collection.get(ids=list(ids), include=[])["ids"])
+
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: List[str], metadatas: List[Dict[str, Any]]):
+        self.collection.upsert(
+            ids=list(ids),
+            embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def delete(self, ids: List[str]):
+        self.collection.delete(ids=list(ids))
+
+    def query(self, embedding: np.ndarray, n_results: int) -> List[Dict[str, Any]]:
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding, dtype=np.float32).tolist()],
+            n_results=n_results
+        )
         
-        # Delete existing collection if recreate is True
-        if recreate:
-            try:
-                self.client.delete_collection("spanish_questions")
-                print("Deleted existing collection")
-            except ValueError:
-                pass  # Collection doesn't exist
-        
-        # Get existing collection or create new one
+        similar_questions = []
+        for i in range(len(results["documents"][0])):
+            similar_questions.append({
+                "id": results["ids"][0][i],
+                "text": results["documents"][0][i],
+                "metadata": results["metadatas"][0][i],
+                "distance": results["distances"][0][i]
+            })
+        return similar_questions
+
+    def get(self, question_id: str) -> Optional[Dict[str, Any]]:
+        result = self.collection.get(ids=[question_id])
+        if result["documents"]:
+            return {
+                "id": question_id,
+                "text": result["documents"][0],
+                "metadata": result["metadatas"][0]
+            }
+        return None
+
+    def ids(self) -> List[str]:
+        return self.collection.get(include=[])["ids"]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self):
         try:
-            self.collection = self.client.get_collection(
-                name="spanish_questions",
-                embedding_function=self.embeddings
-            )
-        except (ValueError, chromadb.errors.InvalidCollectionException):
-            # Collection doesn't exist, create it
-            self.collection = self.client.create_collection(
-                name="spanish_questions",
-                metadata={"hnsw:space": "cosine", "dimension": BedrockEmbeddings.EMBEDDING_DIMENSION},
-                embedding_function=self.embeddings
-            )
+            self.client.delete_collection(self.COLLECTION_NAME)
+        except Exception:
+            pass  # Collection doesn't exist, the error type depends on the chromadb version
+        self.collection = self._open()
+
+# Vector index classes by QuestionVectorStore backend name
+BACKENDS = {
+    "chroma": ChromaIndex,
+    "numpy": lambda persist_directory, dimension: NumpyVectorIndex(
+        os.path.join(persist_directory, "numpy_index"), dimension
+    ),
+}
+
+def matches_glob(path: PurePath, pattern: str) -> bool:
+    """Whether Path.glob(pattern) would select a path relative to the globbed directory"""
+    # PurePath.match anchors at the right, so "*.txt" would also match
+    # "sub/a.txt". Without "**" a glob only looks at one depth.
+    if "**" not in pattern and len(path.parts) != len(PurePath(pattern).parts):
+        return False
+    return path.match(pattern)
+
+class QuestionVectorStore:
+    def __init__(self, persist_directory: str = "question_db", recreate: bool = False, backend: str = "chroma"):
+        """Initialize the vector store for questions with Bedrock embeddings
+        
+        Args:
+            backend: "chroma" for the chromadb collection, "numpy" for the
+                in-process NumpyVectorIndex. Each backend keeps its own data
+                and manifest, both share the embedding cache.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+        self.persist_directory = persist_directory
+        self.backend = backend
+        self.embeddings = BedrockEmbeddings(
+            cache_path=os.path.join(persist_directory, "embedding_cache.sqlite3")
+        )
+        self.index = BACKENDS[backend](persist_directory, BedrockEmbeddings.EMBEDDING_DIMENSION)
+        self.manifest_path = os.path.join(self.index.directory, "manifest.json")
+        
+        # Delete existing questions if recreate is True
+        if recreate:
+            self.index.reset()
+            print("Deleted existing questions")
+            # The manifest describes the deleted questions
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+
+    @staticmethod
+    def question_id(question: Dict[str, Any]) -> str:
+        """Content-addressed id: the same question always gets the same id, a changed one a new id"""
+        content = json.dumps(
+            [question["text"], question["scenario_id"], question["options"],
+             question["correct_answer"], question["topic"]],
+            ensure_ascii=False
+        )
+        return "q_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
 
-    def add_questions(self, questions: List[Dict[str, Any]]):
+    def add_questions(self, questions: List[Dict[str, Any]]) -> List[str]:
         """
-        Add questions to the vector store
+        Add questions to the vector store. Adding a question that is already
+        stored does nothing, so the same file can be ingested any number of times.
         
         Args:
             questions: List of dictionaries containing:
@@ -75,29 +373,139 @@ class QuestionVectorStore:
                 - scenario_id: ID of the scenario this question belongs to
                 - options: List of possible answers
                 - correct_answer: The correct answer
-        """
-        documents = []
-        ids = []
-        metadatas = []
         
-        for i, q in enumerate(questions):
+        Returns:
+            Ids of all valid questions, stored before or by this call
+        """
+        questions_by_id = {}
+        for q in questions:
             # Only add questions that have all required fields
             if q["text"] and q["options"] and q["correct_answer"]:
-                documents.append(q["text"])
-                ids.append(f"q_{i}")
-                metadatas.append({
-                    "scenario_id": q["scenario_id"],
-                    "options": str(q["options"]),
-                    "correct_answer": q["correct_answer"],
-                    "topic": q["topic"]
-                })
-        
-        if documents:  # Only add if we have valid questions
-            self.collection.add(
+                questions_by_id.setdefault(self.question_id(q), q)
+        
+        ids = list(questions_by_id)
+        for start in range(0, len(ids), MAX_BATCH_SIZE):
+            batch = ids[start:start + MAX_BATCH_SIZE]
+            # Only questions that are not stored yet are embedded
+            existing = self.index.existing(batch)
+            new_ids = [question_id for question_id in batch if question_id not in existing]
+            if not new_ids:
+                continue
+            documents = [questions_by_id[question_id]["text"] for question_id in new_ids]
+            self.index.upsert(
+                ids=new_ids,
+                embeddings=self.embeddings.embed(documents),
                 documents=documents,
-                ids=ids,
-                metadatas=metadatas
+                metadatas=[{
+                    "scenario_id": questions_by_id[question_id]["scenario_id"],
+                    "options": str(questions_by_id[question_id]["options"]),
+                    "correct_answer": questions_by_id[question_id]["correct_answer"],
+                    "topic": questions_by_id[question_id]["topic"]
+                } for question_id in new_ids]
             )
+        return ids
+
+    def delete_questions(self, ids: List[str]):
+        """Delete questions by id"""
+        ids = list(ids)
+        for start in range(0, len(ids), MAX_BATCH_SIZE):
+            self.index.delete(ids[start:start + MAX_BATCH_SIZE])
+
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """Ingested files by path, with their mtime, size, sha256 and question ids"""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)["files"]
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self, files: Dict[str, Dict[str, Any]]):
+        Path(self.manifest_path).parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "files": files}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def sync(self, directory: str, pattern: str = "*_structured.txt") -> Dict[str, int]:
+        """
+        Bring the store in line with the structured transcripts in a directory
+        
+        Files whose mtime and size match the manifest are not read. Changed
+        files are hashed, and only if the hash changed parsed again, so only
+        new or changed questions are embedded. Questions that are no longer in
+        any file are deleted.
+        
+        The first sync (no manifest yet) also deletes every stored question
+        the files do not produce, such as questions stored under the old
+        q_{i} ids, which would otherwise show up twice in searches.
+        
+        Returns:
+            Counts of new, changed, unchanged and removed files and of added
+            and deleted questions
+        """
+        first_sync = not os.path.exists(self.manifest_path)
+        manifest = self.load_manifest()
+        root = str(Path(directory).resolve())
+        files = {}
+        summary = {"new_files": 0, "changed_files": 0, "unchanged_files": 0,
+                   "removed_files": 0, "added_questions": 0, "deleted_questions": 0}
+        stale_ids = set()
+        added_ids = set()
+        
+        for path in sorted(Path(directory).glob(pattern)):
+            key = str(path.resolve())
+            stat = path.stat()
+            entry = manifest.get(key)
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                files[key] = entry
+                summary["unchanged_files"] += 1
+                continue
+            
+            content = path.read_bytes()
+            digest = hashlib.sha256(content).hexdigest()
+            if entry and entry["sha256"] == digest:
+                # Touched but not changed
+                files[key] = dict(entry, mtime=stat.st_mtime, size=stat.st_size)
+                summary["unchanged_files"] += 1
+                continue
+            
+            ids = set(self.add_questions(parse_structured_text(content.decode('utf-8'))))
+            added_ids.update(ids)
+            if entry:
+                stale_ids.update(set(entry["ids"]) - ids)
+                summary["changed_files"] += 1
+            else:
+                summary["new_files"] += 1
+            files[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": digest, "ids": sorted(ids)}
+        
+        for key, entry in manifest.items():
+            if key in files:
+                continue
+            if os.path.commonpath([root, key]) == root and (
+                    matches_glob(Path(key).relative_to(root), pattern) or not os.path.exists(key)):
+                stale_ids.update(entry["ids"])
+                summary["removed_files"] += 1
+            else:
+                # Ingested from another directory or with another pattern,
+                # not part of this sync
+                files[key] = entry
+        
+        # A question can appear in several files, keep it while any file has it
+        referenced = set()
+        for entry in files.values():
+            referenced.update(entry["ids"])
+        if first_sync:
+            stale_ids.update(self.index.ids())
+        stale_ids -= referenced
+        previously_referenced = set()
+        for entry in manifest.values():
+            previously_referenced.update(entry["ids"])
+        
+        self.delete_questions(sorted(stale_ids))
+        self.save_manifest(files)
+        summary["added_questions"] = len(added_ids - previously_referenced)
+        summary["deleted_questions"] = len(stale_ids)
+        return summary
 
     def search_similar_questions(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -110,35 +518,19 @@ class QuestionVectorStore:
         Returns:
             List of similar questions with their metadata
         """
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        
-        similar_questions = []
-        for i in range(len(results["documents"][0])):
-            similar_questions.append({
-                "text": results["documents"][0][i],
-                "metadata": results["metadatas"][0][i]
-            })
-            
-        return similar_questions
+        return self.index.query(self.embeddings.embed([query])[0], n_results)
 
     def get_question_by_id(self, question_id: str) -> Dict[str, Any]:
         """Retrieve a specific question by its ID"""
-        result = self.collection.get(ids=[question_id])
-        if result["documents"]:
-            return {
-                "text": result["documents"][0],
-                "metadata": result["metadatas"][0]
-            }
-        return None
+        return self.index.get(question_id)
 
 def parse_structured_file(file_path: str) -> List[Dict[str, Any]]:
     """Parse the structured transcript file into a list of questions"""
     with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
+        return parse_structured_text(f.read())
+
+def parse_structured_text(content: str) -> List[Dict[str, Any]]:
+    """Parse the contents of a structured transcript into a list of questions"""
     scenarios = content.split('### Scenario')[1:]  # Split by scenarios, ignore empty first part
     questions = []
     
@@ -195,37 +587,39 @@ def parse_structured_file(file_path: str) -> List[Dict[str, Any]]:
     
     return questions
 
-if __name__ == "__main__":
-    # Initialize vector store with recreate=True to ensure correct dimensions
-    store = QuestionVectorStore(recreate=True)
-    
-    # Path to the structured transcript file
-    file_path = os.path.join(
-        os.path.dirname(__file__),
-        'transcripts',
-        'NG9i48Ehfbc_structured.txt'
-    )
+def main():
+    parser = argparse.ArgumentParser(description="Manage the question vector store")
+    parser.add_argument('--persist-directory', default="question_db")
+    parser.add_argument('--backend', choices=list(BACKENDS), default="chroma")
+    commands = parser.add_subparsers(dest='command')
+    sync_parser = commands.add_parser('sync', help="embed new or changed questions, delete removed ones")
+    sync_parser.add_argument('--directory', default=os.path.join(os.path.dirname(__file__), 'transcripts'))
+    sync_parser.add_argument('--pattern', default="*_structured.txt")
+    search_parser = commands.add_parser('search', help="print the questions most similar to a query")
+    search_parser.add_argument('query', nargs='?', default="a qué horas va a llamar camila angélica otra vez")
+    search_parser.add_argument('-n', '--n-results', type=int, default=2)
+    args = parser.parse_args()
     
-    # Parse and add questions
-    questions = parse_structured_file(file_path)
-    print(f"Found {len(questions)} questions in the transcript")
+    store = QuestionVectorStore(persist_directory=args.persist_directory, backend=args.backend)
     
-    # Add questions to vector store
-    store.add_questions(questions)
-    print("Added questions to vector store")
+    if args.command in (None, 'sync'):
+        directory = getattr(args, 'directory', sync_parser.get_default('directory'))
+        pattern = getattr(args, 'pattern', sync_parser.get_default('pattern'))
+        summary = store.sync(directory, pattern)
+        print(f"Synced {directory}: " + ", ".join(f"{value} {name.replace('_', ' ')}" for name, value in summary.items()))
+        if args.command == 'sync':
+            return
     
-    # Example searches
-    test_queries = [
-        "a qué horas va a llamar camila angélica otra vez"
-    ]
-    
-    print("\nSearching for similar questions:")
-    for query in test_queries:
-        print(f"\nQuery: {query}")
-        similar = store.search_similar_questions(query, n_results=2)
-        for idx, result in enumerate(similar, 1):
-            print(f"\nMatch {idx}:")
-            print(f"Question: {result['text']}")
-            print(f"Topic: {result['metadata']['scenario_id']}")
-            print(f"Options: {result['metadata']['options']}")
-            print(f"Correct Answer: {result['metadata']['correct_answer']}")
+    query = getattr(args, 'query', search_parser.get_default('query'))
+    n_results = getattr(args, 'n_results', search_parser.get_default('n_results'))
+    print(f"\nQuery: {query}")
+    similar = store.search_similar_questions(query, n_results=n_results)
+    for idx, result in enumerate(similar, 1):
+        print(f"\nMatch {idx}:")
+        print(f"Question: {result['text']}")
+        print(f"Topic: {result['metadata']['scenario_id']}")
+        print(f"Options: {result['metadata']['options']}")
+        print(f"Correct Answer: {result['metadata']['correct_answer']}")
+
+if __name__ == "__main__":
+    main()